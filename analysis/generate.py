@@ -6,6 +6,7 @@ is 50% likely to be known, and (optionally) each ingredient name is
 Does this in `args.parallellism` OS processes in parallell.
 """
 from impacts_estimation.impacts_estimation import estimate_impacts
+from data import ingredients_tables, ingredients_data, off_taxonomy
 
 import json
 import sys
@@ -204,6 +205,12 @@ def main():
     with open(args.input_file) as f:
         ground_truth = json.load(f)
 
+    # Loading the data before forking the workers: when the compiled bundle is present, the data are memory-mapped
+    # arrays whose pages are shared by all the workers instead of being copied in each of them.
+    print('Loading ingredients data...', flush=True)
+    for shared_data in (ingredients_tables, ingredients_data, off_taxonomy):
+        shared_data.load()
+
     product_queue = multiprocessing.Queue(1)
     result_queue = multiprocessing.Queue(1)
     done_queue = multiprocessing.Queue(1)
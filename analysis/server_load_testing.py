@@ -0,0 +1,62 @@
+"""
+Load test of the local impact estimation server (see impacts_estimation.server).
+Sends `args.requests` estimation requests for the products of `args.input_file` with at most `args.concurrency`
+requests at the same time and prints the status codes and latencies.
+"""
+from impacts_estimation.server import request
+
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Load test of the local impact estimation server.')
+parser.add_argument('--host', type=str, help='address of the server', default='127.0.0.1')
+parser.add_argument('--port', type=int, help='port of the server', default=8000)
+parser.add_argument('--input_file', type=str, help='JSON file containing a list of products', required=True)
+parser.add_argument('--requests', type=int, help='total number of requests', default=100)
+parser.add_argument('--concurrency', type=int, help='maximum number of simultaneous requests', default=16)
+parser.add_argument('--timeout', type=float, help='deadline of each request in seconds', default=60)
+parser.add_argument('--impact', type=str, help='impact category to estimate', default='Climate change')
+args = parser.parse_args()
+
+
+async def run(products):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    statuses = Counter()
+    latencies = []
+
+    async def send(product):
+        async with semaphore:
+            start = time.monotonic()
+            status, _ = await request('POST', '/estimate',
+                                      body={'product': product,
+                                            'impact_names': args.impact,
+                                            'timeout': args.timeout},
+                                      host=args.host, port=args.port)
+            latencies.append(time.monotonic() - start)
+            statuses[status] += 1
+
+    start = time.monotonic()
+    await asyncio.gather(*[send(products[i % len(products)]) for i in range(args.requests)])
+    duration = time.monotonic() - start
+
+    print(f'{args.requests} requests in {duration:.1f}s ({args.requests / duration:.2f} requests/s)')
+    print(f'Status codes: {dict(statuses)}')
+    print(f'Latency (s): median {np.median(latencies):.2f}, p95 {np.percentile(latencies, 95):.2f}, '
+          f'max {max(latencies):.2f}')
+    print(f'Server status: {(await request("GET", "/healthz", host=args.host, port=args.port))[1]}')
+
+
+def main():
+    with open(args.input_file) as f:
+        products = json.load(f)
+
+    asyncio.run(run(products))
+
+
+if __name__ == '__main__':
+    main()
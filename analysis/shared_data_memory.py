@@ -0,0 +1,116 @@
+"""
+Measures the memory used by each worker process to hold the ingredients data, either as Python objects parsed from
+the JSON and CSV files or as arrays memory-mapped from the compiled bundle.
+
+For each worker, the script reports the increase of its resident set size (RSS), of its proportional set size (PSS,
+shared pages being divided among the processes sharing them) and of its private memory (USS) due to the data.
+
+Usage:
+    python analysis/shared_data_memory.py --workers 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+import data
+from data.bundle import Bundle, compile_bundle
+from data.tables import IngredientsTables
+
+# Keeps the loaded data alive in the worker processes
+_loaded = []
+_barrier = None
+
+
+def memory_usage():
+    """ RSS, PSS and USS of the current process in MiB, read from /proc (Linux only). """
+    values = dict()
+    with open('/proc/self/smaps_rollup', 'r') as file:
+        for line in file:
+            fields = line.split()
+            if len(fields) == 3 and fields[2] == 'kB':
+                values[fields[0].rstrip(':')] = int(fields[1]) / 1024
+
+    return {'rss': values['Rss'],
+            'pss': values['Pss'],
+            'uss': values['Private_Clean'] + values['Private_Dirty']}
+
+
+def _load_objects(_):
+    off_taxonomy = data._load_json(data.OFF_TAXONOMY_FILEPATH)
+    ingredients_data = data._load_json(data.INGREDIENTS_DATA_FILEPATH, missing_ok=True)
+    ref_ing_dist = data._load_ingredients_distribution()
+
+    # Accessing all the data as the estimation would
+    for entry in list(off_taxonomy.values()) + list(ingredients_data.values()):
+        len(entry)
+    ref_ing_dist.percent.sum()
+
+    return off_taxonomy, ingredients_data, ref_ing_dist
+
+
+def _load_arrays(bundle_filepath):
+    bundle = Bundle(bundle_filepath)
+    off_taxonomy = bundle.mapping('taxonomy')
+    ingredients_data = bundle.mapping('ingredients')
+    tables = IngredientsTables.from_bundle(bundle)
+
+    # Accessing all the data as the estimation would
+    'en:water' in off_taxonomy and 'en:water' in ingredients_data
+    for name in bundle.header['arrays']:
+        np.sum(bundle.array(name))
+
+    return off_taxonomy, ingredients_data, tables
+
+
+def _set_barrier(barrier):
+    global _barrier
+    _barrier = barrier
+
+
+def _measure(loader, argument):
+    """ Loads the data in a worker and returns the memory used for it. """
+    before = memory_usage()
+    _loaded.append(loader(argument))
+
+    # Waiting for all the workers to hold the data, so that the PSS accounts for the sharing
+    _barrier.wait()
+    after = memory_usage()
+    _barrier.wait()
+
+    return {x: after[x] - before[x] for x in after}
+
+
+def measure(mode, workers, bundle_filepath):
+    """ Returns the memory used for the data by each of the workers. """
+    loader = _load_objects if mode == 'objects' else _load_arrays
+    barrier = multiprocessing.Barrier(workers)
+    with multiprocessing.Pool(workers, initializer=_set_barrier, initargs=(barrier,)) as pool:
+        return pool.starmap(_measure, [(loader, bundle_filepath)] * workers, chunksize=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the memory used by the workers to hold the data.')
+    parser.add_argument('--workers', type=int, default=8, help='number of worker processes')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        bundle_filepath = os.path.join(directory, 'data.bundle')
+        compile_bundle(bundle_filepath)
+
+        print(f"Memory used by each of the {args.workers} workers for the data (MiB):")
+        print(f"{'':<10}{'RSS':>10}{'PSS':>10}{'USS':>10}")
+        for mode in ('objects', 'arrays'):
+            usages = measure(mode, args.workers, bundle_filepath)
+            print(f"{mode:<10}" + ''.join(f"{np.mean([x[key] for x in usages]):>10.2f}"
+                                          for key in ('rss', 'pss', 'uss')))
+
+
+if __name__ == '__main__':
+    main()
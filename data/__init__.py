@@ -1,29 +1,176 @@
-""" Data used for environmental impact estimation of Open Food Facts products """
+"""
+Data used for environmental impact estimation of Open Food Facts products
 
+The data are loaded on first use: the objects exposed by this module are proxies that load the data the first time
+one of their attributes or items is accessed. If an up to date compiled bundle (see :mod:`data.bundle`) is present,
+the data are read from it instead of the JSON and CSV files.
+"""
+
+import copy
 import os
 import json
-
-import pandas as pd
+import threading
 
 data_folder = os.path.dirname(__file__)
 
+_NOT_LOADED = object()
+
+
+class LazyData:
+    """
+    Proxy loading an object on first use and then forwarding all accesses to it. The loading is thread-safe.
+
+    Copying or pickling the proxy loads the object and copies or pickles it instead. The private attributes (starting
+    with an underscore) are not forwarded.
+
+    Examples:
+        >>> numbers = LazyData(lambda: {'one': 1, 'two': 2})
+        >>> numbers.loaded
+        False
+        >>> numbers['one']
+        1
+        >>> numbers.loaded
+        True
+    """
+
+    __slots__ = ('_loader', '_value', '_lock')
+
+    def __init__(self, loader):
+        """
+        Args:
+            loader (callable): Function without arguments returning the object.
+        """
+        self._loader = loader
+        self._value = _NOT_LOADED
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._value is not _NOT_LOADED
+
+    def load(self):
+        """ Returns the object, loading it if it has not been loaded yet. """
+        if self._value is _NOT_LOADED:
+            with self._lock:
+                if self._value is _NOT_LOADED:
+                    self._value = self._loader()
+        return self._value
+
+    def __getattr__(self, name):
+        # Private attributes are not forwarded, as they are looked up on instances not initialized by the copy and
+        # pickle protocols, which would recursively try to load them
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __copy__(self):
+        return copy.copy(self.load())
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.load(), memo)
+
+    def __reduce__(self):
+        return _identity, (self.load(),)
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __contains__(self, item):
+        return item in self.load()
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+    def __bool__(self):
+        return bool(len(self.load()))
+
+    def __eq__(self, other):
+        return self.load() == other
+
+    def __repr__(self):
+        return repr(self.load()) if self.loaded else f"<{type(self).__name__} (not loaded)>"
+
+    def get(self, key, default=None):
+        return self.load().get(key, default)
+
+
+def _identity(value):
+    """ Used to unpickle a :class:`LazyData` as the object it loaded. """
+    return value
+
+
+def _load_json(filepath, missing_ok=False):
+    """ Loads a JSON file. If missing_ok is True, returns an empty dict if the file does not exist. """
+    try:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        if not missing_ok:
+            raise
+        return dict()
+
+
+def _load_ingredients_distribution():
+    import pandas as pd
+
+    return pd.read_csv(INGREDIENTS_DISTRIBUTION_FILEPATH, na_filter=None, encoding='utf-8')
+
+
+def _load_bundle():
+    from data.bundle import load_bundle
+
+    return load_bundle(BUNDLE_FILEPATH)
+
+
+def _load_taxonomy():
+    if (compiled_bundle.load() is not None) and ('taxonomy.ids' in compiled_bundle):
+        return compiled_bundle.mapping('taxonomy')
+    return _load_json(OFF_TAXONOMY_FILEPATH)
+
+
+def _load_ingredients_data():
+    if compiled_bundle.load() is not None:
+        return compiled_bundle.mapping('ingredients')
+    return _load_json(INGREDIENTS_DATA_FILEPATH, missing_ok=True)
+
+
+def _load_reference_distribution():
+    if (compiled_bundle.load() is not None) and ('reference_distribution.ids' in compiled_bundle):
+        from data.bundle import reference_distribution_dataframe
+
+        return reference_distribution_dataframe(compiled_bundle.load())
+    return _load_ingredients_distribution()
+
+
+def _load_ingredients_tables():
+    from data.tables import IngredientsTables
+
+    if (compiled_bundle.load() is not None) and ('reference_distribution.ids' in compiled_bundle):
+        return IngredientsTables.from_bundle(compiled_bundle.load())
+    return IngredientsTables.from_data(ingredients_data.load(), ref_ing_dist.load())
+
+
+# Compiled binary bundle of the data, None if it does not exist or is not up to date
+BUNDLE_FILEPATH = os.path.join(data_folder, 'data.bundle')
+compiled_bundle = LazyData(_load_bundle)
+
 # OFF ingredients taxonomy
 OFF_TAXONOMY_FILEPATH = os.path.join(data_folder, 'off_ingredients_taxonomy.json')
-with open(OFF_TAXONOMY_FILEPATH, 'r', encoding='utf-8') as file:
-    off_taxonomy = json.load(file)
+off_taxonomy = LazyData(_load_taxonomy)
 
 # Data about OFF ingredients (impacts and nutriments)
 INGREDIENTS_DATA_FILEPATH = os.path.join(data_folder, 'ingredients_data.json')
-try:
-    with open(INGREDIENTS_DATA_FILEPATH, 'r', encoding='utf-8') as file:
-        ingredients_data = json.load(file)
-except FileNotFoundError:
-    ingredients_data = dict()
+ingredients_data = LazyData(_load_ingredients_data)
 
 # Distribution of ingredients percentage by category in OFF
 INGREDIENTS_DISTRIBUTION_FILEPATH = os.path.join(data_folder, 'off_ingredients_percentage_distribution.csv')
-ref_ing_dist = pd.read_csv(INGREDIENTS_DISTRIBUTION_FILEPATH, na_filter=None, encoding='utf-8')
+ref_ing_dist = LazyData(_load_reference_distribution)
 
 OFF_CATEGORIES_FILEPATH = os.path.join(data_folder, 'off_categories.json')
-with open(OFF_CATEGORIES_FILEPATH, 'r', encoding='utf-8') as file:
-    off_categories = json.load(file)
+off_categories = LazyData(lambda: _load_json(OFF_CATEGORIES_FILEPATH))
+
+# Array view of the ingredients data and of the distribution of ingredients percentages (see data.tables)
+ingredients_tables = LazyData(_load_ingredients_tables)
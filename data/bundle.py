@@ -0,0 +1,445 @@
+"""
+Compiled binary bundle of the data used by the impact estimation.
+
+The bundle gathers the OFF ingredients taxonomy, the ingredients data and the reference distribution of the ingredients
+percentages in a single file that is memory-mapped instead of being parsed. It contains numpy arrays and string
+tables:
+
+    - ``taxonomy.ids``, ``taxonomy.entries``: Ids and JSON entries of the taxonomy ingredients.
+    - ``taxonomy.allergens``: Whether each taxonomy ingredient is an allergen.
+    - ``ingredients.ids``, ``ingredients.entries``: Ids and JSON entries of the characterized ingredients.
+    - ``ingredients.nutriments``: Value, min and max (last axis) of each nutriment (``nutriments.names``) of each
+      characterized ingredient (NaN if unknown). The first columns follow INGREDIENTS_COMPOSITION_ITEMS, so that the
+      estimation reads them as views of the bundle.
+    - ``ingredients.impacts``: Amount of each impact (``impacts.names``) of each characterized ingredient (NaN if
+      unknown). The first columns follow AGRIBALYSE_IMPACT_CATEGORIES_FR.
+    - ``uncertainty.offsets``, ``uncertainty.distributions``, ``uncertainty.parameters``: Uncertainty distributions
+      of the impacts. The distributions of the impact j of the ingredient i are the rows
+      ``offsets[i * nb_impacts + j]`` to ``offsets[i * nb_impacts + j + 1]`` of ``distributions`` (index in
+      ``uncertainty.distributions_names``) and ``parameters`` (columns follow ``UNCERTAINTY_PARAMETERS``).
+    - ``reference_distribution.<column>``: Columns of the reference distribution of the ingredients percentages, and
+      ``reference_distribution.index``, the rows of each ingredient id (``reference_distribution.ids``) between
+      ``reference_distribution.offsets[i]`` and ``reference_distribution.offsets[i + 1]``.
+
+File layout: magic bytes, format version and header length, JSON header (arrays dtypes, shapes and offsets, content
+hash and sources description) and the arrays data, aligned on 64 bytes.
+
+Run ``python -m data.bundle`` to compile the bundle from the data files.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+import numpy as np
+
+BUNDLE_MAGIC = b'OFFBNDL\x00'
+# Version of the file format, bumped when the layout of the arrays changes so that older bundles are recompiled
+BUNDLE_VERSION = 2
+_PREAMBLE = struct.Struct('<8sIQ')
+_ALIGNMENT = 64
+
+# Parameters of the impacts uncertainty distributions
+UNCERTAINTY_PARAMETERS = ['minimum', 'maximum', 'mode', 'mean', 'standard deviation', 'geometric mean',
+                          'geometric standard deviation']
+
+# Order of the values of the nutriments table
+NUTRIMENTS_VALUES = ['value', 'min', 'max']
+
+
+class BundleError(Exception):
+    """ Raised when a bundle file is invalid. """
+    pass
+
+
+class StringTable:
+    """ Read-only sequence of strings stored as concatenated UTF-8 bytes and offsets. """
+
+    def __init__(self, data, offsets):
+        """
+        Args:
+            data (np.ndarray): Concatenated UTF-8 encoded strings.
+            offsets (np.ndarray): Start of each string in data, followed by the total length.
+        """
+        self.data = data
+        self.offsets = offsets
+        self._index = None
+
+    @classmethod
+    def encode(cls, strings):
+        """ Returns the data and offsets arrays of a list of strings. """
+        encoded = [x.encode('utf-8') for x in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(x) for x in encoded])
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('String table index out of range')
+        i %= len(self)
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        for i in range(len(self)):
+            yield data[offsets[i]:offsets[i + 1]].decode('utf-8')
+
+    @property
+    def index(self):
+        """ Dict giving the position of each string. """
+        if self._index is None:
+            self._index = {x: i for i, x in enumerate(self)}
+        return self._index
+
+    def __contains__(self, item):
+        return item in self.index
+
+
+class BundleMapping(Mapping):
+    """ Read-only dict-like view of JSON entries stored in a bundle. The entries are decoded on first access. """
+
+    def __init__(self, keys, entries):
+        """
+        Args:
+            keys (StringTable): Keys of the mapping.
+            entries (StringTable): JSON encoded values, in the same order as the keys.
+        """
+        self.keys_table = keys
+        self.entries_table = entries
+        self._cache = dict()
+
+    def __getitem__(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        value = json.loads(self.entries_table[self.keys_table.index[key]])
+        self._cache[key] = value
+        return value
+
+    def __contains__(self, key):
+        return key in self.keys_table.index
+
+    def __iter__(self):
+        return iter(self.keys_table)
+
+    def __len__(self):
+        return len(self.keys_table)
+
+
+class Bundle:
+    """ Memory-mapped bundle file. """
+
+    def __init__(self, filepath):
+        """
+        Args:
+            filepath (str): Path of the bundle file.
+        """
+        self.filepath = filepath
+        with open(filepath, 'rb') as file:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._buffer) < _PREAMBLE.size:
+            raise BundleError(f"{filepath} is not a data bundle.")
+        magic, version, header_size = _PREAMBLE.unpack_from(self._buffer)
+        if magic != BUNDLE_MAGIC:
+            raise BundleError(f"{filepath} is not a data bundle.")
+        if version != BUNDLE_VERSION:
+            raise BundleError(f"{filepath} has the format version {version} instead of {BUNDLE_VERSION}.")
+
+        self.header = json.loads(self._buffer[_PREAMBLE.size:_PREAMBLE.size + header_size])
+        self.version = version
+        self.content_hash = self.header['content_hash']
+        self.sources = self.header['sources']
+        self.metadata = self.header['metadata']
+
+    def array(self, name):
+        """ Returns a read-only array of the bundle, without copying it. """
+        description = self.header['arrays'][name]
+        dtype = np.dtype(description['dtype'])
+        count = int(np.prod(description['shape'], dtype=np.int64))
+        return np.frombuffer(self._buffer, dtype=dtype, count=count,
+                             offset=description['offset']).reshape(description['shape'])
+
+    def strings(self, name):
+        """ Returns a string table of the bundle. """
+        return StringTable(self.array(f"{name}.data"), self.array(f"{name}.offsets"))
+
+    def mapping(self, name):
+        """ Returns a dict-like view of the JSON entries of the bundle indexed by ids. """
+        return BundleMapping(self.strings(f"{name}.ids"), self.strings(f"{name}.entries"))
+
+    def __contains__(self, name):
+        return (name in self.header['arrays']) or (f"{name}.data" in self.header['arrays'])
+
+    def is_up_to_date(self):
+        """
+        Checks that the source files of the bundle have not been modified since its compilation. The content of the
+        sources is hashed only if their size or modification time has changed. A source that was created or deleted
+        since the compilation makes the bundle stale.
+        """
+        for source, description in self.sources.items():
+            filepath = os.path.join(os.path.dirname(os.path.abspath(self.filepath)), source)
+            try:
+                stat = os.stat(filepath)
+            except FileNotFoundError:
+                if description['hash'] is None:
+                    continue
+                return False
+            if description['hash'] is None:
+                return False
+            if (stat.st_size, stat.st_mtime_ns) == (description['size'], description['mtime_ns']):
+                continue
+            if _file_hash(filepath) != description['hash']:
+                return False
+
+        return True
+
+
+def _file_hash(filepath):
+    with open(filepath, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def write_bundle(filepath, arrays, strings, metadata=None, sources=None):
+    """
+    Writes a bundle file.
+
+    Args:
+        filepath (str): Path of the bundle file.
+        arrays (dict): Numpy arrays to store, by name.
+        strings (dict): Lists of strings to store as string tables, by name.
+        metadata (dict): JSON serializable data stored in the header.
+        sources (list): Paths of the files the bundle has been compiled from, including the missing ones. Their
+            hashes are used to detect stale bundles, the missing sources being recorded with a None hash.
+    """
+    arrays = dict(arrays)
+    for name, table in strings.items():
+        arrays[f"{name}.data"], arrays[f"{name}.offsets"] = StringTable.encode(table)
+    arrays = {name: np.ascontiguousarray(array) for name, array in sorted(arrays.items())}
+
+    sources_description = dict()
+    for source in sources or []:
+        # The paths are stored relative to the bundle so that the data folder can be moved
+        relative_path = os.path.relpath(source, os.path.dirname(os.path.abspath(filepath)))
+        if os.path.isfile(source):
+            stat = os.stat(source)
+            sources_description[relative_path] = {'hash': _file_hash(source),
+                                                  'size': stat.st_size,
+                                                  'mtime_ns': stat.st_mtime_ns}
+        else:
+            sources_description[relative_path] = {'hash': None, 'size': None, 'mtime_ns': None}
+
+    content_hash = hashlib.sha256()
+    for name, array in arrays.items():
+        content_hash.update(name.encode('utf-8'))
+        content_hash.update(array.dtype.str.encode('utf-8'))
+        content_hash.update(array.tobytes())
+
+    # The offsets of the arrays are relative to the end of the header, which depends on the offsets.
+    # The header is thus padded to a fixed size.
+    descriptions = dict()
+    offset = 0
+    for name, array in arrays.items():
+        descriptions[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    def header_bytes(data_start):
+        header = {'content_hash': content_hash.hexdigest(),
+                  'sources': sources_description,
+                  'metadata': metadata or dict(),
+                  'arrays': {name: {**description, 'offset': description['offset'] + data_start}
+                             for name, description in descriptions.items()}}
+        return json.dumps(header, sort_keys=True).encode('utf-8')
+
+    header_size = len(header_bytes(0))
+    while True:
+        data_start = -(-(_PREAMBLE.size + header_size) // _ALIGNMENT) * _ALIGNMENT
+        header = header_bytes(data_start)
+        if _PREAMBLE.size + len(header) <= data_start:
+            break
+        header_size = len(header)
+
+    temporary_filepath = f"{filepath}.tmp"
+    with open(temporary_filepath, 'wb') as file:
+        file.write(_PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(header)))
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(descriptions[name]['offset'] + data_start)
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+
+    # Replacing the file atomically so that processes reading the previous bundle are not affected
+    os.replace(temporary_filepath, filepath)
+
+
+def _taxonomy_arrays(off_taxonomy):
+    ids = list(off_taxonomy)
+    arrays = {'taxonomy.allergens': np.array(['allergens' in off_taxonomy[x] for x in ids], dtype=bool)}
+    strings = {'taxonomy.ids': ids,
+               'taxonomy.entries': [json.dumps(off_taxonomy[x], ensure_ascii=False) for x in ids]}
+
+    return arrays, strings
+
+
+def _ingredients_arrays(ingredients_data):
+    from impacts_estimation.vars import INGREDIENTS_COMPOSITION_ITEMS, AGRIBALYSE_IMPACT_CATEGORIES_FR
+
+    ids = list(ingredients_data)
+    # The columns used by the estimation come first, in its order, followed by the other ones
+    nutriments_names = {nutriment for x in ingredients_data.values() for nutriment in x.get('nutriments', [])}
+    nutriments_names = INGREDIENTS_COMPOSITION_ITEMS + sorted(nutriments_names - set(INGREDIENTS_COMPOSITION_ITEMS))
+    impacts_names = {impact for x in ingredients_data.values() for impact in x.get('impacts', [])}
+    impacts_names = AGRIBALYSE_IMPACT_CATEGORIES_FR + sorted(impacts_names - set(AGRIBALYSE_IMPACT_CATEGORIES_FR))
+    distributions_names = sorted({distribution['distribution']
+                                  for x in ingredients_data.values()
+                                  for impact in x.get('impacts', dict()).values()
+                                  for distribution in impact.get('uncertainty_distributions', [])})
+
+    nutriments = np.full((len(ids), len(nutriments_names), len(NUTRIMENTS_VALUES)), np.nan)
+    impacts = np.full((len(ids), len(impacts_names)), np.nan)
+    uncertainty_offsets = [0]
+    uncertainty_distributions = []
+    uncertainty_parameters = []
+
+    for i, ingredient_id in enumerate(ids):
+        ingredient = ingredients_data[ingredient_id]
+        for j, nutriment in enumerate(nutriments_names):
+            if nutriment in ingredient.get('nutriments', []):
+                for k, value in enumerate(NUTRIMENTS_VALUES):
+                    nutriments[i, j, k] = ingredient['nutriments'][nutriment].get(value, np.nan)
+
+        for j, impact_name in enumerate(impacts_names):
+            impact = ingredient.get('impacts', dict()).get(impact_name, dict())
+            impacts[i, j] = impact.get('amount', np.nan)
+            for distribution in impact.get('uncertainty_distributions', []):
+                uncertainty_distributions.append(distributions_names.index(distribution['distribution']))
+                uncertainty_parameters.append([distribution.get(x, np.nan) for x in UNCERTAINTY_PARAMETERS])
+            uncertainty_offsets.append(len(uncertainty_distributions))
+
+    arrays = {'ingredients.nutriments': nutriments,
+              'ingredients.impacts': impacts,
+              'uncertainty.offsets': np.array(uncertainty_offsets, dtype=np.int64),
+              'uncertainty.distributions': np.array(uncertainty_distributions, dtype=np.int8),
+              'uncertainty.parameters': np.array(uncertainty_parameters,
+                                                 dtype=float).reshape(-1, len(UNCERTAINTY_PARAMETERS))}
+    strings = {'ingredients.ids': ids,
+               'ingredients.entries': [json.dumps(ingredients_data[x], ensure_ascii=False) for x in ids],
+               'nutriments.names': nutriments_names,
+               'impacts.names': impacts_names,
+               'uncertainty.distributions_names': distributions_names}
+
+    return arrays, strings
+
+
+def _reference_distribution_arrays(ref_ing_dist):
+    arrays = dict()
+    strings = dict()
+    for column in ref_ing_dist.columns:
+        if ref_ing_dist[column].dtype == object:
+            strings[f"reference_distribution.{column}"] = ref_ing_dist[column].tolist()
+        else:
+            arrays[f"reference_distribution.{column}"] = ref_ing_dist[column].to_numpy()
+
+    # Index of the rows by ingredient id
+    ids, inverse = np.unique(ref_ing_dist['id'].to_numpy(dtype=str), return_inverse=True)
+    index = np.argsort(inverse, kind='stable')
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(inverse, minlength=len(ids)))
+
+    arrays['reference_distribution.index'] = index.astype(np.int64)
+    arrays['reference_distribution.offsets'] = offsets
+    strings['reference_distribution.ids'] = ids.tolist()
+
+    return arrays, strings, list(ref_ing_dist.columns)
+
+
+def compile_bundle(filepath=None):
+    """
+    Compiles the bundle from the data files.
+
+    Args:
+        filepath (str): Path of the bundle file. Defaults to data.BUNDLE_FILEPATH.
+    """
+    import data
+
+    filepath = filepath or data.BUNDLE_FILEPATH
+    arrays = dict()
+    strings = dict()
+    metadata = dict()
+    # The missing sources are recorded too, so that the bundle is stale once they are created
+    sources = [data.OFF_TAXONOMY_FILEPATH, data.INGREDIENTS_DATA_FILEPATH, data.INGREDIENTS_DISTRIBUTION_FILEPATH]
+
+    if os.path.isfile(data.OFF_TAXONOMY_FILEPATH):
+        taxonomy_arrays, taxonomy_strings = _taxonomy_arrays(data._load_json(data.OFF_TAXONOMY_FILEPATH))
+        arrays.update(taxonomy_arrays)
+        strings.update(taxonomy_strings)
+
+    ingredients_arrays, ingredients_strings = _ingredients_arrays(data._load_json(data.INGREDIENTS_DATA_FILEPATH,
+                                                                                  missing_ok=True))
+    arrays.update(ingredients_arrays)
+    strings.update(ingredients_strings)
+
+    if os.path.isfile(data.INGREDIENTS_DISTRIBUTION_FILEPATH):
+        distribution_arrays, distribution_strings, columns = \
+            _reference_distribution_arrays(data._load_ingredients_distribution())
+        arrays.update(distribution_arrays)
+        strings.update(distribution_strings)
+        metadata['reference_distribution_columns'] = columns
+
+    write_bundle(filepath, arrays, strings, metadata=metadata, sources=sources)
+
+
+def load_bundle(filepath):
+    """
+    Opens a bundle if it exists and is up to date with its sources.
+
+    Args:
+        filepath (str): Path of the bundle file.
+
+    Returns:
+        Bundle: The bundle, or None if it does not exist, is invalid or is stale.
+    """
+    if not os.path.isfile(filepath):
+        return None
+    try:
+        bundle = Bundle(filepath)
+    except (BundleError, ValueError, KeyError, OSError):
+        return None
+
+    return bundle if bundle.is_up_to_date() else None
+
+
+def reference_distribution_dataframe(bundle):
+    """ Builds the reference distribution of the ingredients percentages dataframe from a bundle. """
+    import pandas as pd
+
+    columns = dict()
+    for column in bundle.metadata['reference_distribution_columns']:
+        name = f"reference_distribution.{column}"
+        if name in bundle.header['arrays']:
+            columns[column] = np.array(bundle.array(name))
+        else:
+            columns[column] = list(bundle.strings(name))
+
+    return pd.DataFrame(columns)
+
+
+def main():
+    import data
+
+    compile_bundle()
+    bundle = Bundle(data.BUNDLE_FILEPATH)
+    print(f"Bundle written to {data.BUNDLE_FILEPATH} ({os.path.getsize(data.BUNDLE_FILEPATH)} bytes, "
+          f"content hash {bundle.content_hash[:12]})")
+
+
+if __name__ == '__main__':
+    main()
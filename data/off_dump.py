@@ -0,0 +1,205 @@
+"""
+Barcode index of a local Open Food Facts JSONL dump (https://world.openfoodfacts.org/data), used to read products
+without querying the Open Food Facts API.
+
+The index gives the byte offset of the line of each product of the dump. It is built once by streaming through the
+dump and stored in the binary bundle format (see :mod:`data.bundle`) with two arrays:
+
+    - ``dump.barcodes``: Sorted barcodes of the products, as fixed length bytes.
+    - ``dump.offsets``: Byte offset of the line of each product in the dump.
+
+The index is memory-mapped and a product is found by binary search, so that looking a product up does not load the
+dump nor the index. The dump must be uncompressed, as a compressed file cannot be read from an arbitrary position.
+
+Run ``python -m data.off_dump <dump>`` to build the index of a dump.
+"""
+
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+from data.bundle import Bundle, BundleError, write_bundle
+
+# Top level barcode field of the products, the line is parsed if the field is missing, duplicated, nested or escaped
+_CODE_FIELD = b'"code"'
+_CODE_PATTERN = re.compile(rb'"code"\s*:\s*"([^"\\]*)"')
+# JSON strings, removed to find the nesting depth of a position of a line
+_STRING_PATTERN = re.compile(rb'"(?:[^"\\]|\\.)*"')
+
+
+def _depth(line, position):
+    """ Nesting depth of the objects and arrays at a position of a JSON line, the position being outside strings. """
+    prefix = _STRING_PATTERN.sub(b'', line[:position])
+
+    return prefix.count(b'{') + prefix.count(b'[') - prefix.count(b'}') - prefix.count(b']')
+
+
+def dump_index_filepath(dump_filepath):
+    """ Default path of the index of a dump. """
+    return f"{dump_filepath}.index"
+
+
+def line_barcode(line):
+    """
+    Barcode of the product of a line of the dump.
+
+    The barcode is extracted without parsing the line when the "code" field appears only once in it, as a key of the
+    product object itself.
+
+    Args:
+        line (bytes): Line of the dump.
+
+    Returns:
+        str: Barcode of the product, None if the line has none.
+    """
+    if line.count(_CODE_FIELD) == 1:
+        match = _CODE_PATTERN.search(line)
+        if (match is not None) and (_depth(line, match.start()) == 1):
+            return match.group(1).decode('utf-8')
+
+    if not line.strip():
+        return None
+
+    code = json.loads(line).get('code')
+
+    return None if code is None else str(code)
+
+
+def build_dump_index(dump_filepath, index_filepath=None):
+    """
+    Builds the barcode index of a dump, streaming through it.
+
+    If several lines have the same barcode, the first one is indexed.
+
+    Args:
+        dump_filepath (str): Path of the uncompressed JSONL dump.
+        index_filepath (str): Path of the index. Defaults to the dump path followed by '.index'.
+    """
+    if dump_filepath.endswith('.gz'):
+        raise ValueError('Compressed dumps cannot be indexed, the dump must be decompressed first.')
+
+    index_filepath = index_filepath or dump_index_filepath(dump_filepath)
+    stat = os.stat(dump_filepath)
+
+    barcodes = []
+    offsets = []
+    position = 0
+    with open(dump_filepath, 'rb') as file:
+        for line in file:
+            barcode = line_barcode(line)
+            if barcode:
+                barcodes.append(barcode.encode('utf-8'))
+                offsets.append(position)
+            position += len(line)
+
+    barcodes = np.array(barcodes, dtype=bytes) if barcodes else np.empty(0, dtype='S1')
+    offsets = np.array(offsets, dtype=np.int64)
+
+    # Sorting the barcodes, keeping the first line of each one
+    order = np.argsort(barcodes, kind='stable')
+    barcodes = barcodes[order]
+    offsets = offsets[order]
+    first = np.ones(len(barcodes), dtype=bool)
+    first[1:] = barcodes[1:] != barcodes[:-1]
+
+    write_bundle(index_filepath,
+                 arrays={'dump.barcodes': barcodes[first], 'dump.offsets': offsets[first]},
+                 strings=dict(),
+                 metadata={'dump_size': stat.st_size, 'dump_mtime_ns': stat.st_mtime_ns})
+
+
+class OffDumpIndex:
+    """ Products of a dump, read on demand through its barcode index. """
+
+    def __init__(self, dump_filepath, bundle):
+        """
+        Args:
+            dump_filepath (str): Path of the dump.
+            bundle (Bundle): Index of the dump.
+        """
+        self.dump_filepath = dump_filepath
+        self.bundle = bundle
+        self.barcodes = bundle.array('dump.barcodes')
+        self.offsets = bundle.array('dump.offsets')
+
+    def __len__(self):
+        return len(self.barcodes)
+
+    def offset(self, barcode):
+        """ Byte offset of the line of a product in the dump, None if it is not in the dump. """
+        key = str(barcode).encode('utf-8')
+        # Barcodes longer than the indexed ones would be truncated by the comparison
+        if (len(self.barcodes) == 0) or (len(key) > self.barcodes.dtype.itemsize):
+            return None
+
+        i = np.searchsorted(self.barcodes, key)
+        if (i < len(self.barcodes)) and (self.barcodes[i] == key):
+            return int(self.offsets[i])
+
+        return None
+
+    def __contains__(self, barcode):
+        return self.offset(barcode) is not None
+
+    def get(self, barcode):
+        """ Product with a given barcode, None if it is not in the dump. """
+        offset = self.offset(barcode)
+        if offset is None:
+            return None
+
+        with open(self.dump_filepath, 'rb') as file:
+            file.seek(offset)
+            return json.loads(file.readline())
+
+
+def load_dump_index(dump_filepath, index_filepath=None):
+    """
+    Opens the index of a dump if it exists and is up to date with the dump.
+
+    Args:
+        dump_filepath (str): Path of the dump.
+        index_filepath (str): Path of the index. Defaults to the dump path followed by '.index'.
+
+    Returns:
+        OffDumpIndex: The index, or None if it does not exist, is invalid or is stale.
+    """
+    index_filepath = index_filepath or dump_index_filepath(dump_filepath)
+    try:
+        bundle = Bundle(index_filepath)
+        stat = os.stat(dump_filepath)
+    except (BundleError, ValueError, OSError):
+        return None
+
+    # The dump is too large to be hashed at each loading, its size and modification time are checked instead
+    if (bundle.metadata.get('dump_size'), bundle.metadata.get('dump_mtime_ns')) != (stat.st_size, stat.st_mtime_ns):
+        return None
+
+    return OffDumpIndex(dump_filepath, bundle)
+
+
+def open_dump_index(dump_filepath, index_filepath=None):
+    """ Opens the index of a dump, building it first if it is missing or stale. """
+    index = load_dump_index(dump_filepath, index_filepath)
+    if index is None:
+        build_dump_index(dump_filepath, index_filepath)
+        index = load_dump_index(dump_filepath, index_filepath)
+
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the barcode index of an Open Food Facts JSONL dump.')
+    parser.add_argument('dump', help='path of the uncompressed OFF JSONL dump')
+    parser.add_argument('--output', help='path of the index, defaults to the dump path followed by .index')
+    args = parser.parse_args()
+
+    build_dump_index(args.dump, args.output)
+    index = load_dump_index(args.dump, args.output)
+    print(f"{len(index)} products indexed in {args.output or dump_index_filepath(args.dump)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Array view of the ingredients data used by the hot paths of the impact estimation.
+
+The tables are read from the compiled bundle (see :mod:`data.bundle`) when it is available. The arrays are then
+read-only views of the memory-mapped file, whose physical pages are shared by all the processes using it. Otherwise,
+the tables are compiled in memory from the JSON and CSV files.
+"""
+
+import numpy as np
+
+from data.bundle import StringTable, UNCERTAINTY_PARAMETERS, NUTRIMENTS_VALUES, _ingredients_arrays, \
+    _reference_distribution_arrays
+
+
+class IngredientsTables:
+    def __init__(self, array, strings):
+        """
+        Args:
+            array (callable): Function returning an array of the bundle from its name.
+            strings (callable): Function returning a string table of the bundle from its name.
+        """
+        self.ingredients_ids = strings('ingredients.ids')
+        self.nutriments = array('ingredients.nutriments')
+        self.nutriments_names = strings('nutriments.names')
+        self.impacts = array('ingredients.impacts')
+        self.impacts_names = strings('impacts.names')
+        self.uncertainty_offsets = array('uncertainty.offsets')
+        self.uncertainty_distributions = array('uncertainty.distributions')
+        self.uncertainty_distributions_names = list(strings('uncertainty.distributions_names'))
+        self.uncertainty_parameters = array('uncertainty.parameters')
+
+        self.reference_ids = strings('reference_distribution.ids')
+        self.reference_offsets = array('reference_distribution.offsets')
+        self.reference_index = array('reference_distribution.index')
+        self.reference_percent = array('reference_distribution.percent')
+        self.reference_categories = strings('reference_distribution.categories_tags')
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        return cls(bundle.array, bundle.strings)
+
+    @classmethod
+    def from_data(cls, ingredients_data, ref_ing_dist):
+        """ Compiles the tables in memory. """
+        arrays, strings = _ingredients_arrays(ingredients_data)
+        distribution_arrays, distribution_strings, _ = _reference_distribution_arrays(ref_ing_dist)
+        arrays.update(distribution_arrays)
+        strings.update(distribution_strings)
+
+        return cls(arrays.__getitem__, lambda name: StringTable(*StringTable.encode(strings[name])))
+
+    def ingredient_row(self, ingredient_id):
+        """ Row of an ingredient in the ingredients tables, None if the ingredient is not characterized. """
+        return self.ingredients_ids.index.get(ingredient_id)
+
+    def ingredient_nutriments(self, ingredient_id, nutriment):
+        """
+        Nutriment content of an ingredient.
+
+        Returns:
+            dict: Dict with 'value', 'min' and 'max' as keys (only the known ones), None if the nutriment content of
+                this ingredient is unknown.
+        """
+        row = self.ingredient_row(ingredient_id)
+        column = self.nutriments_names.index.get(nutriment)
+        if (row is None) or (column is None) or np.isnan(self.nutriments[row, column]).all():
+            return None
+
+        return {name: float(value) for name, value in zip(NUTRIMENTS_VALUES, self.nutriments[row, column])
+                if not np.isnan(value)}
+
+    def ingredient_impact(self, ingredient_id, impact_name):
+        """
+        Impact of an ingredient.
+
+        Returns:
+            tuple: Amount of the impact and range of its uncertainty distributions (see
+                :meth:`uncertainty_distribution`). None if the impact of this ingredient is unknown.
+        """
+        row = self.ingredient_row(ingredient_id)
+        column = self.impacts_names.index.get(impact_name)
+        if (row is None) or (column is None) or np.isnan(self.impacts[row, column]):
+            return None
+
+        position = row * len(self.impacts_names) + column
+        return float(self.impacts[row, column]), range(self.uncertainty_offsets[position],
+                                                       self.uncertainty_offsets[position + 1])
+
+    def uncertainty_distribution(self, i):
+        """ Uncertainty distribution as a dict with the distribution type and its parameters. """
+        distribution = {'distribution': self.uncertainty_distributions_names[self.uncertainty_distributions[i]]}
+        distribution.update({name: float(value)
+                             for name, value in zip(UNCERTAINTY_PARAMETERS, self.uncertainty_parameters[i])
+                             if not np.isnan(value)})
+        return distribution
+
+    def reference_rows(self, ingredient_id):
+        """ Rows of the reference percentages distribution of an ingredient, in the original order. """
+        i = self.reference_ids.index.get(ingredient_id)
+        if i is None:
+            return self.reference_index[:0]
+
+        return self.reference_index[self.reference_offsets[i]:self.reference_offsets[i + 1]]
@@ -1,6 +1,9 @@
 """ Environmental impact estimation for Open Food Facts products """
 
-from impacts_estimation.impacts_estimation import estimate_impacts, estimate_impacts_safe
+from impacts_estimation.impacts_estimation import estimate_impacts, estimate_impacts_safe, build_estimation_plan
+from impacts_estimation.batch import estimate_impacts_batch
+from impacts_estimation.plan import EstimationPlan
 from impacts_estimation.exceptions import RecipeCreationError, NoKnownIngredientsError, \
-    NoCharacterizedIngredientsError, SolverTimeoutError
+    NoCharacterizedIngredientsError, SolverTimeoutError, ProductDataError, MissingProductFieldError, \
+    EmptyProductFieldError
 from impacts_estimation.vars import AGRIBALYSE_IMPACT_CATEGORIES_FR
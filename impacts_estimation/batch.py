@@ -0,0 +1,216 @@
+""" Impact estimation of batches of Open Food Facts products """
+
+import copy
+import json
+import multiprocessing
+import time
+
+from impacts_estimation.cost_model import CostModel, cost_features
+from impacts_estimation.impacts_estimation import build_estimation_plan, estimate_impacts
+from impacts_estimation.vars import NUTRIMENTS_CATEGORIES, TOP_LEVEL_NUTRIMENTS_CATEGORIES, \
+    QUALITY_DATA_WARNINGS_FLAT
+from settings import VERBOSITY
+
+
+def _canonical_ingredients(product):
+    """
+    Recursive function returning the ingredients tree of a product reduced to the attributes used by the estimator.
+
+    Args:
+        product (dict): Dict corresponding to a product or a compound ingredient.
+
+    Returns:
+        list: List of dicts corresponding to the canonical ingredients
+    """
+    result = []
+    for ingredient in product['ingredients']:
+        canonical_ingredient = {'id': ingredient['id']}
+        for key in ('percent', 'percent-type'):
+            if key in ingredient:
+                canonical_ingredient[key] = ingredient[key]
+        if 'ingredients' in ingredient:
+            canonical_ingredient['ingredients'] = _canonical_ingredients(ingredient)
+        result.append(canonical_ingredient)
+
+    return result
+
+
+def canonical_form(plan):
+    """
+    Returns the canonical form of a preprocessed product, i.e. the exact inputs consumed by the estimator.
+
+    Notes:
+        Nutriments are kept both as they are read by the recipe constraints (``<nutriment>_100g`` keys) and as they are
+        read by :func:`~impacts_estimation.utils.confidence_score` (keys stripped of their ``_100g`` suffix, the last
+        one winning).
+
+    Args:
+        plan (EstimationPlan): Estimation plan of the product.
+
+    Returns:
+        str: JSON serialization of the canonical form of the product.
+    """
+    product = plan.product
+
+    nutriments = product.get('nutriments')
+    if nutriments is not None:
+        reference_nutriments = {k.replace('_100g', ''): v for k, v in nutriments.items()}
+        nutriments = {
+            'constraints': {x: nutriments[f"{x}_100g"] for x in NUTRIMENTS_CATEGORIES if f"{x}_100g" in nutriments},
+            'reference': {x: reference_nutriments[x] for x in TOP_LEVEL_NUTRIMENTS_CATEGORIES
+                          if x in reference_nutriments},
+            'empty': len(nutriments) == 0
+        }
+
+    canonical_product_form = {
+        'ingredients': _canonical_ingredients(product),
+        'nutriments': nutriments,
+        'categories_tags': product.get('categories_tags'),
+        'data_quality_tags': sorted(x for x in product.get('data_quality_tags', [])
+                                    if x in QUALITY_DATA_WARNINGS_FLAT),
+        'warnings': plan.warnings,
+        'ignored_unknown_ingredients': plan.ignored_unknown_ingredients,
+        'use_defined_prct': plan.use_defined_prct,
+        'use_nutritional_info_override': plan.use_nutritional_info_override,
+        'adjusted_maximum_evaporation_coefficient': plan.adjusted_maximum_evaporation_coefficient,
+    }
+
+    return json.dumps(canonical_product_form, sort_keys=True, ensure_ascii=False)
+
+
+def canonical_product(product, ignore_unknown_ingredients=True, use_defined_prct=True):
+    """
+    Returns the canonical form of a product, i.e. the exact inputs consumed by the estimator once the product has been
+    preprocessed (allergens removal, unknown ingredients removal, ingredients graph cleaning, percentages checks and
+    ingredients individualization).
+
+    Two products with the same canonical form will give the same impact estimation for the same seed.
+
+    Args:
+        product (dict): Dict containing an Open Food Facts product.
+        ignore_unknown_ingredients (bool): Should ingredients absent of OFF taxonomy and without defined percentage
+            be considered as parsing errors and ignored?
+        use_defined_prct (bool): Should ingredients percentages defined in the product be used?
+
+    Returns:
+        str: JSON serialization of the canonical form of the product.
+    """
+
+    return canonical_form(build_estimation_plan(product=product,
+                                                ignore_unknown_ingredients=ignore_unknown_ingredients,
+                                                use_defined_prct=use_defined_prct))
+
+
+def _estimate_group(args):
+    """
+    Estimates the impacts of the representative product of a group, returning the exception if one is raised, and
+    the calculation time.
+    """
+    group_index, kwargs = args
+    start_time = time.time()
+    try:
+        result = estimate_impacts(**kwargs)
+    except Exception as e:
+        result = e
+
+    return group_index, result, time.time() - start_time
+
+
+def estimate_impacts_batch(products, impact_names, seeds=None, ignore_seeds=False, workers=1, cost_model=None,
+                           **kwargs):
+    """
+    Estimates the impacts of several products, computing only once the impacts of products that are equivalent for
+    the estimator (store brand clones for example).
+
+    Products are grouped by canonical form (see :func:`canonical_product`) and by seed. The impacts of each group are
+    estimated once and the result is copied to every product of the group.
+
+    The estimations predicted to be the longest by the cost model are dispatched first to the workers to avoid
+    ending the batch with a few long estimations running on a few workers.
+
+    Args:
+        products (list): List of Open Food Facts products.
+        impact_names (str or list): Iterable containing impacts names or single impact name.
+        seeds (int or list): Random seed used for all products or list of random seeds, one per product.
+        ignore_seeds (bool): If True, products with the same canonical form are grouped even if their seeds are
+            different. The seed of the first product of the group is used.
+        workers (int): Number of processes used to estimate the impacts of the groups.
+        cost_model (CostModel): Model used to predict the calculation time of the estimations. Default coefficients
+            are used if None.
+        **kwargs: Other parameters passed to :func:`~impacts_estimation.impacts_estimation.estimate_impacts`.
+
+    Returns:
+        dict: Dictionary containing the results (one per product, in the same order as the products, either an
+        impact estimation result or the exception raised during the estimation), the number of products, the number
+        of estimations actually computed, the deduplication ratio (number of products per estimation) and the cost
+        report (features, predicted and actual calculation time of each estimation) that can be used to refit the cost
+        model.
+    """
+    cost_model = cost_model or CostModel()
+
+    if (seeds is None) or isinstance(seeds, int):
+        seeds = [seeds] * len(products)
+    if len(seeds) != len(products):
+        raise ValueError("There must be as many seeds as products.")
+
+    preprocessing_kwargs = {k: v for k, v in kwargs.items() if k in ('ignore_unknown_ingredients',
+                                                                      'use_defined_prct')}
+
+    results = [None] * len(products)
+    plans = dict()
+    groups = dict()
+    for index, product in enumerate(products):
+        try:
+            plan = build_estimation_plan(product, **preprocessing_kwargs)
+        except Exception as e:
+            # Preprocessing errors are deterministic, no need to estimate the impacts to know the result
+            results[index] = e
+            continue
+
+        product_canonical_form = canonical_form(plan)
+        key = product_canonical_form if ignore_seeds else (product_canonical_form, seeds[index])
+        plans.setdefault(key, plan)
+        groups.setdefault(key, []).append(index)
+
+    # The estimations use the plans of the products to avoid preprocessing them again
+    estimations_kwargs = [dict(product=plans[key], impact_names=impact_names, seed=seeds[group[0]], **kwargs)
+                          for key, group in groups.items()]
+    cost_report = []
+    for key, group in groups.items():
+        features = cost_features(plans[key])
+        cost_report.append({'features': features,
+                            'predicted_cost': cost_model.predict(features),
+                            'actual_cost': None,
+                            'number_of_products': len(group)})
+    groups = list(groups.values())
+
+    # Longest predicted estimations first
+    schedule = sorted(range(len(groups)), key=lambda x: cost_report[x]['predicted_cost'], reverse=True)
+    tasks = [(group_index, estimations_kwargs[group_index]) for group_index in schedule]
+
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            groups_results = list(pool.imap_unordered(_estimate_group, tasks, chunksize=1))
+    else:
+        groups_results = [_estimate_group(x) for x in tasks]
+
+    # Fanning out the results to all the products of each group
+    for group_index, group_result, calculation_time in groups_results:
+        cost_report[group_index]['actual_cost'] = calculation_time
+        for rank, index in enumerate(groups[group_index]):
+            results[index] = group_result if rank == 0 else copy.deepcopy(group_result)
+
+    number_of_estimations = len(groups)
+    dedup_ratio = len(products) / number_of_estimations if number_of_estimations else None
+
+    if VERBOSITY >= 1:
+        print(f"{len(products)} products, {number_of_estimations} estimations computed "
+              f"(deduplication ratio: {dedup_ratio})")
+        print(f"Predicted cost: {sum(x['predicted_cost'] for x in cost_report):.1f}s, "
+              f"actual cost: {sum(x['actual_cost'] for x in cost_report):.1f}s")
+
+    return {'results': results,
+            'number_of_products': len(products),
+            'number_of_estimations': number_of_estimations,
+            'dedup_ratio': dedup_ratio,
+            'cost_report': cost_report}
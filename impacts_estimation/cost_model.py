@@ -0,0 +1,154 @@
+"""
+Model predicting the calculation time of the impact estimation of a product.
+
+The logarithm of the calculation time is modeled as a linear function of features computed during the preprocessing
+of the product. The model can be calibrated from the cost reports of batch estimations
+(see :func:`~impacts_estimation.batch.estimate_impacts_batch`):
+
+    python -m impacts_estimation.cost_model cost_report.json cost_model.json
+"""
+
+import argparse
+import json
+import math
+
+import numpy as np
+
+from impacts_estimation.impacts_estimation import ing_with_ref_prct_dist
+from impacts_estimation.utils import original_id
+from impacts_estimation.vars import NUTRIMENTS_CATEGORIES
+
+COST_MODEL_FEATURES = ['nb_ing', 'depth', 'nb_nutriments', 'nb_defined_percentages', 'reference_distribution_coverage']
+
+# Rough default coefficients of the log of the calculation time in seconds. They should be refitted on actual timings.
+DEFAULT_COST_MODEL_COEFFICIENTS = {'intercept': 0.5,
+                                   'nb_ing': 0.25,
+                                   'depth': 0.3,
+                                   'nb_nutriments': 0.1,
+                                   'nb_defined_percentages': -0.05,
+                                   'reference_distribution_coverage': 0.5}
+
+
+def _depth(product):
+    """
+    Depth of the ingredients tree of a product.
+
+    Examples:
+        >>> _depth({'ingredients': [{'id': 'A'}, {'id': 'B', 'ingredients': [{'id': 'C'}]}]})
+        2
+    """
+    return 1 + max([_depth(x) for x in product['ingredients'] if 'ingredients' in x], default=0)
+
+
+def _nb_defined_percentages(product):
+    """ Number of ingredients of a product with a defined percentage. """
+    result = 0
+    for ingredient in product['ingredients']:
+        if ingredient.get('percent'):
+            result += 1
+        if 'ingredients' in ingredient:
+            result += _nb_defined_percentages(ingredient)
+
+    return result
+
+
+def cost_features(plan):
+    """
+    Features of a product used to predict the calculation time of its impact estimation.
+
+    Args:
+        plan (EstimationPlan): Estimation plan of the product.
+
+    Returns:
+        dict: Dict with the features names as keys and the features values as values.
+    """
+    nutriments = plan.product.get('nutriments', dict())
+    nb_nutriments = 0 if plan.use_nutritional_info_override is False \
+        else len([x for x in NUTRIMENTS_CATEGORIES if f"{x}_100g" in nutriments])
+    nb_defined_percentages = _nb_defined_percentages(plan.product) if plan.use_defined_prct else 0
+    reference_distribution_coverage = len([x for x in plan.leaf_ingredients_names
+                                           if original_id(x) in ing_with_ref_prct_dist]) \
+        / len(plan.leaf_ingredients_names)
+
+    return {'nb_ing': plan.nb_ing,
+            'depth': _depth(plan.product),
+            'nb_nutriments': nb_nutriments,
+            'nb_defined_percentages': nb_defined_percentages,
+            'reference_distribution_coverage': reference_distribution_coverage}
+
+
+class CostModel:
+    def __init__(self, coefficients=None):
+        """
+        Args:
+            coefficients (dict): Coefficients of the model, with the features names and 'intercept' as keys.
+                Default coefficients are used if None.
+        """
+        self.coefficients = coefficients or DEFAULT_COST_MODEL_COEFFICIENTS
+
+    def predict(self, features):
+        """
+        Predicts the calculation time of an impact estimation.
+
+        Args:
+            features (dict): Features of the product (see :func:`cost_features`).
+
+        Returns:
+            float: Predicted calculation time in seconds.
+        """
+        return math.exp(self.coefficients['intercept']
+                        + sum(self.coefficients[x] * features[x] for x in COST_MODEL_FEATURES))
+
+    @classmethod
+    def fit(cls, records):
+        """
+        Fits a model by least squares on the logarithm of actual calculation times.
+
+        Args:
+            records (list): List of dicts containing the 'features' and the 'actual_cost' in seconds of estimations,
+                as in the cost report of :func:`~impacts_estimation.batch.estimate_impacts_batch`.
+
+        Returns:
+            CostModel: Fitted model.
+        """
+        records = [x for x in records if x.get('actual_cost') and x['actual_cost'] > 0]
+        if len(records) <= len(COST_MODEL_FEATURES):
+            raise ValueError(f"At least {len(COST_MODEL_FEATURES) + 1} timed estimations are needed to fit the model.")
+
+        features = np.array([[1] + [x['features'][feature] for feature in COST_MODEL_FEATURES] for x in records],
+                            dtype=float)
+        log_costs = np.log([x['actual_cost'] for x in records])
+
+        coefficients, _, _, _ = np.linalg.lstsq(features, log_costs, rcond=None)
+
+        return cls(dict(zip(['intercept'] + COST_MODEL_FEATURES, [float(x) for x in coefficients])))
+
+    def save(self, filepath):
+        with open(filepath, 'w') as file:
+            json.dump(self.coefficients, file, indent=2)
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'r') as file:
+            return cls(json.load(file))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit the impact estimation cost model on a batch cost report.')
+    parser.add_argument('cost_report', type=str, help='JSON file containing the cost report of batch estimations')
+    parser.add_argument('output_file', type=str, help='JSON file where the model coefficients will be saved')
+    args = parser.parse_args()
+
+    with open(args.cost_report, 'r') as file:
+        records = json.load(file)
+
+    model = CostModel.fit(records)
+    model.save(args.output_file)
+
+    errors = [math.log(model.predict(x['features']) / x['actual_cost']) for x in records if x.get('actual_cost')]
+    print(f"Model fitted on {len(errors)} estimations. "
+          f"Log RMSE: {math.sqrt(sum(x ** 2 for x in errors) / len(errors)):.3f}")
+
+
+if __name__ == '__main__':
+    main()
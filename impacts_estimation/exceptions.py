@@ -15,3 +15,16 @@ class NoKnownIngredientsError(Exception):
 
 class NoCharacterizedIngredientsError(Exception):
     pass
+
+
+class ProductDataError(Exception):
+    """ Raised when the product lacks the data needed to estimate its impacts. """
+    pass
+
+
+class MissingProductFieldError(ProductDataError, AttributeError):
+    pass
+
+
+class EmptyProductFieldError(ProductDataError, ValueError):
+    pass
@@ -22,21 +22,27 @@ from pyscipopt import Model
 from impacts_estimation.utils import natural_bounds, nutritional_error_margin, \
     clear_ingredient_graph, define_subingredients_percentage_type, find_ingredients_graph_leaves, \
     flat_ingredients_list_BFS, individualize_ingredients, original_id, nutriments_from_recipe, \
-    remove_percentage_from_product, confidence_score, UnknownIngredientsRemover, agribalyse_impact_name_i18n
+    remove_percentage_from_product, confidence_scores, nutriments_from_scaled_recipe, \
+    UnknownIngredientsRemover, agribalyse_impact_name_i18n
 from impacts_estimation.vars import NUTRIMENTS_CATEGORIES, QUALITY_DATA_WARNINGS, \
-    TOP_LEVEL_NUTRIMENTS_CATEGORIES, MAX_ASH_CONTENT, FERMENTATION_AGENTS, FERMENTED_FOOD_CATEGORIES, \
-    HIGH_WATER_LOSS_CATEGORIES, IMPACT_MASS_UNIT, AGRIBALYSE_IMPACT_UNITS, RESULTS_WARNINGS_NOT_RELIABLE
+    TOP_LEVEL_NUTRIMENTS_CATEGORIES, FERMENTATION_AGENTS, FERMENTED_FOOD_CATEGORIES, \
+    HIGH_WATER_LOSS_CATEGORIES, IMPACT_MASS_UNIT, AGRIBALYSE_IMPACT_UNITS, RESULTS_WARNINGS_NOT_RELIABLE, \
+    DEFINED_PERCENTAGES_NOT_USED_WARNING, AGRIBALYSE_IMPACT_CATEGORIES_FR, COMPOSITION_COLUMNS
+from impacts_estimation.ingredients_tree import IngredientsTree
+from impacts_estimation.plan import EstimationPlan, added_water_name, leaf_ingredients_nutriments
 from settings import VERBOSITY, IMPACT_RELATIVE_INTERQUARTILE_WARNING_THRESHOLD, \
     UNCHARACTERIZED_INGREDIENTS_MASS_WARNING_THRESHOLD, \
     UNCHARACTERIZED_INGREDIENTS_RATIO_WARNING_THRESHOLD, MAX_CONSECUTIVE_RECIPE_CREATION_ERROR, \
     DECREASING_PROPORTION_ORDER_LIMIT, TOTAL_MASS_DISTRIBUTION_STEP, \
     MAX_CONSECUTIVE_NULL_IMPACT_CHARACTERIZED_INGREDIENTS_MASS, MINIMUM_TOTAL_MASS_FOR_UNBALANCED_RECIPES, \
     OFF_INGREDIENTS_FORMAT
-from data import ref_ing_dist, ingredients_data, off_taxonomy
+from impacts_estimation.registry import registry, UNKNOWN_INGREDIENT
+from data import LazyData, ingredients_data, ingredients_tables, off_taxonomy
 from impacts_estimation.exceptions import RecipeCreationError, NoKnownIngredientsError, SolverTimeoutError, \
-    NoCharacterizedIngredientsError
+    NoCharacterizedIngredientsError, MissingProductFieldError, EmptyProductFieldError
 
-ing_with_ref_prct_dist = list(ref_ing_dist.id.unique())
+# Ingredients having a reference percentage distribution
+ing_with_ref_prct_dist = LazyData(lambda: set(ingredients_tables.reference_ids))
 
 
 class RecipeImpactCalculator:
@@ -68,16 +74,20 @@ class RecipeImpactCalculator:
         set to False, simply use the default value. Else pick a value using the uncertainty parameters.
         """
 
-        for ingredient in self.recipe:
-            try:
-                ingredient_impact_data = ingredients_data[ingredient]['impacts'][self.impact_name]
-            except KeyError:
+        if self.impact_name not in AGRIBALYSE_IMPACT_CATEGORIES_FR:
+            return
+        impact_column = AGRIBALYSE_IMPACT_CATEGORIES_FR.index(self.impact_name)
+
+        for ingredient, row in zip(self.recipe, registry.intern(self.recipe)):
+            if (row == UNKNOWN_INGREDIENT) or (not registry.impacts_mask[row, impact_column]):
                 continue
-            if ('uncertainty_distributions' not in ingredient_impact_data) or (not self.use_uncertainty):
-                self.ingredients_impacts[ingredient] = ingredient_impact_data['amount']
+            uncertainty_distributions = registry.uncertainty_distributions(row, impact_column)
+            if (len(uncertainty_distributions) == 0) or (not self.use_uncertainty):
+                self.ingredients_impacts[ingredient] = float(registry.impacts[row, impact_column])
             else:
                 # Pick a random uncertainty distribution
-                uncertainty_distribution = self.random_state.choice(ingredient_impact_data['uncertainty_distributions'])
+                uncertainty_distribution = registry.uncertainty_distribution(
+                    uncertainty_distributions[self.random_state.choice(len(uncertainty_distributions))])
                 if uncertainty_distribution['distribution'] == 'normal':
                     self.ingredients_impacts[ingredient] = self.random_state.normal(uncertainty_distribution['mean'],
                                                                                     uncertainty_distribution['standard deviation'])
@@ -196,7 +206,7 @@ class RandomRecipeCreator:
     def __init__(self, product, use_defined_prct=True, use_nutritional_info=True, const_relax_coef=0,
                  maximum_evaporation=0.4, total_mass_used=None, min_prct_dist_size=30, dual_gap_type='absolute',
                  dual_gap_limit=0.001, solver_time_limit=60, time_limit_dual_gap_limit=0.01, random_state=None,
-                 allow_unbalanced_recipe=False, confidence_score_weighting_factor=10):
+                 allow_unbalanced_recipe=False, confidence_score_weighting_factor=10, plan=None):
         """
         Args:
             product (dict): Dict containing an OpenFoodFact product.
@@ -225,6 +235,8 @@ class RandomRecipeCreator:
             confidence_score_weighting_factor (float): Weighting factor used for the confidence score calculation.
                 It corresponds to the weight of the nutritional distance against the absolute difference between the
                  total mass and 100g/100g.
+            plan (EstimationPlan): Estimation plan of the product. If given, its precompiled ingredients lists and
+                nutritional tables are used instead of being computed from the product.
         """
         self.product = product
         self.use_defined_prct = use_defined_prct
@@ -232,13 +244,25 @@ class RandomRecipeCreator:
         self.const_relax_coef = const_relax_coef
         self.min_dist_size = min_prct_dist_size
         self.total_mass_used = total_mass_used
-        individualize_ingredients(self.product)
+        if plan is None:
+            individualize_ingredients(self.product)
+            tree = IngredientsTree(self.product)
+            self.top_level_ingredients_names = tree.ids[:tree.nb_top_level]
+            self.leaf_ingredients_names = [x['id'] for x in tree.leaves()]
+            self.all_ingredients_names = [tree.ids[i] for i in tree.siblings_groups_order()]
+            self.added_water_name = added_water_name(self.top_level_ingredients_names, self.leaf_ingredients_names)
+            if self.added_water_name is not None:
+                self.leaf_ingredients_names.append(self.added_water_name)
+            self.nutriments_min, self.nutriments_max = leaf_ingredients_nutriments(self.leaf_ingredients_names)
+        else:
+            self.top_level_ingredients_names = list(plan.top_level_ingredients_names)
+            self.leaf_ingredients_names = list(plan.leaf_ingredients_names)
+            self.all_ingredients_names = plan.all_ingredients_names
+            self.added_water_name = plan.added_water_name
+            self.nutriments_min, self.nutriments_max = plan.leaf_nutriments_min, plan.leaf_nutriments_max
+        # Row of each leaf ingredient in the nutritional composition tables
+        self.leaf_rows = {x: i for i, x in enumerate(self.leaf_ingredients_names)}
         self.top_level_ingredients = product['ingredients']
-        self.top_level_ingredients_names = [x['id'] for x in self.top_level_ingredients]
-        self.leaf_ingredients = find_ingredients_graph_leaves(self.product)
-        self.leaf_ingredients_names = [x['id'] for x in self.leaf_ingredients]
-        self.all_ingredients = flat_ingredients_list_BFS(self.product)
-        self.all_ingredients_names = [x['id'] for x in self.all_ingredients]
         self.decreasing_order_limit_rank = None
         self.dual_gap_type = dual_gap_type.lower()
         self.time_limit_dual_gap_limit = time_limit_dual_gap_limit
@@ -287,29 +311,9 @@ class RandomRecipeCreator:
             self.ingredient_vars[ingredient_name] = self.model.addVar(ingredient_name, vtype="C", lb=0, ub=1)
 
         # If water is not present in the ingredient list, add it as water under 5% hasn't to be declared
-        if 'en:water' not in self.top_level_ingredients_names:
-            # Water may be in leaf ingredients but not in top level ingredients, in that case it must be individualized
-            water_name = 'en:water'
-            while water_name in self.leaf_ingredients_names:
-                water_name += '*'
-            self.ingredient_vars[water_name] = self.model.addVar(water_name, vtype="C", lb=0, ub=0.05)
-            self.leaf_ingredients_names.append(water_name)
-
-        # Creating a dict with ingredients nutritional data
-        self.ingredients_data = dict()
-        for ingredient_name in self.leaf_ingredients_names:
-            if ingredient_name not in self.ingredients_data:
-                self.ingredients_data[ingredient_name] = dict()
-            for nutri_item in NUTRIMENTS_CATEGORIES + ['water', 'ash']:
-                if (original_id(ingredient_name) in ingredients_data) \
-                        and (nutri_item in ingredients_data[original_id(ingredient_name)].get('nutriments', [])):
-                    self.ingredients_data[ingredient_name][nutri_item] = \
-                        ingredients_data[original_id(ingredient_name)]['nutriments'][nutri_item]
-                else:
-                    # Giving default minimum and maximum nutriment/water content (0 and 100%) to unknown ingredients
-                    self.ingredients_data[ingredient_name][nutri_item] = {'min': 0,
-                                                                          'max': MAX_ASH_CONTENT if nutri_item == 'ash'
-                                                                          else 100}
+        if self.added_water_name is not None:
+            self.ingredient_vars[self.added_water_name] = self.model.addVar(self.added_water_name, vtype="C", lb=0,
+                                                                            ub=0.05)
 
     def _add_used_mass_constraint(self):
         """ Adding the constraint that the total used mass of ingredients is bounded by the evaporation coefficient. """
@@ -378,12 +382,14 @@ class RandomRecipeCreator:
                 supposed to be 0 for upper bound)
         """
 
+        water = COMPOSITION_COLUMNS['water']
+
         # Lower bound
         self.model.addCons(
             self.total_mass_var * (1 - self.evaporation_var * (
-                sum([self.ingredient_vars[ing] * self.ingredients_data[ing]['water']['max'] / 100
+                sum([self.ingredient_vars[ing] * self.nutriments_max[self.leaf_rows[ing], water] / 100
                      for ing in self.ingredient_vars
-                     if ing in self.leaf_ingredients_names])
+                     if ing in self.leaf_rows])
             ))
             <= (1 + self.const_relax_coef),
             name="Product mass evaporation lower bound"
@@ -393,9 +399,9 @@ class RandomRecipeCreator:
         self.product_mass_evaporation_upper_bound_constraint = \
             self.model.addCons(
                 self.total_mass_var * (1 - self.evaporation_var * (
-                    sum([self.ingredient_vars[ing] * self.ingredients_data[ing]['water']['min'] / 100
+                    sum([self.ingredient_vars[ing] * self.nutriments_min[self.leaf_rows[ing], water] / 100
                          for ing in self.ingredient_vars
-                         if ing in self.leaf_ingredients_names])
+                         if ing in self.leaf_rows])
                 ))
                 >= (1 - self.const_relax_coef),
                 name="Product mass evaporation upper bound"
@@ -404,15 +410,17 @@ class RandomRecipeCreator:
     def _add_product_mass_constraint(self):
         """ The product mass is bounded by the sum of all nutriments and the remaining water """
 
+        water = COMPOSITION_COLUMNS['water']
+        dry_matter = [COMPOSITION_COLUMNS[x] for x in TOP_LEVEL_NUTRIMENTS_CATEGORIES + ['ash']]
+
         # Lower bound
         self.model.addCons(
             self.total_mass_var * (
                 sum([
                     self.ingredient_vars[ingredient] *
-                    (((1 - self.evaporation_var) * self.ingredients_data[ingredient]['water']['min'] / 100) +
-                     sum([self.ingredients_data[ingredient][nutriment]['min'] / 100
-                          for nutriment in TOP_LEVEL_NUTRIMENTS_CATEGORIES + ['ash']]))
-                    for ingredient in self.leaf_ingredients_names
+                    (((1 - self.evaporation_var) * self.nutriments_min[row, water] / 100) +
+                     sum([self.nutriments_min[row, column] / 100 for column in dry_matter]))
+                    for row, ingredient in enumerate(self.leaf_ingredients_names)
                 ])
             )
             <= (1 + self.const_relax_coef),
@@ -423,10 +431,9 @@ class RandomRecipeCreator:
         self.model.addCons(
             self.total_mass_var * (
                 sum([self.ingredient_vars[ingredient] *
-                     (((1 - self.evaporation_var) * self.ingredients_data[ingredient]['water']['max'] / 100) +
-                      sum([self.ingredients_data[ingredient][nutriment]['max'] / 100
-                           for nutriment in TOP_LEVEL_NUTRIMENTS_CATEGORIES + ['ash']]))
-                     for ingredient in self.leaf_ingredients_names])
+                     (((1 - self.evaporation_var) * self.nutriments_max[row, water] / 100) +
+                      sum([self.nutriments_max[row, column] / 100 for column in dry_matter]))
+                     for row, ingredient in enumerate(self.leaf_ingredients_names)])
             )
             >= (1 - self.const_relax_coef),
             name="Product mass upper bound"
@@ -455,6 +462,7 @@ class RandomRecipeCreator:
             else:
                 product_nutriment = float(product_nutriment)
 
+            column = COMPOSITION_COLUMNS[nutri_item]
             margins = nutritional_error_margin(nutriment=nutri_item, value=product_nutriment / 100)
             absolute_margin = margins['absolute']
             relative_margin = margins['relative']
@@ -464,9 +472,9 @@ class RandomRecipeCreator:
                 ((absolute_margin + (1 + relative_margin) * product_nutriment / 100) + self.const_relax_coef)
                 >=
                 (self.total_mass_var *
-                 sum([var * self.ingredients_data[name][nutri_item]['min'] / 100
+                 sum([var * self.nutriments_min[self.leaf_rows[name], column] / 100
                       for name, var in self.ingredient_vars.items()
-                      if name in self.leaf_ingredients_names])),
+                      if name in self.leaf_rows])),
                 name=f"Lower bound for {nutri_item}"
             )
 
@@ -475,9 +483,9 @@ class RandomRecipeCreator:
                 ((-absolute_margin + (1 - relative_margin) * product_nutriment / 100) - self.const_relax_coef)
                 <=
                 (self.total_mass_var *
-                 (sum([var * self.ingredients_data[name][nutri_item]['max'] / 100
+                 (sum([var * self.nutriments_max[self.leaf_rows[name], column] / 100
                        for name, var in self.ingredient_vars.items()
-                       if name in self.leaf_ingredients_names]))
+                       if name in self.leaf_rows]))
                  ),
                 name=f"Upper bound for {nutri_item}"
             )
@@ -635,11 +643,13 @@ class RandomRecipeCreator:
         if ingredient_name in ing_with_ref_prct_dist:
 
             # Getting the reference percentage distribution of this ingredient
-            reference_distribution = ref_ing_dist[ref_ing_dist.id == ingredient_name]
+            reference_rows = ingredients_tables.reference_rows(ingredient_name)
+            reference_percents = ingredients_tables.reference_percent[reference_rows]
 
             # Stripping the values outside of the interval of possible solutions
-            reference_distribution = reference_distribution[inf <= reference_distribution.percent]
-            reference_distribution = reference_distribution[reference_distribution.percent <= sup]
+            in_interval = (inf <= reference_percents) & (reference_percents <= sup)
+            reference_rows = reference_rows[in_interval]
+            reference_percents = reference_percents[in_interval]
 
             # If the product has categories, looping on it from the most specific to the most general and
             # stopping the loop when there are enough data in the reference distribution of the ingredient for
@@ -647,24 +657,25 @@ class RandomRecipeCreator:
             # distribution does not have enough data, use a uniform distribution.
 
             if self.product.get('categories_tags'):  # If the product has a non empty category tags
-                category_distribution = []
+                rows_categories = [ingredients_tables.reference_categories[x] for x in reference_rows]
+                category_percents = []
                 category_index = len(self.product['categories_tags'])
-                while (len(category_distribution) < self.min_dist_size) and (category_index >= 0):
+                while (len(category_percents) < self.min_dist_size) and (category_index >= 0):
                     category_index -= 1
                     category = self.product['categories_tags'][category_index]
-                    mask = reference_distribution.categories_tags.apply(lambda x: category in (x or []))
-                    category_distribution = reference_distribution[mask]
+                    mask = np.array([category in x for x in rows_categories], dtype=bool)
+                    category_percents = reference_percents[mask]
 
-                if len(category_distribution) >= self.min_dist_size:
-                    reference_distribution = category_distribution
+                if len(category_percents) >= self.min_dist_size:
+                    reference_percents = category_percents
 
             # If there are less values than required, use uniform distribution
-            if len(reference_distribution) < self.min_dist_size:
+            if len(reference_percents) < self.min_dist_size:
                 percent = self.random_state.uniform(inf, sup)
             else:
                 bandwidth = (sup - inf) / 10
                 kde = KernelDensity(kernel='gaussian', bandwidth=bandwidth)
-                kde.fit(reference_distribution.percent.values.reshape(-1, 1))
+                kde.fit(reference_percents.reshape(-1, 1))
 
                 # Plotting the KDE for debug purpose, comment on production
                 # x_plot = np.linspace(inf - 5 * bandwidth, sup + 5 * bandwidth, 1000)[:, np.newaxis]
@@ -675,14 +686,14 @@ class RandomRecipeCreator:
                 # # Plotting distribution
                 # ax.plot(x_plot, y_plot)
                 # # Plotting data points
-                # ax.scatter(reference_distribution.percent.values, np.zeros(len(reference_distribution)),
+                # ax.scatter(reference_percents, np.zeros(len(reference_percents)),
                 #            marker='+', alpha=0.2, color='darksalmon')
                 # # Plotting the bounds
                 # ax.axvline(sup, color="seagreen", linestyle="dashed", linewidth=4)
                 # ax.axvline(inf, color="seagreen", linestyle="dashed", linewidth=4)
                 #
                 # ax.set_title(
-                #     f"{ingredient_name} - bw:{round(bandwidth, 2)} - density:{round(len(reference_distribution) / (sup - inf))}")
+                #     f"{ingredient_name} - bw:{round(bandwidth, 2)} - density:{round(len(reference_percents) / (sup - inf))}")
                 #
                 # plt.show()
 
@@ -711,17 +722,14 @@ class RandomRecipeCreator:
 
         Examples:
             >>> RandomRecipeCreator.recipe_from_proportions({'en:egg':0.7, 'en:flour': 0.3}, 150)
-            {'en:flour': 45.0, 'en:egg':105.0}
+            {'en:egg': 105.0, 'en:flour': 45.0}
         """
-        ingredients_names = set()
-
-        for name in proportions:
-            ingredients_names.add(original_id(name))
+        summed_proportions = dict()
+        for name, prop in proportions.items():
+            name = original_id(name)
+            summed_proportions[name] = summed_proportions.get(name, 0) + prop
 
-        return {name: sum([prop
-                           for name_2, prop in proportions.items()
-                           if original_id(name_2) == name]) * total_mass
-                for name in ingredients_names}
+        return {name: prop * total_mass for name, prop in summed_proportions.items()}
 
     def _pick_total_mass(self, proportions):
         """
@@ -744,16 +752,9 @@ class RandomRecipeCreator:
         if (sup - inf) <= (TOTAL_MASS_DISTRIBUTION_STEP / 100):
             return 100 * (sup + inf) / 2
 
-        # Looping over the total masses ranges with a predefined step and computing the confidence score of each
-        # resulting recipe
-        max_conf_score = 0
+        # Evaluating the confidence score of the recipes of all the total masses of the range with a predefined step
         result = inf
 
-        # ### FOR DEBUG PURPOSE ONLY ###
-        # total_masses = []
-        # conf_scores = []
-        # ##############################
-
         # Compute the total mass only if nutritional info are used and there is at least one top level category
         # nutriment in common
         recipe = self.recipe_from_proportions(proportions, inf * 100)
@@ -761,37 +762,30 @@ class RandomRecipeCreator:
         if self.use_nutritional_info and any([f"{x}_100g" in self.product['nutriments']
                                               for x in recipe_nutriments
                                               if x in TOP_LEVEL_NUTRIMENTS_CATEGORIES]):
-            for total_mass in np.arange(inf, sup, TOTAL_MASS_DISTRIBUTION_STEP / 100):
-                recipe = self.recipe_from_proportions(proportions, total_mass * 100)
-                recipe_nutriments = nutriments_from_recipe(recipe)
-
-                # In some cases, the total mass is too high and will give impossible nutritional composition, in that
-                # case the confidence score calculation will raise a ValueError
-                try:
-                    conf_score = confidence_score(nutri=recipe_nutriments,
-                                                  reference_nutri=self.product['nutriments'],
-                                                  total_mass=total_mass * 100,
-                                                  min_possible_mass=MINIMUM_TOTAL_MASS_FOR_UNBALANCED_RECIPES * 100
-                                                  if self.allow_unbalanced_recipe else 100,
-                                                  max_possible_mass=100 / (1 - self.maximum_evaporation),
-                                                  weighting_factor=self.confidence_score_weighting_factor)
-                except ValueError:
-                    continue
-
-                # ### FOR DEBUG PURPOSE ONLY ###
-                # total_masses.append(total_mass)
-                # conf_scores.append(conf_score)
-                # ##############################
-
-                # If the conf score is higher than the max, update the result and the max
-                if conf_score > max_conf_score:
-                    max_conf_score = conf_score
-                    result = total_mass
-
-        # ### FOR DEBUG PURPOSE ONLY ###
-        # plt.plot(total_masses, conf_scores)
-        # plt.show()
-        # ##############################
+            total_masses = np.arange(inf, sup, TOTAL_MASS_DISTRIBUTION_STEP / 100)
+
+            # The proportions being fixed, the recipe of each total mass is the recipe of the proportions scaled by it
+            recipes_nutriments = nutriments_from_scaled_recipe(self.recipe_from_proportions(proportions, 1),
+                                                               total_masses * 100)
+
+            # In some cases, the total mass is too high and will give impossible nutritional composition, in that
+            # case the confidence score is NaN
+            conf_scores = confidence_scores(nutri=recipes_nutriments,
+                                            reference_nutri=self.product['nutriments'],
+                                            total_masses=total_masses * 100,
+                                            min_possible_mass=MINIMUM_TOTAL_MASS_FOR_UNBALANCED_RECIPES * 100
+                                            if self.allow_unbalanced_recipe else 100,
+                                            max_possible_mass=100 / (1 - self.maximum_evaporation),
+                                            weighting_factor=self.confidence_score_weighting_factor)
+
+            # ### FOR DEBUG PURPOSE ONLY ###
+            # plt.plot(total_masses, conf_scores)
+            # plt.show()
+            # ##############################
+
+            # Keeping the first total mass with the highest confidence score
+            if not np.isnan(conf_scores).all():
+                result = total_masses[np.nanargmax(conf_scores)]
 
         result *= 100
 
@@ -906,8 +900,14 @@ class ImpactEstimator:
             The impact values are calculated by doing a simple sum of all ingredients masses weighted by their own
             impact values acquired from external data.
 
+            The preprocessing of the product done by the constructor is stored in the plan attribute. This
+            :class:`~impacts_estimation.plan.EstimationPlan` can be given instead of the product to skip the
+            preprocessing of later estimations.
+
         Args:
-            product (dict): Dict containing an Open Food Facts product. It must contain the keys "ingredients"
+            product (dict or EstimationPlan): Dict containing an Open Food Facts product. It must contain the keys
+                "ingredients". Can also be an estimation plan of the product, in which case ignore_unknown_ingredients
+                is the one used to build the plan and use_defined_prct can only disable the defined percentages.
             quantity (float): Quantity of product in grams for which the impact must be calculated. Default is 100g.
             ignore_unknown_ingredients (bool): Should ingredients absent of OFF taxonomy and without defined percentage
                 be considered as parsing errors and ignored?
@@ -915,18 +915,25 @@ class ImpactEstimator:
         """
 
         self.start_time = time.time()
+        self.product_quantity = quantity
+        self.random_state = np.random.RandomState(seed=seed)
+        # Lists that will store the mass of uncharacterized ingredients for each recipe
+        self.uncharacterized_ingredients_mass_distribution = {'nutrition': [], 'impact': []}
+
+        if isinstance(product, EstimationPlan):
+            self._load_plan(product if use_defined_prct else product.without_defined_percentages())
+            return
+
         self.product = copy.deepcopy(product)
         self.ignore_unknown_ingredients = ignore_unknown_ingredients
         self.ignored_unknown_ingredients = []
-        self.product_quantity = quantity
         self.adjusted_maximum_evaporation_coefficient = None
-        self.random_state = np.random.RandomState(seed=seed)
 
         # Assert the product has ingredients
         if 'ingredients' not in product:
-            raise AttributeError("The product has no ingredients field.")
+            raise MissingProductFieldError("The product has no ingredients field.")
         if len(product['ingredients']) == 0:
-            raise ValueError("The product ingredients list is empty.")
+            raise EmptyProductFieldError("The product ingredients list is empty.")
 
         # List of text warnings to characterize the result in some special cases (too many unknown ingredients for
         #  example)
@@ -949,12 +956,9 @@ class ImpactEstimator:
         self.use_defined_prct_arg = use_defined_prct
         self.use_defined_prct = use_defined_prct
         self.uncharacterized_ingredients = {
-            'nutrition': [x for x in self.leaf_ingredients
-                          if 'nutriments'
-                          not in ingredients_data.get(original_id(x['id']), [])],
-            'impact': [x for x in self.leaf_ingredients
-                       if 'impacts'
-                       not in ingredients_data.get(original_id(x['id']), [])]
+            characterization: [x for x in self.leaf_ingredients
+                               if not registry.is_characterized(original_id(x['id']), characterization)]
+            for characterization in ('nutrition', 'impact')
         }
         self.uncharacterized_ingredients_ids = {
             'nutrition': list(set([original_id(x['id'])
@@ -964,8 +968,6 @@ class ImpactEstimator:
                                 for x in
                                 self.uncharacterized_ingredients['impact']]))
         }
-        # Lists that will store the mass of uncharacterized ingredients for each recipe
-        self.uncharacterized_ingredients_mass_distribution = {'nutrition': [], 'impact': []}
         self.uncharacterized_ingredients_ratio = {
             'nutrition': len(self.uncharacterized_ingredients['nutrition']) / self.nb_ing,
             'impact': len(self.uncharacterized_ingredients['impact']) / self.nb_ing,
@@ -988,6 +990,38 @@ class ImpactEstimator:
         # Perform checks on defined percentages of ingredients
         self._check_defined_percentages()
 
+        # Storing the result of the preprocessing so that it can be reused without the raw product
+        self.plan = EstimationPlan(
+            product=self.product,
+            ignore_unknown_ingredients=self.ignore_unknown_ingredients,
+            ignored_unknown_ingredients=self.ignored_unknown_ingredients,
+            use_defined_prct_arg=self.use_defined_prct_arg,
+            use_defined_prct=self.use_defined_prct,
+            use_nutritional_info_override=self.use_nutritional_info_override,
+            adjusted_maximum_evaporation_coefficient=self.adjusted_maximum_evaporation_coefficient,
+            warnings=list(self.warnings),
+            uncharacterized_ingredients=self.uncharacterized_ingredients,
+            uncharacterized_ingredients_ids=self.uncharacterized_ingredients_ids,
+            uncharacterized_ingredients_ratio=self.uncharacterized_ingredients_ratio)
+
+    def _load_plan(self, plan):
+        """ Sets the estimator state from an estimation plan, copying what may be modified by the estimation. """
+
+        self.plan = plan
+        self.product = plan.product
+        self.ignore_unknown_ingredients = plan.ignore_unknown_ingredients
+        self.ignored_unknown_ingredients = list(plan.ignored_unknown_ingredients)
+        self.adjusted_maximum_evaporation_coefficient = plan.adjusted_maximum_evaporation_coefficient
+        self.warnings = list(plan.warnings)
+        self.leaf_ingredients = plan.leaf_ingredients
+        self.nb_ing = plan.nb_ing
+        self.use_defined_prct_arg = plan.use_defined_prct_arg
+        self.use_defined_prct = plan.use_defined_prct
+        self.uncharacterized_ingredients = plan.uncharacterized_ingredients
+        self.uncharacterized_ingredients_ids = {k: list(v) for k, v in plan.uncharacterized_ingredients_ids.items()}
+        self.uncharacterized_ingredients_ratio = dict(plan.uncharacterized_ingredients_ratio)
+        self.use_nutritional_info_override = plan.use_nutritional_info_override
+
     def _check_fermented_product(self):
         """
             Checks if the product is fermented (alcohol or cheese for example).
@@ -1085,14 +1119,13 @@ class ImpactEstimator:
         # If there are still ingredients but none with impact, abort the program
         if len([ing
                 for ing in find_ingredients_graph_leaves(self.product)
-                if ing['id'] in ingredients_data
-                   and 'impacts' in ingredients_data[ing['id']]]) == 0:
+                if registry.is_characterized(ing['id'], 'impact')]) == 0:
             raise NoCharacterizedIngredientsError
 
         # If the only ingredient with an impact is en:water, abort the program
         ingredients_with_impacts = [x['id']
                                     for x in self.product['ingredients']
-                                    if 'impacts' in ingredients_data.get(x['id'], dict())]
+                                    if registry.is_characterized(x['id'], 'impact')]
         if ingredients_with_impacts in ([], ['en:water']):
             raise NoKnownIngredientsError
 
@@ -1242,8 +1275,7 @@ class ImpactEstimator:
         # Removing percentage value from the ingredients if use_defined_prct is False. This is only a security to avoid
         # to accidentally use ingredients defined percentages
         if self.use_defined_prct_arg and not self.use_defined_prct:
-            self.warnings.append("Inconsistencies were found in the defined percentages of the ingredients. "
-                                 "Defined percentages were not used for estimating the impact.")
+            self.warnings.append(DEFINED_PERCENTAGES_NOT_USED_WARNING)
 
             remove_percentage_from_product(self.product)
 
@@ -1310,10 +1342,11 @@ class ImpactEstimator:
             maximum_evaporation = self.adjusted_maximum_evaporation_coefficient
 
         if ('nutriments' not in self.product) and use_nutritional_info:
-            raise AttributeError("The product has no nutriments field. Set use_nutritional_info=False to force a "
-                                 "result.")
+            raise MissingProductFieldError("The product has no nutriments field. Set use_nutritional_info=False to "
+                                           "force a result.")
         if (len(self.product['nutriments']) == 0) and use_nutritional_info:
-            raise ValueError("The product nutriments list is empty. Set use_nutritional_info=False to force a result.")
+            raise EmptyProductFieldError("The product nutriments list is empty. Set use_nutritional_info=False to "
+                                         "force a result.")
 
         # Setting variables
         if forced_run_nb is not None:
@@ -1339,7 +1372,8 @@ class ImpactEstimator:
                                              time_limit_dual_gap_limit=time_limit_dual_gap_limit,
                                              allow_unbalanced_recipe=True,
                                              random_state=self.random_state,
-                                             confidence_score_weighting_factor=confidence_score_weighting_factor)
+                                             confidence_score_weighting_factor=confidence_score_weighting_factor,
+                                             plan=self.plan)
 
         run = 0
         recipes = []
@@ -1399,18 +1433,17 @@ class ImpactEstimator:
                     if consecutive_recipe_creation_error >= MAX_CONSECUTIVE_RECIPE_CREATION_ERROR:
                         raise RecipeCreationError
 
-            # Computing the confidence score of the recipe
+            # Evaluating the recipe: confidence score and mass of uncharacterized ingredients
+            evaluation = self.plan.evaluator.evaluate(self.plan.evaluator.masses(recipe_100g),
+                                                      min_possible_mass=MINIMUM_TOTAL_MASS_FOR_UNBALANCED_RECIPES * 100,
+                                                      max_possible_mass=100 / (1 - maximum_evaporation))
+
             # Compute the confidence score only if nutritional info are used and there is at least one top level
             # category nutriment in common between the computed recipe and the product's nutritional composition
-            recipe_nutriments = nutriments_from_recipe(recipe_100g)
-            if use_nutritional_info and confidence_weighting and any([f"{x}_100g" in self.product['nutriments']
-                                                                      for x in recipe_nutriments
-                                                                      if x in TOP_LEVEL_NUTRIMENTS_CATEGORIES]):
-                conf_score = confidence_score(nutri=recipe_nutriments,
-                                              reference_nutri=self.product['nutriments'],
-                                              total_mass=sum([x for x in recipe_100g.values()]),
-                                              min_possible_mass=MINIMUM_TOTAL_MASS_FOR_UNBALANCED_RECIPES * 100,
-                                              max_possible_mass=100 / (1 - maximum_evaporation))
+            if use_nutritional_info and confidence_weighting and evaluation['comparable'][0]:
+                conf_score = float(evaluation['confidence_score'][0])
+                if math.isnan(conf_score):
+                    raise ValueError("The squared difference cannot be superior to 1.")
             else:
                 # If the nutritional information is not used, all recipes are supposed to have the same confidence
                 # level.
@@ -1418,14 +1451,11 @@ class ImpactEstimator:
 
             confidence_score_distribution.append(conf_score)
 
-            # Computing the mass of unknown ingredients and adding it to the distribution
-            total_mass = sum([float(x) for x in recipe.values()])
-            total_used_mass_distribution.append(total_mass)
+            # Adding the mass of unknown ingredients to the distribution
+            total_used_mass_distribution.append(float(evaluation['total_mass'][0]) * self.product_quantity / 100)
             for characterization in 'nutrition', 'impact':
-                uncharacterized_ingredients_mass = \
-                    sum([float(recipe[x]) / total_mass for x in self.uncharacterized_ingredients_ids[characterization]])
                 self.uncharacterized_ingredients_mass_distribution[characterization].append(
-                    uncharacterized_ingredients_mass)
+                    float(evaluation['uncharacterized_mass'][characterization][0]))
 
             # Adding the recipe to the distribution
             recipes.append(recipe)
@@ -1691,6 +1721,27 @@ class ImpactEstimator:
         return result
 
 
+def build_estimation_plan(product, ignore_unknown_ingredients=True, use_defined_prct=True):
+    """
+    Preprocesses a product and returns its estimation plan. The plan can be given instead of the product to
+    :func:`estimate_impacts` or :class:`ImpactEstimator` to avoid preprocessing the product again.
+
+    Args:
+        product (dict): Dict containing an OpenFoodFact product.
+        ignore_unknown_ingredients (bool): Should ingredients absent of OFF taxonomy and without defined percentage
+            be considered as parsing errors and ignored?
+        use_defined_prct (bool): Should ingredients percentages defined in the product be used?
+
+    Returns:
+        EstimationPlan: Estimation plan of the product.
+    """
+    impact_estimator = ImpactEstimator(product=product,
+                                       ignore_unknown_ingredients=ignore_unknown_ingredients,
+                                       use_defined_prct=use_defined_prct)
+
+    return impact_estimator.plan
+
+
 def estimate_impacts(product, impact_names, quantity=100, ignore_unknown_ingredients=True, min_run_nb=30,
                      max_run_nb=1000, forced_run_nb=None, confidence_interval_width=0.05, confidence_level=0.95,
                      use_nutritional_info=True, const_relax_coef=0, use_defined_prct=True, maximum_evaporation=0.4,
@@ -1702,8 +1753,9 @@ def estimate_impacts(product, impact_names, quantity=100, ignore_unknown_ingredi
         Wrapper for impact estimation.
 
         Args:
-            product (dict): Dict containing an OpenFoodFact product.
-                It must contain the keys "ingredients" and "nutriments"
+            product (dict or EstimationPlan): Dict containing an OpenFoodFact product.
+                It must contain the keys "ingredients" and "nutriments". Can also be the estimation plan of the product
+                (see :func:`build_estimation_plan`).
             impact_names (str or list): Iterable containing impacts names or single impact name.
             quantity (float): Quantity of product in grams for which the impact must be calculated. Default is 100g.
             ignore_unknown_ingredients (bool): Should ingredients absent of OFF taxonomy and without defined percentage
@@ -1773,8 +1825,12 @@ def estimate_impacts(product, impact_names, quantity=100, ignore_unknown_ingredi
                                            confidence_score_weighting_factor=confidence_score_weighting_factor)
 
     # First attempt for getting a result with provided kwargs
+    impact_estimator = ImpactEstimator(**impact_estimator_kwargs)
+
+    # The product is preprocessed only once, the next attempts use its estimation plan
+    impact_estimator_kwargs['product'] = impact_estimator.plan
+
     try:
-        impact_estimator = ImpactEstimator(**impact_estimator_kwargs)
         return impact_estimator.estimate_impacts(**impact_estimation_method_kwargs)
 
     except (RecipeCreationError, SolverTimeoutError) as original_exception:
@@ -1812,7 +1868,7 @@ def estimate_impacts(product, impact_names, quantity=100, ignore_unknown_ingredi
         ]
 
         for constraints_level in constraints_levels:
-            new_impact_estimator_kwargs = copy.deepcopy(impact_estimator_kwargs)
+            new_impact_estimator_kwargs = dict(impact_estimator_kwargs)
             new_impact_estimation_method_kwargs = copy.deepcopy(impact_estimation_method_kwargs)
             added_warnings = []
 
@@ -0,0 +1,120 @@
+""" Array-backed representation of the ingredients tree of a product """
+
+import numpy as np
+
+
+def _percent(ingredient):
+    """ Defined percentage of an ingredient as a float, NaN if undefined or invalid. """
+    try:
+        return float(ingredient['percent'])
+    except (KeyError, TypeError, ValueError):
+        return np.nan
+
+
+class IngredientsTree:
+    """
+    Ingredients tree of a product compiled in a single pass.
+
+    The nodes are numbered in level order so that the children of each node are contiguous. The nodes themselves
+    are the ingredients dicts of the product, which are not copied.
+
+    Attributes:
+        nodes (list): Ingredients dicts.
+        ids (list): Ids of the ingredients.
+        parent (np.ndarray): Index of the parent of each node, -1 for the top level ingredients.
+        children_start (np.ndarray): Index of the first child of each node.
+        children_end (np.ndarray): Index following the last child of each node. Equal to children_start for leaves.
+        depth (np.ndarray): Depth of each node, 0 for the top level ingredients.
+        rank (np.ndarray): Rank of each node among its siblings, starting at 1.
+        percent (np.ndarray): Defined percentage of each node, NaN if undefined.
+        percent_type (list): Percentage type of each node ('parent', 'product', 'undefined' or None).
+        is_leaf (np.ndarray): Whether each node is a leaf.
+        nb_top_level (int): Number of top level ingredients, which are the first nodes.
+
+    Examples:
+        >>> tree = IngredientsTree({'ingredients': [{'id': 'A'}, {'id': 'B', 'ingredients': [{'id': 'C'}]}]})
+        >>> tree.ids
+        ['A', 'B', 'C']
+        >>> tree.parent.tolist()
+        [-1, -1, 1]
+        >>> [x['id'] for x in tree.leaves()]
+        ['A', 'C']
+    """
+
+    def __init__(self, product):
+        """
+        Args:
+            product (dict): Dict corresponding to a product or a compound ingredient.
+        """
+        self.product = product
+        self.nodes = list(product.get('ingredients', []))
+        self.nb_top_level = len(self.nodes)
+        parent = [-1] * self.nb_top_level
+        depth = [0] * self.nb_top_level
+        rank = list(range(1, self.nb_top_level + 1))
+        children_start = []
+        children_end = []
+
+        # The nodes list grows while it is read, each node appending its children
+        i = 0
+        while i < len(self.nodes):
+            subingredients = self.nodes[i].get('ingredients', [])
+            children_start.append(len(self.nodes))
+            self.nodes += subingredients
+            children_end.append(len(self.nodes))
+            parent += [i] * len(subingredients)
+            depth += [depth[i] + 1] * len(subingredients)
+            rank += range(1, len(subingredients) + 1)
+            i += 1
+
+        self.ids = [x['id'] for x in self.nodes]
+        self.parent = np.array(parent, dtype=np.int64)
+        self.children_start = np.array(children_start, dtype=np.int64)
+        self.children_end = np.array(children_end, dtype=np.int64)
+        self.depth = np.array(depth, dtype=np.int64)
+        self.rank = np.array(rank, dtype=np.int64)
+        self.percent = np.array([_percent(x) for x in self.nodes], dtype=float)
+        self.percent_type = [x.get('percent-type') for x in self.nodes]
+        self.is_leaf = np.array(['ingredients' not in x for x in self.nodes], dtype=bool)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def children(self, i):
+        """ Indexes of the children of a node, or of the top level ingredients if i is None. """
+        if i is None:
+            return range(self.nb_top_level)
+        return range(self.children_start[i], self.children_end[i])
+
+    def siblings_groups_order(self):
+        """
+        Indexes of the nodes, each group of siblings being followed by the subtrees of its members.
+        This is the order of :func:`~impacts_estimation.utils.flat_ingredients_list_BFS`.
+        """
+        order = []
+        stack = [None]
+        while stack:
+            children = self.children(stack.pop())
+            order += children
+            stack += reversed(children)
+
+        return order
+
+    def dfs_order(self):
+        """ Indexes of the nodes in depth first order, each node being followed by its subtree. """
+        order = []
+        stack = list(reversed(self.children(None)))
+        while stack:
+            i = stack.pop()
+            order.append(i)
+            stack += reversed(self.children(i))
+
+        return order
+
+    def leaves(self):
+        """ Leaf ingredients dicts, in the order of the ingredients list. """
+        return [self.nodes[i] for i in self.dfs_order() if self.is_leaf[i]]
+
+    def node_without_subingredients(self, i):
+        """ Shallow copy of a node without its subingredients. """
+        return {k: v for k, v in self.nodes[i].items() if k != 'ingredients'}
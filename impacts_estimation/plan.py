@@ -0,0 +1,295 @@
+""" Preprocessed products ready for the impact estimation """
+
+import copy
+
+import numpy as np
+
+from impacts_estimation.ingredients_tree import IngredientsTree
+from impacts_estimation.utils import individualize_ingredients, original_id
+from impacts_estimation.vars import INGREDIENTS_COMPOSITION_ITEMS, MAX_ASH_CONTENT, \
+    DEFINED_PERCENTAGES_NOT_USED_WARNING, TOP_LEVEL_NUTRIMENTS_CATEGORIES
+from impacts_estimation.registry import registry, UNKNOWN_INGREDIENT
+
+
+def added_water_name(top_level_ingredients_names, leaf_ingredients_names):
+    """
+    Name of the water ingredient that must be added to the recipe as water under 5% has not to be declared.
+
+    Args:
+        top_level_ingredients_names (list): Ids of the top level ingredients of the product.
+        leaf_ingredients_names (list): Ids of the leaf ingredients of the product.
+
+    Returns:
+        str: Individualized id of the water to add or None if water is already a top level ingredient.
+
+    Examples:
+        >>> added_water_name(['en:flour', 'en:sugar'], ['en:flour', 'en:sugar'])
+        'en:water'
+        >>> added_water_name(['en:flour', 'en:sauce'], ['en:flour', 'en:water'])
+        'en:water*'
+        >>> added_water_name(['en:water', 'en:sugar'], ['en:water', 'en:sugar']) is None
+        True
+    """
+    if 'en:water' in top_level_ingredients_names:
+        return None
+
+    # Water may be in leaf ingredients but not in top level ingredients, in that case it must be individualized
+    water_name = 'en:water'
+    while water_name in leaf_ingredients_names:
+        water_name += '*'
+
+    return water_name
+
+
+def _fill_nan(array, fill_values):
+    """ Replaces the NaN of an array by the corresponding fill values. """
+    return np.where(np.isnan(array), fill_values, array)
+
+
+def leaf_ingredients_nutriments(leaf_ingredients_names):
+    """
+    Nutritional composition bounds of the leaf ingredients of a product.
+
+    Ingredients without data for a nutriment are given default minimum and maximum contents (0 and 100%, or
+    MAX_ASH_CONTENT for ash). The missing minimum or maximum of a known nutriment is its value.
+
+    Args:
+        leaf_ingredients_names (list): Individualized ids of the leaf ingredients.
+
+    Returns:
+        tuple: Minimum and maximum contents (in %) of each composition item (columns, in
+            INGREDIENTS_COMPOSITION_ITEMS order) for each leaf ingredient (rows).
+    """
+    rows = registry.intern([original_id(x) for x in leaf_ingredients_names])
+    known = (rows != UNKNOWN_INGREDIENT)[:, np.newaxis] & registry.nutriments_mask[rows]
+
+    default_max = np.array([MAX_ASH_CONTENT if x == 'ash' else 100 for x in INGREDIENTS_COMPOSITION_ITEMS], dtype=float)
+
+    # Missing bounds of the known nutriments fall back to their value, or to the default bound without value
+    values = registry.nutriments_value[rows]
+    nutriments_min = _fill_nan(_fill_nan(registry.nutriments_min[rows], values), 0)
+    nutriments_max = _fill_nan(_fill_nan(registry.nutriments_max[rows], values), default_max)
+    nutriments_min = np.where(known, nutriments_min, 0)
+    nutriments_max = np.where(known, nutriments_max, default_max)
+
+    return nutriments_min, nutriments_max
+
+
+class RecipesEvaluator:
+    """
+    Kernel evaluating the recipes of a product at once: confidence score of their nutritional composition (see
+    :func:`~impacts_estimation.utils.confidence_score`) and ratio of uncharacterized ingredients mass.
+
+    The recipes are given as arrays of ingredients masses whose columns are the ingredients_ids. The nutriment
+    contents of the ingredients and the reference nutritional composition of the product are gathered once so that
+    evaluating a recipe only takes a few matrix products.
+
+    Attributes:
+        ingredients_ids (list): OFF ids of the ingredients of the recipes, in the columns order.
+        columns (dict): Column of each ingredient.
+        nutriments (np.ndarray): Content (in %) of each top level nutriment (columns) of each ingredient (rows). 0 if
+            unknown.
+        known_nutriments (np.ndarray): Whether the content of each top level nutriment of each ingredient is known.
+        reference_nutriments (np.ndarray): Content (in %) of each top level nutriment in the product. 0 if unknown.
+        reference_mask (np.ndarray): Whether each top level nutriment is used by the confidence score.
+        shared_mask (np.ndarray): Whether each top level nutriment is given per 100g in the product, which is needed
+            for the confidence score to be computed.
+        uncharacterized (dict): Whether each ingredient is uncharacterized, for 'nutrition' and 'impact'.
+    """
+
+    def __init__(self, ingredients_ids, product_nutriments, uncharacterized_ingredients_ids):
+        """
+        Args:
+            ingredients_ids (list): OFF ids of the ingredients of the recipes.
+            product_nutriments (dict): Nutriments of the product.
+            uncharacterized_ingredients_ids (dict): Ids of the uncharacterized ingredients for 'nutrition' and
+                'impact'.
+        """
+        self.ingredients_ids = ingredients_ids
+        self.columns = {x: i for i, x in enumerate(ingredients_ids)}
+
+        rows = registry.intern(ingredients_ids)
+        values = np.where((rows != UNKNOWN_INGREDIENT)[:, np.newaxis],
+                          registry.nutriments_value[rows, :len(TOP_LEVEL_NUTRIMENTS_CATEGORIES)], np.nan)
+        self.known_nutriments = ~np.isnan(values)
+        self.nutriments = np.nan_to_num(values)
+
+        # Removing "_100g" from the product nutriments keys as the confidence score does
+        reference_nutri = {k.replace('_100g', ''): v for k, v in product_nutriments.items()}
+        self.reference_mask = np.array([x in reference_nutri for x in TOP_LEVEL_NUTRIMENTS_CATEGORIES])
+        self.reference_nutriments = np.array([float(reference_nutri[x]) if x in reference_nutri else 0
+                                              for x in TOP_LEVEL_NUTRIMENTS_CATEGORIES])
+        self.shared_mask = np.array([f"{x}_100g" in product_nutriments for x in TOP_LEVEL_NUTRIMENTS_CATEGORIES])
+
+        self.uncharacterized = {characterization: np.isin(ingredients_ids, ids)
+                                for characterization, ids in uncharacterized_ingredients_ids.items()}
+
+    def masses(self, recipe):
+        """
+        Args:
+            recipe (dict): Dict containing ingredients as keys and masses in grams as values.
+
+        Returns:
+            np.ndarray: Masses of the ingredients of the recipe, in the columns order.
+        """
+        masses = np.zeros(len(self.ingredients_ids))
+        for ingredient_id, mass in recipe.items():
+            masses[self.columns[ingredient_id]] = mass
+
+        return masses
+
+    def evaluate(self, masses, min_possible_mass, max_possible_mass, weighting_factor=10):
+        """
+        Args:
+            masses (np.ndarray): Masses in grams of the ingredients (columns) of each recipe (rows) for 100g of product.
+            min_possible_mass (float): Minimum possible total ingredient mass for a product in g
+            max_possible_mass (float): Maximum possible total ingredient mass for a product in g
+            weighting_factor (float): Weight of the nutritional distance against the absolute difference between
+             the total mass and 100g/100g.
+
+        Returns:
+            dict: Arrays with a value for each recipe:
+                'total_mass': Total mass of ingredients used in g.
+                'comparable': Whether the recipe has a top level nutriment in common with the product, which is
+                    needed for the confidence score to be meaningful.
+                'confidence_score': Confidence score of the recipe. NaN if the composition is impossible (see
+                    :func:`~impacts_estimation.utils.confidence_score`).
+                'uncharacterized_mass': Dict with the ratio of uncharacterized ingredients mass for 'nutrition' and
+                    'impact'.
+        """
+        masses = np.atleast_2d(masses)
+        total_mass = masses.sum(axis=1)
+
+        # Nutriment contents of the recipes, inflating the contents of the known ingredients to the total mass
+        known_ingredients_mass = masses @ self.known_nutriments
+        recipes_nutriments = masses @ self.nutriments / 100
+        present = known_ingredients_mass > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            recipes_nutriments = recipes_nutriments * (total_mass[:, np.newaxis] / known_ingredients_mass)
+
+        # Nutritional distance, the squared differences being rounded with the builtin round as numpy rounding is not
+        # correctly rounded
+        counted = present & self.reference_mask
+        squared_differences = np.where(counted, (self.reference_nutriments / 100) - (recipes_nutriments / 100), 0) ** 2
+        squared_differences = np.array([round(x, 6) for x in squared_differences.ravel().tolist()]) \
+            .reshape(squared_differences.shape)
+        squared_differences = np.where(counted, np.maximum(squared_differences, 0.0000001), 0)
+        normalized_nutri_distance = np.sqrt(squared_differences.sum(axis=1)) / np.sqrt(2)
+
+        # Total mass likelihood coefficient, the unused branch can divide by zero
+        assert np.all((round(min_possible_mass) <= np.round(total_mass))
+                      & (np.round(total_mass) <= round(max_possible_mass)))
+        relative_mass = total_mass / 100
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mass_diff = np.where(relative_mass < 1,
+                                 (1 - relative_mass) / (1 - min_possible_mass / 100),
+                                 (relative_mass - 1) / (max_possible_mass / 100 - 1))
+
+        confidence_score = 1 / ((normalized_nutri_distance * weighting_factor) + mass_diff)
+        possible = (squared_differences <= 1).all(axis=1)
+
+        return {'total_mass': total_mass,
+                'comparable': (present & self.shared_mask).any(axis=1),
+                'confidence_score': np.where(possible, confidence_score, np.nan),
+                'uncharacterized_mass': {characterization: masses @ mask / total_mass
+                                         for characterization, mask in self.uncharacterized.items()}}
+
+
+class EstimationPlan:
+    """
+    Product preprocessed by :class:`~impacts_estimation.impacts_estimation.ImpactEstimator`, containing everything
+    needed to run the Monte-Carlo impact estimation.
+
+    A plan is built once (see :func:`~impacts_estimation.impacts_estimation.build_estimation_plan`) and can then be
+    given instead of a product to :func:`~impacts_estimation.impacts_estimation.estimate_impacts` as many times as
+    needed. It does not depend on the estimation parameters and can be pickled to be cached or sent to other processes.
+
+    Attributes:
+        product (dict): Preprocessed product with individualized ingredients.
+        tree (IngredientsTree): Compiled ingredients tree of the product.
+        warnings (list): Warnings raised by the preprocessing.
+        top_level_ingredients_names (list): Ids of the top level ingredients.
+        all_ingredients_names (list): Ids of all the ingredients of the tree (breadth first order).
+        leaf_ingredients_names (list): Ids of the leaf ingredients, including the added water if any.
+        added_water_name (str): Id of the water added to the leaf ingredients or None.
+        leaf_nutriments_min (np.ndarray): Minimum content (in %) of each composition item (columns, in
+            INGREDIENTS_COMPOSITION_ITEMS order) for each leaf ingredient (rows).
+        leaf_nutriments_max (np.ndarray): Maximum content (in %) with the same layout as leaf_nutriments_min.
+        leaf_impacts (np.ndarray): Impact of each leaf ingredient (rows) for each impact category (columns, in
+            AGRIBALYSE_IMPACT_CATEGORIES_FR order). NaN if unknown.
+        evaluator (RecipesEvaluator): Kernel evaluating the recipes of the product.
+    """
+
+    def __init__(self, product, ignore_unknown_ingredients=True, ignored_unknown_ingredients=None,
+                 use_defined_prct_arg=True, use_defined_prct=True, use_nutritional_info_override=None,
+                 adjusted_maximum_evaporation_coefficient=None, warnings=None, uncharacterized_ingredients=None,
+                 uncharacterized_ingredients_ids=None, uncharacterized_ingredients_ratio=None):
+        """
+        Args:
+            product (dict): Preprocessed product. Its ingredients are individualized in place.
+            ignore_unknown_ingredients (bool): Have ingredients absent of OFF taxonomy been ignored?
+            ignored_unknown_ingredients (list): Ingredients that have been ignored.
+            use_defined_prct_arg (bool): Value of the use_defined_prct parameter used for the preprocessing.
+            use_defined_prct (bool): Can ingredients percentages defined in the product be used?
+            use_nutritional_info_override (bool): If not None, overrides the use_nutritional_info parameter of the
+                estimation.
+            adjusted_maximum_evaporation_coefficient (float): If not None, overrides the maximum_evaporation
+                parameter of the estimation.
+            warnings (list): Warnings raised by the preprocessing.
+            uncharacterized_ingredients (dict): Leaf ingredients with no nutrition and no impact data.
+            uncharacterized_ingredients_ids (dict): Ids of the uncharacterized ingredients.
+            uncharacterized_ingredients_ratio (dict): Ratios of uncharacterized ingredients.
+        """
+        self.product = product
+        self.ignore_unknown_ingredients = ignore_unknown_ingredients
+        self.ignored_unknown_ingredients = ignored_unknown_ingredients or []
+        self.use_defined_prct_arg = use_defined_prct_arg
+        self.use_defined_prct = use_defined_prct
+        self.use_nutritional_info_override = use_nutritional_info_override
+        self.adjusted_maximum_evaporation_coefficient = adjusted_maximum_evaporation_coefficient
+        self.warnings = warnings or []
+        self.uncharacterized_ingredients = uncharacterized_ingredients
+        self.uncharacterized_ingredients_ids = uncharacterized_ingredients_ids
+        self.uncharacterized_ingredients_ratio = uncharacterized_ingredients_ratio
+
+        individualize_ingredients(self.product)
+        self.tree = IngredientsTree(self.product)
+        self.leaf_ingredients = self.tree.leaves()
+        self.nb_ing = len(self.leaf_ingredients)
+        self.top_level_ingredients_names = self.tree.ids[:self.tree.nb_top_level]
+        self.all_ingredients_names = [self.tree.ids[i] for i in self.tree.siblings_groups_order()]
+        self.leaf_ingredients_names = [x['id'] for x in self.leaf_ingredients]
+        self.added_water_name = added_water_name(self.top_level_ingredients_names, self.leaf_ingredients_names)
+        if self.added_water_name is not None:
+            self.leaf_ingredients_names.append(self.added_water_name)
+
+        # Compiling the ingredients data tables
+        self.leaf_nutriments_min, self.leaf_nutriments_max = leaf_ingredients_nutriments(self.leaf_ingredients_names)
+        leaf_rows = registry.intern([original_id(x) for x in self.leaf_ingredients_names])
+        self.leaf_impacts = np.where((leaf_rows != UNKNOWN_INGREDIENT)[:, np.newaxis], registry.impacts[leaf_rows],
+                                     np.nan)
+
+        # The recipes are indexed by the original ids of the leaf ingredients
+        self.evaluator = RecipesEvaluator(list(dict.fromkeys(original_id(x) for x in self.leaf_ingredients_names)),
+                                          self.product.get('nutriments', dict()),
+                                          self.uncharacterized_ingredients_ids or {'nutrition': [], 'impact': []})
+
+    def without_defined_percentages(self):
+        """
+        Returns the plan that would have been obtained by preprocessing the product with use_defined_prct=False.
+
+        The product tree is shared with the original plan as the recipe creator ignores defined percentages when
+        use_defined_prct is False.
+
+        Returns:
+            EstimationPlan: Plan that does not use the defined percentages.
+        """
+        if not self.use_defined_prct_arg:
+            return self
+
+        plan = copy.copy(self)
+        plan.use_defined_prct_arg = False
+        plan.use_defined_prct = False
+        plan.warnings = [x for x in self.warnings if x != DEFINED_PERCENTAGES_NOT_USED_WARNING]
+
+        return plan
@@ -0,0 +1,102 @@
+"""
+Registry of the characterized ingredients, interning the OFF ingredients ids to integers.
+
+The nutritional compositions and the impacts of the ingredients are stored in dense matrices whose rows are the
+interned ingredients and whose columns follow INGREDIENTS_COMPOSITION_ITEMS and AGRIBALYSE_IMPACT_CATEGORIES_FR, so
+that the estimation hot paths can use index arithmetic instead of nested dicts lookups. The data tables store these
+columns first, so the matrices are views of the tables, and thus of the memory-mapped bundle when it is used.
+"""
+
+import numpy as np
+
+from impacts_estimation.vars import INGREDIENTS_COMPOSITION_ITEMS, AGRIBALYSE_IMPACT_CATEGORIES_FR
+from data import LazyData, ingredients_tables
+
+# Interned id of the ingredients absent of the registry
+UNKNOWN_INGREDIENT = -1
+
+
+class IngredientRegistry:
+    """
+    Attributes:
+        index (dict): Interned id of each characterized ingredient.
+        nutriments_value (np.ndarray): Content (in %) of each composition item (columns) of each ingredient (rows).
+            NaN if unknown.
+        nutriments_min (np.ndarray): Minimum content with the same layout as nutriments_value.
+        nutriments_max (np.ndarray): Maximum content with the same layout as nutriments_value.
+        nutriments_mask (np.ndarray): Whether the content of each composition item of each ingredient is known.
+        impacts (np.ndarray): Impact of each ingredient (rows) for each impact category (columns). NaN if unknown.
+        impacts_mask (np.ndarray): Whether each impact of each ingredient is known.
+        characterized (dict): Whether each ingredient has nutritional ('nutrition') and impact ('impact') data.
+    """
+
+    def __init__(self, tables):
+        """
+        Args:
+            tables (IngredientsTables): Ingredients data tables (see :mod:`data.tables`).
+        """
+        self.tables = tables
+        self.index = tables.ingredients_ids.index
+
+        nutriments = self._columns(tables.nutriments, tables.nutriments_names, INGREDIENTS_COMPOSITION_ITEMS)
+        self.nutriments_value = nutriments[:, :, 0]
+        self.nutriments_min = nutriments[:, :, 1]
+        self.nutriments_max = nutriments[:, :, 2]
+        self.nutriments_mask = ~np.isnan(nutriments).all(axis=2)
+
+        # Column of each impact category in the data tables, used to get the uncertainty distributions
+        self._impacts_columns = [tables.impacts_names.index.get(x) for x in AGRIBALYSE_IMPACT_CATEGORIES_FR]
+        self.impacts = self._columns(tables.impacts, tables.impacts_names, AGRIBALYSE_IMPACT_CATEGORIES_FR)
+        self.impacts_mask = ~np.isnan(self.impacts)
+
+        self.characterized = {'nutrition': self.nutriments_mask.any(axis=1),
+                              'impact': self.impacts_mask.any(axis=1)}
+
+    @staticmethod
+    def _columns(table, names, columns_names):
+        """
+        Columns of a data table in the given order, as a view of the table if they are its first columns, which is
+        the case of the tables of the compiled bundle. Otherwise the columns are copied, unknown ones being NaN.
+        """
+        if list(names)[:len(columns_names)] == list(columns_names):
+            return table[:, :len(columns_names)]
+
+        result = np.full((table.shape[0], len(columns_names)) + table.shape[2:], np.nan)
+        for column, name in enumerate(columns_names):
+            if name in names:
+                result[:, column] = table[:, names.index[name]]
+        return result
+
+    def intern(self, ingredients_ids):
+        """
+        Args:
+            ingredients_ids (list): OFF ingredients ids.
+
+        Returns:
+            np.ndarray: Interned ids of the ingredients, UNKNOWN_INGREDIENT for the ones absent of the registry.
+        """
+        return np.array([self.index.get(x, UNKNOWN_INGREDIENT) for x in ingredients_ids], dtype=np.int64)
+
+    def is_characterized(self, ingredient_id, characterization):
+        """
+        Args:
+            ingredient_id (str): OFF ingredient id.
+            characterization (str): 'nutrition' or 'impact'.
+
+        Returns:
+            bool: Whether the ingredient has data for this characterization.
+        """
+        row = self.index.get(ingredient_id)
+        return (row is not None) and bool(self.characterized[characterization][row])
+
+    def uncertainty_distributions(self, row, impact_column):
+        """ Range of the uncertainty distributions of an impact of an ingredient in the data tables. """
+        position = row * len(self.tables.impacts_names) + self._impacts_columns[impact_column]
+        return range(self.tables.uncertainty_offsets[position], self.tables.uncertainty_offsets[position + 1])
+
+    def uncertainty_distribution(self, i):
+        """ Uncertainty distribution as a dict with the distribution type and its parameters. """
+        return self.tables.uncertainty_distribution(i)
+
+
+registry = LazyData(lambda: IngredientRegistry(ingredients_tables.load()))
@@ -0,0 +1,341 @@
+"""
+Local HTTP server estimating the environmental impact of Open Food Facts products.
+
+The estimations are run in a pool of worker processes so that the server stays responsive. Identical requests
+received while an estimation is in progress are coalesced onto this estimation.
+
+Endpoints:
+    - ``POST /estimate``: Estimates the impacts of a product. The body is a JSON object containing the keys
+      ``product``, ``impact_names``, optionally ``timeout`` (deadline in seconds, a positive number) and any other
+      parameter of :func:`~impacts_estimation.impacts_estimation.estimate_impacts`. The response is the estimation
+      result.
+    - ``GET /healthz``: Status of the server.
+
+Status codes:
+    - 200: Success.
+    - 400: Invalid request, unknown parameter or invalid timeout.
+    - 404/405: Unknown endpoint or method.
+    - 422: The impacts of the product cannot be estimated.
+    - 429: Too many estimations are waiting for a worker.
+    - 500: Unexpected error.
+    - 504: The deadline of the request has been reached.
+
+Run ``python -m impacts_estimation.server`` to start the server.
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from impacts_estimation.batch import canonical_form
+from impacts_estimation.exceptions import RecipeCreationError, NoKnownIngredientsError, \
+    NoCharacterizedIngredientsError, SolverTimeoutError, ProductDataError
+from impacts_estimation.impacts_estimation import build_estimation_plan, estimate_impacts
+from settings import SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_MAX_QUEUE_SIZE, SERVER_REQUEST_TIMEOUT
+
+# Parameters of estimate_impacts() used for the preprocessing of the product
+PREPROCESSING_PARAMETERS = ('ignore_unknown_ingredients', 'use_defined_prct')
+
+# Parameters of estimate_impacts() that can be given in the request body
+ESTIMATION_PARAMETERS = frozenset(inspect.signature(estimate_impacts).parameters) - {'product'}
+
+# Exceptions corresponding to products whose impacts cannot be estimated
+ESTIMATION_ERRORS = (RecipeCreationError, NoKnownIngredientsError, NoCharacterizedIngredientsError,
+                     SolverTimeoutError, ProductDataError)
+
+HTTP_REASONS = {200: 'OK',
+                400: 'Bad Request',
+                404: 'Not Found',
+                405: 'Method Not Allowed',
+                422: 'Unprocessable Entity',
+                429: 'Too Many Requests',
+                500: 'Internal Server Error',
+                504: 'Gateway Timeout'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _warm_up():
+    """ Executed by each worker process at startup to load the data before the first request. """
+    from data import ingredients_tables, ingredients_data, off_taxonomy
+
+    for shared_data in (ingredients_tables, ingredients_data, off_taxonomy):
+        shared_data.load()
+
+
+def _prepare(product, preprocessing_kwargs):
+    """ Preprocesses a product in a worker process, returning its canonical form and its estimation plan. """
+    plan = build_estimation_plan(product, **preprocessing_kwargs)
+
+    return canonical_form(plan), plan
+
+
+def _estimate(plan, parameters):
+    """ Estimates the impacts of a preprocessed product in a worker process. """
+    return estimate_impacts(product=plan, **parameters)
+
+
+def _json_default(obj):
+    """ Serializes the numpy objects that may be contained in the estimation results. """
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class EstimationServer:
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS,
+                 max_queue_size=SERVER_MAX_QUEUE_SIZE, request_timeout=SERVER_REQUEST_TIMEOUT):
+        """
+        Args:
+            host (str): Address on which the server listens.
+            port (int): Port on which the server listens. If 0, a free port is chosen.
+            workers (int): Number of worker processes.
+            max_queue_size (int): Maximum number of estimations waiting for a worker. Requests received when the
+                queue is full are rejected with the status 429.
+            request_timeout (float): Default deadline of the requests in seconds.
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.request_timeout = request_timeout
+
+        self.executor = None
+        self.server = None
+
+        # Number of estimations (including products being preprocessed) waiting for a worker or running
+        self.pending = 0
+        # Estimations in progress, by canonical product and parameters
+        self.in_flight = dict()
+        self.stats = {'requests': 0, 'computations': 0, 'coalesced': 0, 'rejected': 0, 'timeouts': 0}
+
+    async def start(self):
+        """ Starts the worker processes and the server. """
+        loop = asyncio.get_running_loop()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+
+        # Starting all the workers before accepting requests
+        await asyncio.gather(*[loop.run_in_executor(self.executor, _warm_up) for _ in range(self.workers)])
+
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """ Stops the server and the worker processes. """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    def _acquire(self):
+        """ Reserves a place in the estimations queue or raises a 429 error if the queue is full. """
+        if self.pending >= self.workers + self.max_queue_size:
+            self.stats['rejected'] += 1
+            raise HTTPError(429, "Too many estimations in progress.")
+        self.pending += 1
+
+    def _release(self, _=None):
+        self.pending -= 1
+
+    async def _wait(self, future, deadline):
+        """ Waits for a worker result until the deadline. The computation is not cancelled if the deadline is hit. """
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise HTTPError(504, "The deadline of the request has been reached.")
+
+    async def estimate(self, body):
+        """
+        Estimates the impacts of a product, coalescing identical requests.
+
+        Args:
+            body (dict): Request body.
+
+        Returns:
+            dict: Estimation result.
+        """
+        if not isinstance(body, dict) or ('product' not in body) or ('impact_names' not in body):
+            raise HTTPError(400, "The request body must contain the product and the impact names.")
+
+        parameters = {k: v for k, v in body.items() if k not in ('product', 'timeout')}
+        unknown_parameters = sorted(set(parameters) - ESTIMATION_PARAMETERS)
+        if unknown_parameters:
+            raise HTTPError(400, f"Unknown parameters: {', '.join(unknown_parameters)}.")
+
+        timeout = body.get('timeout')
+        if timeout is None:
+            timeout = self.request_timeout
+        elif isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not (0 < timeout < math.inf):
+            raise HTTPError(400, "The timeout must be a positive number of seconds.")
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+
+        self._acquire()
+        preprocessing_kwargs = {k: v for k, v in parameters.items() if k in PREPROCESSING_PARAMETERS}
+        preparation = loop.run_in_executor(self.executor, _prepare, body['product'], preprocessing_kwargs)
+        preparation.add_done_callback(self._release)
+        try:
+            product_canonical_form, plan = await self._wait(preparation, deadline)
+        except ESTIMATION_ERRORS as e:
+            raise HTTPError(422, f"{type(e).__name__}: {e}")
+
+        key = (product_canonical_form, json.dumps(parameters, sort_keys=True, default=str))
+        if key in self.in_flight:
+            self.stats['coalesced'] += 1
+            computation = self.in_flight[key]
+        else:
+            self.pending += 1
+            self.stats['computations'] += 1
+            computation = loop.run_in_executor(self.executor, _estimate, plan, parameters)
+            self.in_flight[key] = computation
+
+            def computation_done(_):
+                del self.in_flight[key]
+                self._release()
+
+            computation.add_done_callback(computation_done)
+
+        try:
+            return await self._wait(computation, deadline)
+        except ESTIMATION_ERRORS as e:
+            raise HTTPError(422, f"{type(e).__name__}: {e}")
+
+    def healthz(self):
+        return {'status': 'ok',
+                'workers': self.workers,
+                'pending': self.pending,
+                'max_pending': self.workers + self.max_queue_size,
+                'in_flight': len(self.in_flight),
+                **self.stats}
+
+    async def _handle_request(self, method, path, body):
+        """ Routes a request and returns the response status and content. """
+        if path == '/healthz':
+            if method != 'GET':
+                raise HTTPError(405, "Method not allowed.")
+            return 200, self.healthz()
+
+        if path == '/estimate':
+            if method != 'POST':
+                raise HTTPError(405, "Method not allowed.")
+            self.stats['requests'] += 1
+            try:
+                body = json.loads(body)
+            except ValueError:
+                raise HTTPError(400, "The request body is not valid JSON.")
+            return 200, await self.estimate(body)
+
+        raise HTTPError(404, "Not found.")
+
+    async def _handle_connection(self, reader, writer):
+        """ Reads an HTTP request, handles it and writes the response. Connections are not kept alive. """
+        try:
+            try:
+                request_line = (await reader.readline()).decode('latin-1').split()
+                if len(request_line) != 3:
+                    raise HTTPError(400, "Invalid request line.")
+                method, path, _ = request_line
+
+                headers = dict()
+                while True:
+                    line = (await reader.readline()).decode('latin-1')
+                    if line in ('\r\n', '\n', ''):
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, content = await self._handle_request(method, path.split('?')[0], body)
+            except HTTPError as e:
+                status, content = e.status, {'error': e.message}
+            except Exception as e:
+                status, content = 500, {'error': f"{type(e).__name__}: {e}"}
+
+            payload = json.dumps(content, default=_json_default).encode()
+            writer.write(f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                         f"Content-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\n"
+                         f"Connection: close\r\n\r\n".encode('latin-1') + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def request(method, path, body=None, host=SERVER_HOST, port=SERVER_PORT):
+    """
+    Minimal HTTP client used to query the server, for example for load tests.
+
+    Args:
+        method (str): HTTP method.
+        path (str): Path of the endpoint.
+        body (dict): Body of the request, serialized as JSON.
+        host (str): Address of the server.
+        port (int): Port of the server.
+
+    Returns:
+        tuple: Response status and decoded JSON content.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    payload = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\n"
+                 f"Host: {host}\r\n"
+                 f"Content-Type: application/json\r\n"
+                 f"Content-Length: {len(payload)}\r\n"
+                 f"Connection: close\r\n\r\n".encode('latin-1') + payload)
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+
+    head, _, content = response.partition(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+
+    return status, json.loads(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local HTTP server estimating the impacts of OFF products.')
+    parser.add_argument('--host', type=str, default=SERVER_HOST, help='address on which the server listens')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='port on which the server listens')
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help='number of worker processes')
+    parser.add_argument('--max_queue_size', type=int, default=SERVER_MAX_QUEUE_SIZE,
+                        help='maximum number of estimations waiting for a worker')
+    parser.add_argument('--timeout', type=float, default=SERVER_REQUEST_TIMEOUT,
+                        help='default deadline of the requests in seconds')
+    args = parser.parse_args()
+
+    server = EstimationServer(host=args.host, port=args.port, workers=args.workers,
+                              max_queue_size=args.max_queue_size, request_timeout=args.timeout)
+
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == '__main__':
+    main()
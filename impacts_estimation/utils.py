@@ -1,12 +1,13 @@
 """ Functions used by the environmental impact estimation program """
 
-import copy
 import numpy as np
 from math import sqrt
 
 from impacts_estimation.vars import NUTRIMENTS_CATEGORIES, TOP_LEVEL_NUTRIMENTS_CATEGORIES, \
     AGRIBALYSE_IMPACT_CATEGORIES_EN_TO_FR, AGRIBALYSE_IMPACT_CATEGORIES_FR
-from data import ingredients_data, off_taxonomy
+from impacts_estimation.ingredients_tree import IngredientsTree
+from impacts_estimation.registry import registry, UNKNOWN_INGREDIENT
+from data import off_taxonomy
 
 
 def nutriments_from_recipe(recipe):
@@ -28,22 +29,76 @@ def nutriments_from_recipe(recipe):
     result = dict()
     total_mass = sum([float(x) for x in recipe.values()])
 
-    for nutriment in NUTRIMENTS_CATEGORIES:
-        known_ingredients_mass = 0
-        result[nutriment] = 0
-        for ingredient in recipe:
-            if (ingredient in ingredients_data) and (nutriment in ingredients_data[ingredient].get('nutriments', [])):
-                known_ingredients_mass += float(recipe[ingredient])
-                result[nutriment] += float(recipe[ingredient]) * \
-                                     ingredients_data[ingredient]['nutriments'][nutriment]['value'] \
-                                     / 100  # Ingredients nutriment contents are given per 100g
+    rows = registry.intern(recipe)
+    known = rows != UNKNOWN_INGREDIENT
+    if not known.any():
+        return result
 
+    masses = np.array([float(x) for x in recipe.values()])[known]
+    # Ingredients nutriment contents are given per 100g. The nutriments are the first composition items.
+    values = registry.nutriments_value[rows[known], :len(NUTRIMENTS_CATEGORIES)]
+    known_values = ~np.isnan(values)
+
+    for column, nutriment in enumerate(NUTRIMENTS_CATEGORIES):
+        known_nutriment = known_values[:, column]
+        # Summing sequentially in the recipe order, as the numpy pairwise summation could change the last digits
+        known_ingredients_mass = sum(masses[known_nutriment].tolist())
         if known_ingredients_mass == 0:
-            del result[nutriment]
+            continue
+
         # Inflating the nutriment content of the known ingredients to the nutriment content of the total mass of these
         # ingredients
-        else:
-            result[nutriment] = result[nutriment] * total_mass / known_ingredients_mass
+        result[nutriment] = sum((masses[known_nutriment] * values[known_nutriment, column] / 100).tolist()) \
+            * total_mass / known_ingredients_mass
+
+    return result
+
+
+def _sequential_sum(array):
+    """ Sum over the first axis of an array, adding the rows in order like the builtin sum. """
+    total = np.zeros(array.shape[1:])
+    for row in array:
+        total = total + row
+
+    return total
+
+
+def nutriments_from_scaled_recipe(recipe, scales):
+    """
+    Vectorized version of :func:`nutriments_from_recipe` for the recipes obtained by multiplying all the masses of a
+    recipe by each of the given scales. The nutriment contents are exactly the ones :func:`nutriments_from_recipe`
+    would give for each scaled recipe.
+
+    Args:
+        recipe (dict): Dict containing ingredients as keys and masses in grams as values
+        scales (np.ndarray): Positive factors applied to the masses of the recipe.
+
+    Returns:
+        dict: Dictionary with nutriments as keys and arrays of the nutriment contents of each scaled recipe as values
+    """
+
+    result = dict()
+    masses = np.array([float(x) for x in recipe.values()])[:, np.newaxis] * np.asarray(scales, dtype=float)
+    total_mass = _sequential_sum(masses)
+
+    rows = registry.intern(recipe)
+    known = rows != UNKNOWN_INGREDIENT
+    if not known.any():
+        return result
+
+    masses = masses[known]
+    values = registry.nutriments_value[rows[known], :len(NUTRIMENTS_CATEGORIES)]
+    known_values = ~np.isnan(values)
+
+    for column, nutriment in enumerate(NUTRIMENTS_CATEGORIES):
+        known_nutriment = known_values[:, column]
+        known_ingredients_mass = _sequential_sum(masses[known_nutriment])
+        # The scales being positive, the mass is null for all the scaled recipes or for none of them
+        if not known_ingredients_mass.any():
+            continue
+
+        result[nutriment] = _sequential_sum(masses[known_nutriment] * values[known_nutriment, column, np.newaxis]
+                                            / 100) * total_mass / known_ingredients_mass
 
     return result
 
@@ -118,6 +173,64 @@ def confidence_score(nutri, reference_nutri, total_mass, min_possible_mass, max_
     return 1 / ((normalized_nutri_distance * weighting_factor) + mass_diff)
 
 
+def confidence_scores(nutri, reference_nutri, total_masses, min_possible_mass, max_possible_mass,
+                      weighting_factor=10, reference_mass=100):
+    """
+    Vectorized version of :func:`confidence_score` evaluating several nutritional compositions with their total masses
+    at once.
+
+    Args:
+        nutri (dict): Nutritional compositions to evaluate, with nutriments as keys and arrays of contents as values.
+        reference_nutri (dict): Nutritional composition of the reference product.
+        total_masses (np.ndarray): Total mass of ingredients used in g for each composition.
+        min_possible_mass (float): Minimum possible total ingredient mass for a product in g
+        max_possible_mass (float): Maximum possible total ingredient mass for a product in g
+        weighting_factor (float): Weight of the nutritional distance against the absolute difference between
+         the total mass and 100g/100g.
+        reference_mass (float): Mass for which the nutritional compositions are expressed (in g).
+
+    Returns:
+        np.ndarray: Confidence score of each composition, NaN for the impossible ones for which
+            :func:`confidence_score` raises a ValueError.
+    """
+    total_masses = np.asarray(total_masses, dtype=float)
+    assert np.all((round(min_possible_mass) <= np.round(total_masses))
+                  & (np.round(total_masses) <= round(max_possible_mass)))
+
+    total_mass = total_masses / reference_mass
+    min_possible_mass = min_possible_mass / reference_mass
+    max_possible_mass = max_possible_mass / reference_mass
+
+    # Removing "_100g" from reference_nutri keys
+    reference_nutri = {k.replace('_100g', ''): v for k, v in reference_nutri.items()}
+
+    # Calculating nutritional distance
+    squared_differences_sum = np.zeros(len(total_masses))
+    possible = np.ones(len(total_masses), dtype=bool)
+    for nutriment in nutri:
+        if (nutriment in TOP_LEVEL_NUTRIMENTS_CATEGORIES) and (nutriment in reference_nutri):
+            difference = (float(reference_nutri[nutriment]) / reference_mass) - (nutri[nutriment] / reference_mass)
+
+            # Rounding with the builtin round as numpy rounding is not correctly rounded
+            squared_difference = np.array([round(x, 6) for x in (difference ** 2).tolist()])
+            squared_difference = np.maximum(squared_difference, 0.0000001)
+
+            possible &= squared_difference <= 1
+            squared_differences_sum = squared_differences_sum + squared_difference
+
+    normalized_nutri_distance = np.sqrt(squared_differences_sum) / sqrt(2)
+
+    # Calculating total mass likelihood coefficient, the unused branch can divide by zero
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mass_diff = np.where(total_mass < 1,
+                             (1 - total_mass) / (1 - min_possible_mass),
+                             (total_mass - 1) / (max_possible_mass - 1))
+
+    scores = 1 / ((normalized_nutri_distance * weighting_factor) + mass_diff)
+
+    return np.where(possible, scores, np.nan)
+
+
 def natural_bounds(rank, nb_ingredients):
     """
     Computes the upper and lower bounds of the proportion of an ingredient depending on its rank and the number of
@@ -211,7 +324,7 @@ def clear_ingredient_graph(product):
 
     # If no subingredients are known, have known subingredients or defined percentage, delete them all
     if len([x for x in ingredients
-            if (x['id'] in ingredients_data)
+            if (x['id'] in registry.index)
                or ('ingredients' in x)
                or ('percent' in x)]
            ) == 0:
@@ -235,11 +348,9 @@ def minimum_percentage_sum(ingredients):
     """
 
     # Looping from least present ingredient to most present
-    ingredients = copy.deepcopy(ingredients)
-    ingredients.reverse()
     minimum_sum = 0
     minimum_percentage = 0
-    for ingredient in ingredients:
+    for ingredient in reversed(ingredients):
         if 'percent' in ingredient:
             minimum_percentage = float(ingredient['percent'])
 
@@ -317,9 +428,8 @@ def define_subingredients_percentage_type(product):
 
 def flat_ingredients_list_BFS(product):
     """
-    Recursive function to search the ingredients graph by doing a Breadth First Search and return it as a flat list of
-    all nodes.
-    Sub ingredients are placed at the end of the list.
+    Searches the ingredients graph by doing a Breadth First Search and returns it as a flat list of all nodes.
+    Sub ingredients are placed at the end of the list. The nodes are shallow copies without their subingredients.
 
     Args:
         product (dict): Dict corresponding to a product or a compound ingredient.
@@ -327,25 +437,16 @@ def flat_ingredients_list_BFS(product):
     Returns:
         list: List containing all the ingredients graph nodes.
     """
-    nodes = []
-    if 'ingredients' in product:
-        ingredients = copy.deepcopy(product['ingredients'])  # Deepcopy to avoid deleting the graph structure
-        nodes += ingredients
-
-        for ingredient in ingredients:
-            nodes += flat_ingredients_list_BFS(ingredient)
-
-            if 'ingredients' in ingredient:
-                del ingredient['ingredients']
+    tree = IngredientsTree(product)
 
-    return nodes
+    return [tree.node_without_subingredients(i) for i in tree.siblings_groups_order()]
 
 
 def flat_ingredients_list_DFS(product):
     """
-    Recursive function to search the ingredients graph by doing a Depth First Search and return it as a flat list of
-    all nodes.
-    Sub ingredients are placed right after their parents.
+    Searches the ingredients graph by doing a Depth First Search and returns it as a flat list of all nodes.
+    Sub ingredients are placed right after their parents. Compound ingredients are shallow copies without their
+    subingredients.
 
     Args:
         product (dict): Dict corresponding to a product or a compound ingredient.
@@ -353,22 +454,22 @@ def flat_ingredients_list_DFS(product):
     Returns:
         list: List containing all the ingredients graph nodes.
     """
-    if 'ingredients' in product:
-        product_without_ingredients = copy.deepcopy(product)
-        del product_without_ingredients['ingredients']
+    if 'ingredients' not in product:
+        return [product]
+
+    tree = IngredientsTree(product)
+    # Leaves are returned as they are, compound ingredients without their subingredients
+    nodes = [tree.nodes[i] if tree.is_leaf[i] else tree.node_without_subingredients(i) for i in tree.dfs_order()]
 
-        if '_id' in product:  # It is a product and not a compound ingredient:
-            return [y for x in product['ingredients'] for y in flat_ingredients_list_DFS(x)]
-        else:
-            return [product_without_ingredients] + [y for x in product['ingredients'] for y in
-                                                    flat_ingredients_list_DFS(x)]
+    if '_id' in product:  # It is a product and not a compound ingredient:
+        return nodes
     else:
-        return [product]
+        return [{k: v for k, v in product.items() if k != 'ingredients'}] + nodes
 
 
 def find_ingredients_graph_leaves(product):
     """
-    Recursive function to search the ingredients graph and find its leaves.
+    Searches the ingredients graph and finds its leaves.
 
     Args:
         product (dict): Dict corresponding to a product or a compound ingredient.
@@ -377,21 +478,11 @@ def find_ingredients_graph_leaves(product):
         list: List containing the ingredients graph leaves.
     """
 
-    if 'ingredients' in product:
-        leaves = []
-        for ingredient in product['ingredients']:
-            subleaves = find_ingredients_graph_leaves(ingredient)
-
-            if type(subleaves) == list:
-                leaves += subleaves
-            else:
-                leaves.append(subleaves)
-
-        return leaves
-
-    else:
+    if 'ingredients' not in product:
         return product
 
+    return IngredientsTree(product).leaves()
+
 
 def individualize_ingredients(product, previous_ingredients_ids=None):
     """
@@ -400,7 +491,7 @@ def individualize_ingredients(product, previous_ingredients_ids=None):
     Args:
         product (dict): Dict corresponding to a product, containing a list of ingredients, may contain compound
             ingredients
-        previous_ingredients_ids (list): List containing ingredients ids. Needed only for recursive call
+        previous_ingredients_ids (list): Ids that are already used and that the ingredients must not take.
 
     Examples:
         >>> product = {'ingredients': [{'id': 'A'}, {'id': 'B', 'ingredients': [{'id': 'A'}]}, {'id': 'B'}]}
@@ -408,17 +499,17 @@ def individualize_ingredients(product, previous_ingredients_ids=None):
         >>> print(product)
         {'ingredients': [{'id': 'A'}, {'id': 'B', 'ingredients': [{'id': 'A*'}]}, {'id': 'B*'}]}
     """
-    ingredients_ids = previous_ingredients_ids or []
+    ingredients_ids = set(previous_ingredients_ids or [])
 
-    for ingredient in product['ingredients']:
+    # Depth first order, as in the ingredients list
+    tree = IngredientsTree(product)
+    for i in tree.dfs_order():
+        ingredient = tree.nodes[i]
         # Appending an asterisk to the id as long as the id already exists
         while ingredient['id'] in ingredients_ids:
             ingredient['id'] += '*'
 
-        ingredients_ids.append(ingredient['id'])
-
-        if 'ingredients' in ingredient:
-            individualize_ingredients(ingredient, previous_ingredients_ids=ingredients_ids)
+        ingredients_ids.add(ingredient['id'])
 
 
 def original_id(individualized_id):
@@ -457,17 +548,17 @@ class UnknownIngredientsRemover:
             for ingredient in product['ingredients']:
                 self.remove_unknown_ingredients(ingredient)
 
-            # Creating an iteration copy
-            iter_ingredients = copy.deepcopy(product['ingredients'])
-
             # Removing ingredients from the list if they do not have sub-ingredients,
             # nor defined percentage and are not in the OFF taxonomy
-            for ingredient in iter_ingredients:
+            kept_ingredients = []
+            for ingredient in product['ingredients']:
                 if ('ingredients' not in ingredient) \
                         and ('percent' not in ingredient) \
                         and ingredient['id'] not in off_taxonomy:
-                    product['ingredients'].remove(ingredient)
                     self.removed_unknown_ingredients.append(ingredient['id'])
+                else:
+                    kept_ingredients.append(ingredient)
+            product['ingredients'][:] = kept_ingredients
 
             # Removing the 'ingredients' key if empty
             if len(product['ingredients']) == 0:
@@ -11,6 +11,11 @@ TOP_LEVEL_NUTRIMENTS_CATEGORIES = ['proteins',
 NUTRIMENTS_CATEGORIES = TOP_LEVEL_NUTRIMENTS_CATEGORIES + ['sugars',
                                                            'saturated-fat']
 
+# Nutritional composition items of the ingredients taken into account for the recipe resolution
+INGREDIENTS_COMPOSITION_ITEMS = NUTRIMENTS_CATEGORIES + ['water', 'ash']
+# Column of each composition item in the ingredients composition tables
+COMPOSITION_COLUMNS = {x: i for i, x in enumerate(INGREDIENTS_COMPOSITION_ITEMS)}
+
 # Max ash content of ingredients in %
 MAX_ASH_CONTENT = 10
 
@@ -161,4 +166,8 @@ FERMENTED_FOOD_CATEGORIES = ['en:fermented-foods']
 # coefficient of the category as values
 HIGH_WATER_LOSS_CATEGORIES = {'en:cheeses': 0.9}
 
+# Warning added when the defined percentages of the ingredients are inconsistent and therefore not used
+DEFINED_PERCENTAGES_NOT_USED_WARNING = "Inconsistencies were found in the defined percentages of the ingredients. " \
+                                       "Defined percentages were not used for estimating the impact."
+
 RESULTS_WARNINGS_NOT_RELIABLE = ["The product has no recognized nutriment information."]
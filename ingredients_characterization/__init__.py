@@ -1 +1,35 @@
 """ Scripts used to build the background data used by the impact estimation program from external data. """
+
+import json
+
+import data
+
+
+def load_ingredients_data(missing_ok=False):
+    """
+    Reads the ingredients data file.
+
+    Args:
+        missing_ok (bool): Should an empty dict be returned if the file does not exist yet?
+
+    Returns:
+        dict: Ingredients data.
+    """
+    try:
+        with open(data.INGREDIENTS_DATA_FILEPATH, 'r', encoding='utf8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        if missing_ok:
+            return dict()
+        raise
+
+
+def save_ingredients_data(ingredients_data):
+    """
+    Writes the ingredients data file.
+
+    Args:
+        ingredients_data (dict): Ingredients data.
+    """
+    with open(data.INGREDIENTS_DATA_FILEPATH, 'w', encoding='utf8') as file:
+        json.dump(ingredients_data, file, indent=2, ensure_ascii=False)
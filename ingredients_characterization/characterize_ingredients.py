@@ -1,28 +1,259 @@
 """ Script to run all the OFF ingredients characterization script at one and in the right order """
+import argparse
+import json
 import os
+import time
 
-from data import INGREDIENTS_DATA_FILEPATH
+from data.bundle import compile_bundle
 
-from ingredients_characterization.nutrition.ciqual import nutri_from_ciqual
-from ingredients_characterization.nutrition.fcen import nutri_from_fcen
-from ingredients_characterization.nutrition import nutrition_from_manual_sources
-from ingredients_characterization.impact import lci_from_agribalyse
-from ingredients_characterization.impact import impacts_from_agribalyse
-from ingredients_characterization.impact import tap_water_impacts
-from ingredients_characterization.duplicates import off_duplicates_processing
+from ingredients_characterization import load_ingredients_data, save_ingredients_data
+from ingredients_characterization.incremental import build_manifest, changed_ingredients, load_manifest, \
+    save_manifest
+from ingredients_characterization.task_graph import Task, run_task_graph
+from ingredients_characterization.vars import CIQUAL_DATA_DIR, CIQUAL_DATA_FILEPATH, \
+    CIQUAL_OFF_LINKING_TABLE_FILEPATH, FCEN_DATA_DIR, FCEN_DATA_FILEPATH, FCEN_OFF_LINKING_TABLE_FILEPATH, \
+    AGRIBALYSE_DATA_FILEPATH, AGRIBALYSE_OFF_LINKING_TABLE_FILEPATH, CHARACTERIZATION_CACHE_DIR
+from ingredients_characterization.nutrition.linking import apply_nutritional_data
+from ingredients_characterization.nutrition.ciqual import ciqual_preprocessing
+from ingredients_characterization.nutrition.ciqual.nutri_from_ciqual import nutri_from_ciqual, ciqual_linked_data
+from ingredients_characterization.nutrition.fcen import fcen_preprocessing
+from ingredients_characterization.nutrition.fcen.nutri_from_fcen import nutri_from_fcen, fcen_linked_data
+from ingredients_characterization.nutrition.nutrition_from_manual_sources import nutrition_from_manual_sources
+from ingredients_characterization.impact.lci_from_agribalyse import lci_from_agribalyse
+from ingredients_characterization.impact.impacts_from_agribalyse import impacts_from_agribalyse
+from ingredients_characterization.impact.tap_water_impacts import tap_water_impacts
+from ingredients_characterization.duplicates.off_duplicates_processing import off_duplicates_processing
+
+# Characterization steps, in the order they must be applied to the ingredients data
+CHARACTERIZATION_STEPS = [nutri_from_ciqual,
+                          nutri_from_fcen,
+                          nutrition_from_manual_sources,
+                          lci_from_agribalyse,
+                          impacts_from_agribalyse,
+                          tap_water_impacts,
+                          off_duplicates_processing]
+
+
+def characterize_ingredients(ingredients_data=None, ingredients_ids=None):
+    """
+    Runs all the characterization steps on the same ingredients data.
+
+    Args:
+        ingredients_data (dict): Ingredients data to start from. The characterization starts from scratch if None.
+        ingredients_ids (set): Ids of the only OFF ingredients to characterize, all of them if None. The ingredients
+            linked together by the duplicates table must be characterized together.
+
+    Returns:
+        tuple: Characterized ingredients data and duration of each step in seconds.
+    """
+    ingredients_data = dict() if ingredients_data is None else ingredients_data
+    durations = dict()
+
+    for step in CHARACTERIZATION_STEPS:
+        start_time = time.time()
+        ingredients_data = step(ingredients_data, ingredients_ids)
+        durations[step.__name__] = time.time() - start_time
+
+    return ingredients_data, durations
+
+
+def agribalyse_impacts_data():
+    """
+    Impacts data of the OFF ingredients from their linked Agribalyse LCIs.
+
+    Returns:
+        dict: Ingredients data with only the environmental impact data sources and the impacts of the ingredients.
+    """
+    return impacts_from_agribalyse(lci_from_agribalyse(dict()))
+
+
+def merge_impacts_data(ingredients_data, impacts_data):
+    """
+    Adds the impacts data of the OFF ingredients, as if the Agribalyse steps were applied to the ingredients data.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        impacts_data (dict): Impacts data, as returned by :func:`agribalyse_impacts_data`.
+
+    Returns:
+        dict: Updated ingredients data.
+    """
+    for ingredient_id, impacts in impacts_data.items():
+        if ingredient_id in ingredients_data:
+            ingredients_data[ingredient_id].update({k: v for k, v in impacts.items() if k != 'id'})
+        else:
+            ingredients_data[ingredient_id] = impacts
+
+    return ingredients_data
+
+
+def characterization_tasks():
+    """
+    Independent stages of the characterization, as a task graph (see :mod:`ingredients_characterization.task_graph`).
+    The preprocessing of the external databases is skipped if their source files are missing.
+    """
+    return [Task('ciqual_preprocessing', ciqual_preprocessing.main,
+                 sources=[os.path.join(CIQUAL_DATA_DIR, 'alim_2020_07_07.xml'),
+                          os.path.join(CIQUAL_DATA_DIR, 'compo_2020_07_07.xml')],
+                 products=[CIQUAL_DATA_FILEPATH],
+                 optional=True),
+            Task('ciqual_linking', ciqual_linked_data,
+                 sources=[CIQUAL_DATA_FILEPATH, CIQUAL_OFF_LINKING_TABLE_FILEPATH],
+                 dependencies=['ciqual_preprocessing']),
+            Task('fcen_preprocessing', fcen_preprocessing.main,
+                 sources=[os.path.join(FCEN_DATA_DIR, 'FOOD NAME.csv'),
+                          os.path.join(FCEN_DATA_DIR, 'NUTRIENT AMOUNT.csv')],
+                 products=[FCEN_DATA_FILEPATH],
+                 optional=True),
+            Task('fcen_linking', fcen_linked_data,
+                 sources=[FCEN_DATA_FILEPATH, FCEN_OFF_LINKING_TABLE_FILEPATH],
+                 dependencies=['fcen_preprocessing']),
+            Task('agribalyse', agribalyse_impacts_data,
+                 sources=[AGRIBALYSE_DATA_FILEPATH, AGRIBALYSE_OFF_LINKING_TABLE_FILEPATH])]
+
+
+def characterize_ingredients_in_parallel(workers=None, use_cache=True):
+    """
+    Characterizes all the ingredients, running the independent stages concurrently.
+
+    The outputs of the stages are merged in the order of CHARACTERIZATION_STEPS, so that the result is identical to
+    the one of :func:`characterize_ingredients`: FCEN data overrides CIQUAL data, manual data overrides both, and the
+    duplicates are processed last.
+
+    Args:
+        workers (int): Maximum number of worker processes.
+        use_cache (bool): Should the stages whose inputs did not change be skipped, reusing their cached outputs?
+
+    Returns:
+        tuple: Characterized ingredients data, duration of each stage and step in seconds and status of each stage
+            ('run', 'cached' or 'skipped').
+    """
+    outputs, report = run_task_graph(characterization_tasks(), workers,
+                                     CHARACTERIZATION_CACHE_DIR if use_cache else None)
+    durations = {name: x['duration'] for name, x in report.items()}
+    statuses = {name: x['status'] for name, x in report.items()}
+
+    merge_steps = [('ciqual merging', lambda x: apply_nutritional_data(x, outputs['ciqual_linking'])),
+                   ('fcen merging', lambda x: apply_nutritional_data(x, outputs['fcen_linking'])),
+                   (nutrition_from_manual_sources.__name__, nutrition_from_manual_sources),
+                   ('agribalyse merging', lambda x: merge_impacts_data(x, outputs['agribalyse'])),
+                   (tap_water_impacts.__name__, tap_water_impacts),
+                   (off_duplicates_processing.__name__, off_duplicates_processing)]
+
+    ingredients_data = dict()
+    for name, step in merge_steps:
+        start_time = time.time()
+        ingredients_data = step(ingredients_data)
+        durations[name] = time.time() - start_time
+
+    return ingredients_data, durations, statuses
+
+
+def patch_ingredients_data(ingredients_data, characterized_data, ingredients_ids):
+    """
+    Replaces the data of some ingredients by their new characterization.
+
+    The ingredients keep their position in the ingredients data, the new ones being appended in the order of the
+    characterization.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        characterized_data (dict): New data of the ingredients.
+        ingredients_ids (set): Ids of the characterized ingredients. The ones absent of the new data are removed.
+
+    Returns:
+        list: Sorted ids of the ingredients whose data changed.
+    """
+    changed_ids = []
+    for ingredient_id in ingredients_ids:
+        if (ingredient_id in ingredients_data) and (ingredient_id not in characterized_data):
+            del ingredients_data[ingredient_id]
+            changed_ids.append(ingredient_id)
+
+    for ingredient_id, ingredient in characterized_data.items():
+        if ingredient_id not in ingredients_data or \
+                json.dumps(ingredients_data[ingredient_id]) != json.dumps(ingredient):
+            ingredients_data[ingredient_id] = ingredient
+            changed_ids.append(ingredient_id)
+
+    return sorted(changed_ids)
+
+
+def update_ingredients_data(ingredients_data, previous_manifest):
+    """
+    Characterizes incrementally the ingredients whose inputs changed since the ingredients data was computed.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        previous_manifest (dict): Manifest of the inputs the ingredients data was computed from
+            (see :mod:`ingredients_characterization.incremental`).
+
+    Returns:
+        tuple: Sorted ids of the ingredients whose data changed, manifest of the current inputs and duration of each
+            step in seconds.
+    """
+    start_time = time.time()
+    manifest = build_manifest(previous_manifest)
+    ingredients_ids = changed_ingredients(previous_manifest, manifest)
+    durations = {'inputs hashing': time.time() - start_time}
+
+    if not ingredients_ids:
+        return [], manifest, durations
+
+    characterized_data, steps_durations = characterize_ingredients(ingredients_ids=ingredients_ids)
+    durations.update(steps_durations)
+
+    return patch_ingredients_data(ingredients_data, characterized_data, ingredients_ids), manifest, durations
 
 
 def main():
-    if os.path.isfile(INGREDIENTS_DATA_FILEPATH):
-        os.remove(INGREDIENTS_DATA_FILEPATH)
-
-    nutri_from_ciqual.main()
-    nutri_from_fcen.main()
-    nutrition_from_manual_sources.main()
-    lci_from_agribalyse.main()
-    impacts_from_agribalyse.main()
-    tap_water_impacts.main()
-    off_duplicates_processing.main()
+    parser = argparse.ArgumentParser(description='Characterize the OFF ingredients.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only recompute the ingredients whose inputs changed since the last characterization')
+    parser.add_argument('--changed-ids', metavar='FILEPATH',
+                        help='JSON file to write the ids of the ingredients whose data changed to')
+    parser.add_argument('--workers', type=int, help='maximum number of worker processes')
+    parser.add_argument('--no-cache', action='store_true', help='run again the stages whose inputs did not change')
+    args = parser.parse_args()
+
+    previous_data = load_ingredients_data(missing_ok=True)
+    previous_manifest = load_manifest() if args.incremental else None
+    if args.incremental and (previous_manifest is None):
+        print("No manifest matching the ingredients data, characterizing all the ingredients")
+
+    statuses = dict()
+    if previous_manifest is not None:
+        changed_ids, manifest, durations = update_ingredients_data(previous_data, previous_manifest)
+        ingredients_data = previous_data
+    else:
+        ingredients_data, durations, statuses = characterize_ingredients_in_parallel(args.workers,
+                                                                                     use_cache=not args.no_cache)
+        changed_ids = patch_ingredients_data(previous_data, ingredients_data,
+                                             set(previous_data) | set(ingredients_data))
+        start_time = time.time()
+        manifest = build_manifest()
+        durations['inputs hashing'] = time.time() - start_time
+
+    if changed_ids or (previous_manifest is None):
+        start_time = time.time()
+        save_ingredients_data(ingredients_data)
+        durations['writing'] = time.time() - start_time
+
+        # Compiling the binary bundle loaded by the impact estimation
+        start_time = time.time()
+        compile_bundle()
+        durations['bundle compilation'] = time.time() - start_time
+
+    save_manifest(manifest)
+
+    if args.changed_ids is not None:
+        with open(args.changed_ids, 'w', encoding='utf8') as file:
+            json.dump(changed_ids, file, indent=2, ensure_ascii=False)
+
+    for step_name, duration in durations.items():
+        status = statuses.get(step_name, 'run')
+        print(f"{step_name:<35}{duration:>8.2f}s" + (f" ({status})" if status != 'run' else ''))
+    print(f"{len(changed_ids)} ingredients changed")
 
 
 if __name__ == '__main__':
@@ -1,24 +1,86 @@
 """ Script to copy nutritional and/or impact data from off ingredients to their proxies """
 
-import json
-import copy
-
 import pandas as pd
 
+from ingredients_characterization import load_ingredients_data, save_ingredients_data
 from ingredients_characterization.vars import OFF_DUPLICATES_FILEPATH
-from data import INGREDIENTS_DATA_FILEPATH
 
 
-def main():
+def roll_up_proxies(ingredients_data, proxy_type, ingredients_ids=None):
+    """
+    Replaces the proxy of each ingredient by the root of its proxies chain.
+
+    The roots of all the chains are found in a single memoized pass. An ingredient that is its own proxy is a root. It
+    keeps its self reference only if no other ingredient has it as root.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        proxy_type (str): 'nutritional_proxy' or 'environmental_impact_proxy'.
+        ingredients_ids (set): Ids of the only OFF ingredients whose proxy is rolled up, all of them if None.
+
+    Raises:
+        ValueError: If the proxies chain of an ingredient contains a cycle.
+    """
+    proxied = [x for x, ingredient in ingredients_data.items()
+               if (proxy_type in ingredient) and ((ingredients_ids is None) or (x in ingredients_ids))]
+
+    roots = dict()
+    for ingredient_id in proxied:
+        # Following the chain until an ingredient without proxy, a self reference or an already resolved ingredient
+        chain = []
+        current = ingredient_id
+        while current not in roots:
+            proxy = ingredients_data[current].get(proxy_type)
+            if (proxy is None) or (proxy == current):
+                roots[current] = current
+            elif current in chain:
+                cycle = chain[chain.index(current):] + [current]
+                raise ValueError(f"Cycle in the {proxy_type} chain: {' -> '.join(cycle)}")
+            else:
+                chain.append(current)
+                current = proxy
+
+        for x in chain:
+            roots[x] = roots[current]
+
+    referenced_roots = {roots[x] for x in proxied if roots[x] != x}
+
+    for ingredient_id in proxied:
+        ingredient = ingredients_data[ingredient_id]
+        if roots[ingredient_id] != ingredient_id:
+            ingredient[proxy_type] = roots[ingredient_id]
+        elif ingredient_id not in referenced_roots:
+            # The self reference is kept, moved to the end of the ingredient data
+            ingredient[proxy_type] = ingredient.pop(proxy_type)
+
+    for root in referenced_roots:
+        if ingredients_data[root].get(proxy_type) == root:
+            del ingredients_data[root][proxy_type]
+
+
+def off_duplicates_processing(ingredients_data, ingredients_ids=None):
+    """
+    Copies the nutritional and/or impact data of the OFF ingredients to their duplicates.
+
+    The nutritional and impact data blocks of a reference are shared with its duplicates instead of being copied, so
+    they must not be modified in place afterwards.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        ingredients_ids (set): Ids of the only OFF ingredients to characterize, all of them if None. The references
+            of these ingredients must be included.
+
+    Returns:
+        dict: Updated ingredients data.
+    """
     duplicates = pd.read_csv(OFF_DUPLICATES_FILEPATH)
     duplicates.columns = ['ingredient', 'reference', 'proxy_type']
-
-    with open(INGREDIENTS_DATA_FILEPATH, 'r', encoding='utf8') as file:
-        ingredients_data = json.load(file)
+    if ingredients_ids is not None:
+        duplicates = duplicates[duplicates.ingredient.isin(ingredients_ids)]
 
     for duplicate in duplicates.itertuples():
         try:
-            proxy = copy.deepcopy(ingredients_data[duplicate.reference])
+            proxy = ingredients_data[duplicate.reference]
         except KeyError:
             continue
 
@@ -42,25 +104,16 @@ def main():
         ingredients_data[duplicate.ingredient] = ingredient
 
     # Rolling up proxies to "root" for all ingredients
-    def get_root_proxy(ingredient_param, proxy_type_param):
-        if proxy_type_param in ingredient_param:
-            if ingredient_param[proxy_type_param] == ingredient_param['id']:
-                del ingredient_param[proxy_type_param]
-                return ingredient_param['id']
+    roll_up_proxies(ingredients_data, 'nutritional_proxy', ingredients_ids)
+    roll_up_proxies(ingredients_data, 'environmental_impact_proxy', ingredients_ids)
 
-            return get_root_proxy(ingredients_data[ingredient_param[proxy_type_param]], proxy_type_param)
-        else:
-            return ingredient_param['id']
+    return ingredients_data
 
-    for ingredient_name, ingredient_data in ingredients_data.items():
-        if 'nutritional_proxy' in ingredient_data:
-            ingredient_data['nutritional_proxy'] = get_root_proxy(ingredient_data, 'nutritional_proxy')
-        if 'environmental_impact_proxy' in ingredient_data:
-            ingredient_data['environmental_impact_proxy'] = get_root_proxy(ingredient_data,
-                                                                           'environmental_impact_proxy')
 
-    with open(INGREDIENTS_DATA_FILEPATH, 'w', encoding='utf8') as file:
-        json.dump(ingredients_data, file, indent=2, ensure_ascii=False)
+def main():
+    ingredients_data = load_ingredients_data()
+    off_duplicates_processing(ingredients_data)
+    save_ingredients_data(ingredients_data)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,191 @@
+"""
+Indexed store of the Agribalyse dataset, shared by the ingredients characterization and the reporting.
+
+The Agribalyse JSON dataset is parsed once and compiled into a binary bundle (see :mod:`data.bundle`) written next to
+it, which is memory-mapped by the following loads as long as the dataset does not change. The store contains:
+
+    - ``agribalyse.lci_names``, ``agribalyse.ciqual_codes``: LCI name and CIQUAL code (``ciqual_AGB``) of each
+      record, used as indexes.
+    - ``agribalyse.entries``: JSON encoded fields of each record, without its impacts.
+    - ``agribalyse.steps_impacts``: Impact of each production step (``agribalyse.steps``) for each impact category
+      (``agribalyse.categories``) of each record (NaN if unknown).
+    - ``agribalyse.synthesis``: Total impact of each record for each impact category (NaN if unknown).
+    - ``agribalyse.non_agricultural_impacts``: Sum of the impacts of the steps other than agriculture of each record
+      for each impact category.
+    - ``agribalyse.units``: Unit of the impacts of each record for each impact category, as an index in
+      ``agribalyse.units_names`` (-1 if the record has no impact for this category).
+"""
+
+import json
+import os
+
+import numpy as np
+
+from data.bundle import Bundle, load_bundle, write_bundle
+from ingredients_characterization.vars import AGRIBALYSE_DATA_FILEPATH
+
+# Production step whose impact is computed by the impact estimation instead of being taken from Agribalyse
+AGRICULTURAL_STEP = 'Agriculture'
+
+
+def store_filepath(filepath):
+    """ Path of the binary store of an Agribalyse dataset file. """
+    return f"{os.path.splitext(filepath)[0]}.bundle"
+
+
+def _first_seen(values):
+    """ Distinct values, in the order of their first appearance. """
+    return list(dict.fromkeys(values))
+
+
+def _store_arrays(records):
+    """ Arrays and string tables of the store of a list of Agribalyse records. """
+    categories = _first_seen(category for x in records for category in x['impact_environnemental'])
+    steps = _first_seen(step
+                        for x in records
+                        for impact in x['impact_environnemental'].values()
+                        for step in impact.get('etapes', dict()))
+    units_names = _first_seen(impact['unite']
+                              for x in records
+                              for impact in x['impact_environnemental'].values())
+
+    steps_impacts = np.full((len(records), len(categories), len(steps)), np.nan)
+    synthesis = np.full((len(records), len(categories)), np.nan)
+    non_agricultural_impacts = np.zeros((len(records), len(categories)))
+    units = np.full((len(records), len(categories)), -1, dtype=np.int32)
+
+    for i, record in enumerate(records):
+        for category, impact in record['impact_environnemental'].items():
+            j = categories.index(category)
+            for step, value in impact.get('etapes', dict()).items():
+                steps_impacts[i, j, steps.index(step)] = value
+            synthesis[i, j] = impact.get('synthese', np.nan)
+            # Summed in the order of the dataset so that the total is exactly the same as when reading the JSON file
+            non_agricultural_impacts[i, j] = sum([v for k, v in impact.get('etapes', dict()).items()
+                                                  if k != AGRICULTURAL_STEP])
+            units[i, j] = units_names.index(impact['unite'])
+
+    arrays = {'agribalyse.steps_impacts': steps_impacts,
+              'agribalyse.synthesis': synthesis,
+              'agribalyse.non_agricultural_impacts': non_agricultural_impacts,
+              'agribalyse.units': units}
+    strings = {'agribalyse.lci_names': [x.get('LCI_name') or '' for x in records],
+               'agribalyse.ciqual_codes': [str(x.get('ciqual_AGB') or '') for x in records],
+               'agribalyse.entries': [json.dumps({k: v for k, v in x.items() if k != 'impact_environnemental'},
+                                                 ensure_ascii=False)
+                                      for x in records],
+               'agribalyse.categories': categories,
+               'agribalyse.steps': steps,
+               'agribalyse.units_names': units_names}
+
+    return arrays, strings
+
+
+def compile_agribalyse_store(filepath, output_filepath):
+    """
+    Compiles the binary store of an Agribalyse dataset.
+
+    Args:
+        filepath (str): Path of the Agribalyse JSON dataset.
+        output_filepath (str): Path of the binary store.
+    """
+    with open(filepath, 'r', encoding='utf8') as file:
+        records = json.load(file)
+
+    arrays, strings = _store_arrays(records)
+    write_bundle(output_filepath, arrays, strings, sources=[filepath])
+
+
+class AgribalyseStore:
+    """
+    Read-only view of the Agribalyse dataset. The records are identified by their row in the dataset.
+    """
+
+    def __init__(self, bundle):
+        """
+        Args:
+            bundle (Bundle): Compiled store.
+        """
+        self.bundle = bundle
+        self.lci_names = bundle.strings('agribalyse.lci_names')
+        self.ciqual_codes = bundle.strings('agribalyse.ciqual_codes')
+        self.entries = bundle.strings('agribalyse.entries')
+        self.categories = list(bundle.strings('agribalyse.categories'))
+        self.steps = list(bundle.strings('agribalyse.steps'))
+        self.units_names = list(bundle.strings('agribalyse.units_names'))
+        self.steps_impacts = bundle.array('agribalyse.steps_impacts')
+        self.synthesis = bundle.array('agribalyse.synthesis')
+        self.non_agricultural_impacts = bundle.array('agribalyse.non_agricultural_impacts')
+        self.units = bundle.array('agribalyse.units')
+        self._categories_index = {x: i for i, x in enumerate(self.categories)}
+
+    def __len__(self):
+        return len(self.lci_names)
+
+    def row_by_lci_name(self, lci_name):
+        """ Row of the record with a given LCI name. Raises a KeyError if there is none. """
+        return self.lci_names.index[lci_name]
+
+    def row_by_ciqual_code(self, ciqual_code):
+        """ Row of the record with a given CIQUAL code. Raises a KeyError if there is none. """
+        if not ciqual_code:
+            raise KeyError(ciqual_code)
+
+        return self.ciqual_codes.index[str(ciqual_code)]
+
+    def entry(self, row):
+        """ Fields of a record other than its impacts (LCI name, CIQUAL code, names, groups...). """
+        return json.loads(self.entries[row])
+
+    def record_categories(self, row):
+        """ Impact categories of a record. """
+        return [x for x, unit in zip(self.categories, self.units[row].tolist()) if unit >= 0]
+
+    def unit(self, row, category):
+        """ Unit of the impacts of a record for an impact category. """
+        return self.units_names[self.units[row, self._categories_index[category]]]
+
+    def step_impacts(self, row, category):
+        """
+        Impacts of the production steps of a record.
+
+        Args:
+            row (int): Row of the record.
+            category (str): French name of the impact category.
+
+        Returns:
+            dict: Impact of each step of the record, in the order of the steps of the dataset.
+        """
+        values = self.steps_impacts[row, self._categories_index[category]].tolist()
+
+        # NaN values, which are the only ones different from themselves, are the steps unknown for this record
+        return {step: value for step, value in zip(self.steps, values) if value == value}
+
+    def total_impact(self, row, category):
+        """ Total impact of a record for an impact category (the 'synthese' field of the dataset). """
+        return float(self.synthesis[row, self._categories_index[category]])
+
+    def non_agricultural_impact(self, row, category):
+        """ Sum of the impacts of the production steps of a record other than agriculture. """
+        return float(self.non_agricultural_impacts[row, self._categories_index[category]])
+
+
+def load_agribalyse_store(filepath=None):
+    """
+    Loads the store of the Agribalyse dataset, compiling it first if it is missing or stale.
+
+    Args:
+        filepath (str): Path of the Agribalyse JSON dataset. Defaults to AGRIBALYSE_DATA_FILEPATH.
+
+    Returns:
+        AgribalyseStore: Store of the dataset.
+    """
+    filepath = filepath or AGRIBALYSE_DATA_FILEPATH
+    output_filepath = store_filepath(filepath)
+
+    bundle = load_bundle(output_filepath)
+    if (bundle is None) or ('agribalyse.lci_names' not in bundle):
+        compile_agribalyse_store(filepath, output_filepath)
+        bundle = Bundle(output_filepath)
+
+    return AgribalyseStore(bundle)
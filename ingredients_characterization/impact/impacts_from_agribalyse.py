@@ -1,22 +1,26 @@
 """ Retrieving Agribalyse impacts from linked LCIs to give impact to OFF ingredients """
 
-import json
 from statistics import mean
 
 from scipy.stats import gmean
 
-from data import INGREDIENTS_DATA_FILEPATH
-from ingredients_characterization.vars import AGRIBALYSE_DATA_FILEPATH
+from ingredients_characterization import load_ingredients_data, save_ingredients_data
+from ingredients_characterization.impact.agribalyse_store import load_agribalyse_store
 from impacts_estimation.vars import IMPACT_MASS_UNIT, AGRIBALYSE_IMPACT_UNITS
 
 
-def main():
-    with open(INGREDIENTS_DATA_FILEPATH, 'r', encoding='utf8') as file:
-        ingredients_data = json.load(file)
+def impacts_from_agribalyse(ingredients_data, ingredients_ids=None):
+    """
+    Adds the impacts of the linked Agribalyse LCIs to the OFF ingredients.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        ingredients_ids (set): Ids of the only OFF ingredients to characterize, all of them if None.
 
-    with open(AGRIBALYSE_DATA_FILEPATH, 'r', encoding='utf8') as file:
-        agribalyse_impacts = json.load(file)
-    agribalyse_impacts = {x['LCI_name']: x for x in agribalyse_impacts}
+    Returns:
+        dict: Updated ingredients data.
+    """
+    agribalyse_store = load_agribalyse_store()
 
     # Choosing only steps corresponding to raw material production and transformation, not packaging or transport
     STEPS_TO_INCLUDE = [
@@ -28,7 +32,10 @@ def main():
         # 'Consommation'
     ]
 
-    for ingredient in ingredients_data.values():
+    for ingredient_id, ingredient in ingredients_data.items():
+        if (ingredients_ids is not None) and (ingredient_id not in ingredients_ids):
+            continue
+
         if 'environmental_impact_data_sources' in ingredient:
             ingredient['impacts'] = dict()
             lcis_impacts = dict()
@@ -38,15 +45,16 @@ def main():
                              for x in ingredient['environmental_impact_data_sources']
                              if x['database'] == 'agribalyse']
             for process_name in process_names:
-                process_impacts = agribalyse_impacts[process_name]['impact_environnemental']
+                row = agribalyse_store.row_by_lci_name(process_name)
 
-                for impact_category, impact_data in process_impacts.items():
+                for impact_category in agribalyse_store.record_categories(row):
                     if impact_category not in lcis_impacts:
                         lcis_impacts[impact_category] = dict()
 
                     lcis_impacts[impact_category][process_name] = sum([v
                                                                        for k, v
-                                                                       in impact_data['etapes'].items()
+                                                                       in agribalyse_store.step_impacts(
+                                                                           row, impact_category).items()
                                                                        if k in STEPS_TO_INCLUDE])
 
                     if impact_category not in ingredient['impacts']:
@@ -54,7 +62,8 @@ def main():
 
                     # Agribalyse impacts are given per 1kg of product.
                     #  If using a different source, ensure of consistency
-                    assert (IMPACT_MASS_UNIT == 1000) and ('/kg de produit' in impact_data['unite'])
+                    assert (IMPACT_MASS_UNIT == 1000) and \
+                           ('/kg de produit' in agribalyse_store.unit(row, impact_category))
                     ingredient['impacts'][impact_category]['unit'] = AGRIBALYSE_IMPACT_UNITS[impact_category]
 
             # Adding the impact values to the ingredient
@@ -100,8 +109,13 @@ def main():
 
                         ingredient['impacts'][impact_category]['uncertainty_distributions'].append(distribution_data)
 
-    with open(INGREDIENTS_DATA_FILEPATH, 'w', encoding='utf8') as file:
-        json.dump(ingredients_data, file, indent=2, ensure_ascii=False)
+    return ingredients_data
+
+
+def main():
+    ingredients_data = load_ingredients_data()
+    impacts_from_agribalyse(ingredients_data)
+    save_ingredients_data(ingredients_data)
 
 
 if __name__ == '__main__':
@@ -1,21 +1,25 @@
 """ Script to link Agribalyse LCI names to OFF ingredients """
 
-import json
-
 import pandas as pd
 
-from data import INGREDIENTS_DATA_FILEPATH
+from ingredients_characterization import load_ingredients_data, save_ingredients_data
 from ingredients_characterization.vars import AGRIBALYSE_OFF_LINKING_TABLE_FILEPATH
 
 
-def main():
-    links = pd.read_csv(AGRIBALYSE_OFF_LINKING_TABLE_FILEPATH)
+def lci_from_agribalyse(ingredients_data, ingredients_ids=None):
+    """
+    Adds the linked Agribalyse LCIs to the environmental impact data sources of the OFF ingredients.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        ingredients_ids (set): Ids of the only OFF ingredients to characterize, all of them if None.
 
-    try:
-        with open(INGREDIENTS_DATA_FILEPATH, 'r', encoding='utf8') as file:
-            ingredients_data = json.load(file)
-    except FileNotFoundError:
-        ingredients_data = dict()
+    Returns:
+        dict: Updated ingredients data.
+    """
+    links = pd.read_csv(AGRIBALYSE_OFF_LINKING_TABLE_FILEPATH)
+    if ingredients_ids is not None:
+        links = links[links.off_id.isin(ingredients_ids)]
 
     for link in links.itertuples():
         if link.off_id not in ingredients_data:
@@ -29,8 +33,13 @@ def main():
             ingredients_data[link.off_id]['environmental_impact_data_sources'].append({'database': 'agribalyse',
                                                                                        'entry': link.agribalyse_en})
 
-    with open(INGREDIENTS_DATA_FILEPATH, 'w', encoding='utf8') as file:
-        json.dump(ingredients_data, file, indent=2, ensure_ascii=False)
+    return ingredients_data
+
+
+def main():
+    ingredients_data = load_ingredients_data(missing_ok=True)
+    lci_from_agribalyse(ingredients_data)
+    save_ingredients_data(ingredients_data)
 
 
 if __name__ == '__main__':
@@ -2,13 +2,23 @@
 
 import json
 
-from data import INGREDIENTS_DATA_FILEPATH
+from ingredients_characterization import load_ingredients_data, save_ingredients_data
 from ingredients_characterization.vars import TAP_WATER_IMPACTS_DATA_FILEPATH
 
 
-def main():
-    with open(INGREDIENTS_DATA_FILEPATH, 'r', encoding='utf8') as file:
-        ingredients_data = json.load(file)
+def tap_water_impacts(ingredients_data, ingredients_ids=None):
+    """
+    Adds the tap water impacts to the water ingredient.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        ingredients_ids (set): Ids of the only OFF ingredients to characterize, all of them if None.
+
+    Returns:
+        dict: Updated ingredients data.
+    """
+    if (ingredients_ids is not None) and ('en:water' not in ingredients_ids):
+        return ingredients_data
 
     with open(TAP_WATER_IMPACTS_DATA_FILEPATH, 'r', encoding='utf8') as file:
         tap_water_impacts = json.load(file)
@@ -21,8 +31,13 @@ def main():
 
     ingredients_data['en:water'] = ingredient
 
-    with open(INGREDIENTS_DATA_FILEPATH, 'w', encoding='utf8') as file:
-        json.dump(ingredients_data, file, indent=2, ensure_ascii=False)
+    return ingredients_data
+
+
+def main():
+    ingredients_data = load_ingredients_data()
+    tap_water_impacts(ingredients_data)
+    save_ingredients_data(ingredients_data)
 
 
 if __name__ == '__main__':
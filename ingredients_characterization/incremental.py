@@ -0,0 +1,229 @@
+"""
+Manifest of the inputs of the OFF ingredients characterization, used to characterize incrementally only the ingredients
+whose inputs changed.
+
+The manifest holds one content hash per input file and, for each OFF ingredient, one content hash per linking table of
+its rows and of the external data they link to. As the data of a duplicate depends on its reference and on the order
+of the duplicates rows, all the ingredients linked together by the duplicates table share the hash of their rows and
+are recomputed together.
+
+The manifest also holds the content hash of the ingredients data file written from these inputs. A manifest that does
+not match the current ingredients data file, for instance because the file was deleted or rebuilt elsewhere, is
+ignored and the characterization runs on all the ingredients.
+"""
+
+import hashlib
+import json
+
+import pandas as pd
+
+import data
+from ingredients_characterization.vars import CIQUAL_DATA_FILEPATH, CIQUAL_OFF_LINKING_TABLE_FILEPATH, \
+    FCEN_DATA_FILEPATH, FCEN_OFF_LINKING_TABLE_FILEPATH, MANUAL_SOURCES_NUTRITION_DATA_FILEPATH, \
+    AGRIBALYSE_DATA_FILEPATH, AGRIBALYSE_OFF_LINKING_TABLE_FILEPATH, TAP_WATER_IMPACTS_DATA_FILEPATH, \
+    OFF_DUPLICATES_FILEPATH, CHARACTERIZATION_MANIFEST_FILEPATH
+
+
+def _hash(obj):
+    """ Content hash of a JSON serializable object. """
+    text = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+
+    return hashlib.sha256(text.encode('utf8')).hexdigest()
+
+
+def _load_json(filepath):
+    with open(filepath, 'r', encoding='utf8') as file:
+        return json.load(file)
+
+
+def file_hash(filepath):
+    """ Content hash of a file, None if it does not exist. """
+    try:
+        with open(filepath, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def files_hashes():
+    """ Content hash of each input file of the characterization. """
+    return {'ciqual_data': file_hash(CIQUAL_DATA_FILEPATH),
+            'ciqual_links': file_hash(CIQUAL_OFF_LINKING_TABLE_FILEPATH),
+            'fcen_data': file_hash(FCEN_DATA_FILEPATH),
+            'fcen_links': file_hash(FCEN_OFF_LINKING_TABLE_FILEPATH),
+            'manual_nutrition_data': file_hash(MANUAL_SOURCES_NUTRITION_DATA_FILEPATH),
+            'agribalyse_data': file_hash(AGRIBALYSE_DATA_FILEPATH),
+            'agribalyse_links': file_hash(AGRIBALYSE_OFF_LINKING_TABLE_FILEPATH),
+            'tap_water_impacts': file_hash(TAP_WATER_IMPACTS_DATA_FILEPATH),
+            'duplicates': file_hash(OFF_DUPLICATES_FILEPATH)}
+
+
+def rows_groups_hashes(table, groups, linked_entries=None):
+    """
+    Content hashes of the groups of rows of a table, each group keeping the order of the table.
+
+    Args:
+        table (pd.DataFrame): Table to hash.
+        groups (iterable): Group of each row. Rows without group are ignored.
+        linked_entries (dict): External data linked to each row of the table, hashed along with it. The entries
+            are identified by the values of the first column of the table.
+
+    Returns:
+        dict: Hash of each group.
+    """
+    records = table.to_dict('records')
+    if linked_entries is not None:
+        # Hashing each entry once, as it may be linked to many rows
+        entries_hashes = {x: _hash(linked_entries.get(x)) for x in set(table.iloc[:, 0])}
+        records = [[x, entries_hashes[y]] for x, y in zip(records, table.iloc[:, 0])]
+
+    groups_records = dict()
+    for group, record in zip(groups, records):
+        if pd.notnull(group):
+            groups_records.setdefault(group, []).append(record)
+
+    return {group: _hash(x) for group, x in groups_records.items()}
+
+
+def read_duplicates():
+    """ Duplicates table, with the 'ingredient', 'reference' and 'proxy_type' columns. """
+    duplicates = pd.read_csv(OFF_DUPLICATES_FILEPATH)
+    duplicates.columns = ['ingredient', 'reference', 'proxy_type']
+
+    return duplicates
+
+
+def duplicates_groups(duplicates):
+    """
+    Groups of the ingredients linked together, directly or not, by the duplicates table.
+
+    Args:
+        duplicates (pd.DataFrame): Duplicates table, as returned by :func:`read_duplicates`.
+
+    Returns:
+        dict: Group of each ingredient of the table, identified by one of its members.
+    """
+    parents = dict()
+
+    def root(x):
+        parents.setdefault(x, x)
+        while parents[x] != x:
+            parents[x] = parents[parents[x]]
+            x = parents[x]
+        return x
+
+    duplicates = duplicates.dropna(subset=['ingredient', 'reference'])
+    for ingredient, reference in zip(duplicates.ingredient, duplicates.reference):
+        parents[root(ingredient)] = root(reference)
+
+    return {x: root(x) for x in parents}
+
+
+def ingredients_hashes():
+    """
+    Content hashes of the inputs of each OFF ingredient.
+
+    Returns:
+        dict: For each OFF ingredient, the hash of its inputs from each linking table.
+    """
+    tables = dict()
+
+    links = pd.read_csv(CIQUAL_OFF_LINKING_TABLE_FILEPATH)
+    links.insert(0, 'source_id', links.CIQUAL_ID.astype(str))
+    tables['ciqual'] = rows_groups_hashes(links, links.OFF_ID, _load_json(CIQUAL_DATA_FILEPATH))
+
+    links = pd.read_csv(FCEN_OFF_LINKING_TABLE_FILEPATH)
+    links.insert(0, 'source_id', links.FCEN_ID.astype(str))
+    tables['fcen'] = rows_groups_hashes(links, links.OFF_ID, _load_json(FCEN_DATA_FILEPATH))
+
+    manual_data = pd.read_csv(MANUAL_SOURCES_NUTRITION_DATA_FILEPATH)
+    tables['manual_nutrition'] = rows_groups_hashes(manual_data, manual_data.OFF_ID)
+
+    links = pd.read_csv(AGRIBALYSE_OFF_LINKING_TABLE_FILEPATH)
+    links.insert(0, 'source_id', links.agribalyse_en)
+    tables['agribalyse'] = rows_groups_hashes(links, links.off_id,
+                                              {x['LCI_name']: x for x in _load_json(AGRIBALYSE_DATA_FILEPATH)})
+
+    tables['tap_water'] = {'en:water': file_hash(TAP_WATER_IMPACTS_DATA_FILEPATH)}
+
+    duplicates = read_duplicates()
+    groups = duplicates_groups(duplicates)
+    groups_hashes = rows_groups_hashes(duplicates, duplicates.ingredient.map(groups))
+    tables['duplicates'] = {x: groups_hashes[group] for x, group in groups.items()}
+
+    hashes = dict()
+    for table, table_hashes in tables.items():
+        for off_id, table_hash in table_hashes.items():
+            hashes.setdefault(off_id, dict())[table] = table_hash
+
+    return hashes
+
+
+def build_manifest(previous_manifest=None):
+    """
+    Builds the manifest of the current inputs of the characterization.
+
+    Args:
+        previous_manifest (dict): Manifest of previous inputs. Its ingredients hashes are reused if no input file
+            changed.
+
+    Returns:
+        dict: Manifest with the hash of each input file ('files') and the hashes of the inputs of each OFF ingredient
+            ('ingredients').
+    """
+    files = files_hashes()
+    if (previous_manifest is not None) and (previous_manifest['files'] == files):
+        return previous_manifest
+
+    return {'files': files, 'ingredients': ingredients_hashes()}
+
+
+def changed_ingredients(previous_manifest, manifest):
+    """
+    OFF ingredients to recompute after a change of the inputs.
+
+    Args:
+        previous_manifest (dict): Manifest of the inputs the ingredients data was computed from.
+        manifest (dict): Manifest of the current inputs.
+
+    Returns:
+        set: Ids of the ingredients whose inputs changed, along with the ingredients linked to them by the duplicates
+            table.
+    """
+    previous_hashes = previous_manifest['ingredients']
+    hashes = manifest['ingredients']
+    changed = {x for x in set(previous_hashes) | set(hashes) if previous_hashes.get(x) != hashes.get(x)}
+    if not changed:
+        return changed
+
+    groups = duplicates_groups(read_duplicates())
+    changed_groups = {groups[x] for x in changed if x in groups}
+
+    return changed | {x for x, group in groups.items() if group in changed_groups}
+
+
+def load_manifest():
+    """
+    Manifest of the inputs of the current ingredients data, None if there is none or if it was written for another
+    ingredients data file.
+    """
+    try:
+        manifest = _load_json(CHARACTERIZATION_MANIFEST_FILEPATH)
+    except FileNotFoundError:
+        return None
+
+    data_hash = file_hash(data.INGREDIENTS_DATA_FILEPATH)
+    if (data_hash is None) or (manifest.get('ingredients_data') != data_hash):
+        return None
+
+    return manifest
+
+
+def save_manifest(manifest):
+    """
+    Writes the manifest of the inputs of the current ingredients data, along with the hash of the ingredients data
+    file. Must be called after the ingredients data file is written.
+    """
+    manifest = {**manifest, 'ingredients_data': file_hash(data.INGREDIENTS_DATA_FILEPATH)}
+    with open(CHARACTERIZATION_MANIFEST_FILEPATH, 'w', encoding='utf8') as file:
+        json.dump(manifest, file, indent=2, ensure_ascii=False, sort_keys=True)
@@ -4,25 +4,12 @@ Script to extract nutrition data from the ciqual XML files and convert it to a m
 
 import os
 import json
-
-import xmltodict
+from xml.etree.ElementTree import iterparse
 
 from ingredients_characterization.vars import CIQUAL_DATA_DIR, CIQUAL_DATA_FILEPATH, CIQUAL_TO_OFF
 
-with open(os.path.join(CIQUAL_DATA_DIR, 'alim_2020_07_07.xml'), 'r', encoding='windows-1252') as file:
-    products = xmltodict.parse(file.read())['TABLE']['ALIM']
-
-with open(os.path.join(CIQUAL_DATA_DIR, 'compo_2020_07_07.xml'), 'r', encoding='windows-1252') as file:
-    compositions = xmltodict.parse(file.read())['TABLE']['COMPO']
-
 top_level_nutriments = ['proteins', 'carbohydrates', 'fat', 'fiber', 'salt', 'water']
 
-# Changing products structures to dicts
-products_dict = dict()
-for product in products:
-    products_dict[product['alim_code']] = product
-products = products_dict
-
 
 def parse_number(text):
     if text == '-':
@@ -34,57 +21,129 @@ def parse_number(text):
                  .replace('<', ''))
 
 
-# Looping over compositions to join the nutritional data
-for composition in compositions:
-    product = products[composition['alim_code']]
-    if 'nutriments' not in product:
-        product['nutriments'] = dict()
-    nutri = product['nutriments']
+def _text(element):
+    """ Stripped text of an element, None if it is empty. """
+    if element is None or element.text is None:
+        return None
 
-    if composition['const_code'] in CIQUAL_TO_OFF:
-        nutri_dict = dict()
+    return element.text.strip() or None
+
+
+def iter_records(filepath, tag):
+    """
+    Streams the records of a CIQUAL XML table.
+
+    The file is parsed incrementally and each record is cleared once read, so that the memory used does not depend on
+    the size of the file.
+
+    Args:
+        filepath (str): Path of the XML file.
+        tag (str): Tag of the records ('ALIM' or 'COMPO').
+
+    Yields:
+        xml.etree.ElementTree.Element: Record element, only valid until the next one is read.
+    """
+    root = None
+    for event, element in iterparse(filepath, events=('start', 'end')):
+        if root is None:
+            root = element
+        elif (event == 'end') and (element.tag == tag):
+            yield element
+            root.clear()
+
+
+def read_products(filepath):
+    """
+    Reads the CIQUAL products.
+
+    Args:
+        filepath (str): Path of the ALIM XML file.
+
+    Returns:
+        dict: Fields of each product, by product code.
+    """
+    products = dict()
+    for record in iter_records(filepath, 'ALIM'):
+        product = {field.tag: _text(field) for field in record}
+        products[product['alim_code']] = product
+
+    return products
+
+
+def add_compositions(products, filepath):
+    """
+    Adds the nutriments of the relevant constituents of the CIQUAL compositions to the products.
 
-        if (type(composition['teneur']) is str) and (type(composition['teneur']) != '-'):
-            nutri_dict['value'] = parse_number(composition['teneur'])
-        if (type(composition['min']) is str) and (type(composition['min']) != '-'):
-            nutri_dict['min'] = parse_number(composition['min'])
-        if (type(composition['max']) is str) and (type(composition['max']) != '-'):
-            nutri_dict['max'] = parse_number(composition['max'])
+    Args:
+        products (dict): Products, as returned by :func:`read_products`, updated in place.
+        filepath (str): Path of the COMPO XML file.
+    """
+    for composition in iter_records(filepath, 'COMPO'):
+        product = products[_text(composition.find('alim_code'))]
+        if 'nutriments' not in product:
+            product['nutriments'] = dict()
+
+        const_code = _text(composition.find('const_code'))
+        if const_code not in CIQUAL_TO_OFF:
+            continue
+
+        nutri_dict = dict()
+        for field, key in (('teneur', 'value'), ('min', 'min'), ('max', 'max')):
+            text = _text(composition.find(field))
+            if text is not None:
+                nutri_dict[key] = parse_number(text)
 
         # CIQUAL confidence code: A = Very likely, D = Less likely
-        if type(composition['code_confiance']) is str:
-            nutri_dict['confidence_code'] = composition['code_confiance']
-
-        nutri_type = CIQUAL_TO_OFF[composition['const_code']]
-        nutri[nutri_type] = nutri_dict
-
-# Looping over products to rectify the data and add a "other" nutriment category
-for product in products.values():
-    total_sum = sum([v['value'] or 0 for k, v in product['nutriments'].items() if k in top_level_nutriments])
-    product['nutriments']['other'] = {'value': 0, 'min': 0, 'max': 0}
-
-    # If the total sum is superior to 100, rectify the values
-    if total_sum > 100:
-        for nutri in product['nutriments'].values():
-            if nutri['value']:
-                nutri['value'] = nutri['value'] * 100 / total_sum
-
-                if 'min' in nutri:
-                    nutri['min'] = min(nutri['value'], nutri['min'])
-
-    # If the total sum is inferior to 100, add a "other" nutriment category that will ensure mass balance
-    elif (total_sum < 100) and (all([product['nutriments'].get(x) is not None for x in top_level_nutriments])):
-        product['nutriments']['other']['value'] = 100 - total_sum
-
-    # Adjust the min and max values for the "other" category
-    product['nutriments']['other']['min'] = max(0, 100 - sum([v.get('max', v['value']) or 0
-                                                              for k, v in product['nutriments'].items()
-                                                              if k in top_level_nutriments]))
-
-    product['nutriments']['other']['max'] = min(100, 100 - sum([v.get('min', v['value']) or 0
-                                                                for k, v in product['nutriments'].items()
-                                                                if k in top_level_nutriments]))
-
-# Exporting the result
-with open(CIQUAL_DATA_FILEPATH, 'w', encoding='utf8') as file:
-    json.dump(products, file, indent=2, ensure_ascii=False)
+        confidence_code = _text(composition.find('code_confiance'))
+        if confidence_code is not None:
+            nutri_dict['confidence_code'] = confidence_code
+
+        product['nutriments'][CIQUAL_TO_OFF[const_code]] = nutri_dict
+
+
+def rectify_nutriments(products):
+    """
+    Rectifies the nutriments of the products and adds a "other" nutriment category to each of them.
+
+    Args:
+        products (dict): Products with their nutriments, updated in place.
+    """
+    for product in products.values():
+        total_sum = sum([v['value'] or 0 for k, v in product['nutriments'].items() if k in top_level_nutriments])
+        product['nutriments']['other'] = {'value': 0, 'min': 0, 'max': 0}
+
+        # If the total sum is superior to 100, rectify the values
+        if total_sum > 100:
+            for nutri in product['nutriments'].values():
+                if nutri['value']:
+                    nutri['value'] = nutri['value'] * 100 / total_sum
+
+                    if 'min' in nutri:
+                        nutri['min'] = min(nutri['value'], nutri['min'])
+
+        # If the total sum is inferior to 100, add a "other" nutriment category that will ensure mass balance
+        elif (total_sum < 100) and (all([product['nutriments'].get(x) is not None for x in top_level_nutriments])):
+            product['nutriments']['other']['value'] = 100 - total_sum
+
+        # Adjust the min and max values for the "other" category
+        product['nutriments']['other']['min'] = max(0, 100 - sum([v.get('max', v['value']) or 0
+                                                                  for k, v in product['nutriments'].items()
+                                                                  if k in top_level_nutriments]))
+
+        product['nutriments']['other']['max'] = min(100, 100 - sum([v.get('min', v['value']) or 0
+                                                                    for k, v in product['nutriments'].items()
+                                                                    if k in top_level_nutriments]))
+
+
+def main():
+    products = read_products(os.path.join(CIQUAL_DATA_DIR, 'alim_2020_07_07.xml'))
+    add_compositions(products, os.path.join(CIQUAL_DATA_DIR, 'compo_2020_07_07.xml'))
+    rectify_nutriments(products)
+
+    # Exporting the result
+    with open(CIQUAL_DATA_FILEPATH, 'w', encoding='utf8') as file:
+        json.dump(products, file, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,133 +1,94 @@
 """ Script to link CIQUAL nutritional data to OFF ingredients """
 
 import json
-from statistics import mean
 
 import pandas as pd
 
+from ingredients_characterization import load_ingredients_data, save_ingredients_data
+from ingredients_characterization.nutrition.linking import linked_nutritional_data, apply_nutritional_data
 from ingredients_characterization.vars import CIQUAL_DATA_FILEPATH, CIQUAL_OFF_LINKING_TABLE_FILEPATH
-from data import INGREDIENTS_DATA_FILEPATH
 
 
-def main():
+def ciqual_nutriments(ciqual_data, ciqual_ids):
+    """
+    Table of the nutriments of CIQUAL products, as expected by
+    :func:`~ingredients_characterization.nutrition.linking.link_nutriments`.
+
+    Getting minimum and maximum value for each nutriment. If they are not present, uses the reference value. The
+    maximum values are limited to 100 except for energy. If the reference value is undefined, the middle value is
+    taken, which uses the limited maximum value for ingredients linked to a single product.
+
+    Args:
+        ciqual_data (dict): CIQUAL products.
+        ciqual_ids (iterable): Ids of the CIQUAL products to include.
+
+    Returns:
+        pd.DataFrame: Nutriments of the CIQUAL products.
+    """
+    rows = []
+    for ciqual_id in ciqual_ids:
+        for nutriment_name, nutriment_data in ciqual_data[ciqual_id]['nutriments'].items():
+            if (nutriment_data.get('value') is None) and (nutriment_data.get('min') is None):
+                continue
+
+            value = nutriment_data.get('value')
+            min_value = nutriment_data['min'] if 'min' in nutriment_data else value
+            max_value = nutriment_data['max'] if 'max' in nutriment_data else value
+            limited_max_value = min(max_value, 100) if nutriment_name != 'energy-kcal' else max_value
+
+            # If value is undefined, take the middle value
+            single_value = value
+            if (value is None) and ((min_value is not None) and (max_value is not None)):
+                value = (min_value + max_value) / 2
+                single_value = (min_value + limited_max_value) / 2
+
+            rows.append((ciqual_id, nutriment_name, value, min_value, limited_max_value, single_value))
+
+    return pd.DataFrame(rows, columns=['source_id', 'nutriment', 'value', 'min', 'max', 'single_value'], dtype=object)
+
+
+def ciqual_linked_data(ingredients_ids=None):
+    """
+    Nutritional data of the OFF ingredients from their linked CIQUAL products.
+
+    Args:
+        ingredients_ids (set): Ids of the only OFF ingredients to characterize, all of them if None.
+
+    Returns:
+        dict: Nutritional data of each linked OFF ingredient
+            (see :func:`~ingredients_characterization.nutrition.linking.linked_nutritional_data`).
+    """
     links = pd.read_csv(CIQUAL_OFF_LINKING_TABLE_FILEPATH)
+    links = pd.DataFrame({'off_id': links.OFF_ID, 'source_id': links.CIQUAL_ID.astype(str)})
+    if ingredients_ids is not None:
+        links = links[links.off_id.isin(ingredients_ids)]
 
     with open(CIQUAL_DATA_FILEPATH, 'r', encoding='utf8') as file:
         ciqual_data = json.load(file)
 
-    try:
-        with open(INGREDIENTS_DATA_FILEPATH, 'r', encoding='utf8') as file:
-            ingredients_data = json.load(file)
-    except FileNotFoundError:
-        ingredients_data = dict()
-
-    # Looping on all links to append ciqual data to off ingredients
-    for off_id in links.OFF_ID.unique():
-
-        if off_id in ingredients_data:
-            ingredient = ingredients_data[off_id]
-        else:
-            ingredient = {'id': off_id}
-
-        ingredient['nutritional_data_sources'] = []
-        nutriments = dict()
-
-        # Looping on ciqual products related to this off ingredient
-        ciqual_ids = list(links[links.OFF_ID == off_id].CIQUAL_ID)
-        if len(ciqual_ids) == 0:
-            continue
-        elif len(ciqual_ids) == 1:
-            ciqual_product = ciqual_data[str(ciqual_ids[0])]
-            ciqual_nutriments = ciqual_product['nutriments']
-
-            ingredient['nutritional_data_sources'].append({'database': 'ciqual',
-                                                           'entry': ciqual_product['alim_nom_eng']})
-
-            # Getting minimum and maximum value for each nutriment
-            # If they are not present, uses the confidence code to deduce it from the reference value
-            # If there is no confidence code, use default error margin of 10%
-            for nutriment_name in ciqual_nutriments:
-                if (ciqual_nutriments[nutriment_name].get('value') is None) and \
-                        (ciqual_nutriments[nutriment_name].get('min') is None):
-                    continue
-
-                value = ciqual_nutriments[nutriment_name].get('value')
-
-                if 'min' in ciqual_nutriments[nutriment_name]:
-                    min_value = ciqual_nutriments[nutriment_name]['min']
-                else:
-                    min_value = value
-
-                if 'max' in ciqual_nutriments[nutriment_name]:
-                    max_value = ciqual_nutriments[nutriment_name]['max']
-                else:
-                    max_value = value
-
-                max_value = min(max_value, 100) if nutriment_name != 'energy-kcal' else max_value
-
-                # If value is undefined, take the middle value
-                if (value is None) and ((min_value is not None) and (max_value is not None)):
-                    value = (min_value + max_value) / 2
-
-                nutriments[nutriment_name] = {'value': value, 'min': min_value, 'max': max_value}
-        else:
-            # If there are more than one ciqual product linked to this off ingredient,
-            # compile the data of every ciqual product
-            values = dict()
-            min_values = dict()
-            max_values = dict()
-            for ciqual_id in ciqual_ids:
-                ciqual_product = ciqual_data[str(ciqual_id)]
-
-                ingredient['nutritional_data_sources'].append({'database': 'ciqual',
-                                                               'entry': ciqual_product['alim_nom_eng']})
-
-                for nutriment_name, nutriment_data in ciqual_product['nutriments'].items():
-                    if (nutriment_data.get('value') is None) and (nutriment_data.get('min') is None):
-                        continue
-
-                    if nutriment_name not in values:
-                        values[nutriment_name] = []
-                        min_values[nutriment_name] = []
-                        max_values[nutriment_name] = []
-
-                    value = nutriment_data.get('value')
-
-                    if 'min' in nutriment_data:
-                        min_value = nutriment_data['min']
-                    else:
-                        min_value = value
-
-                    if 'max' in nutriment_data:
-                        max_value = nutriment_data['max']
-                    else:
-                        max_value = value
-
-                    # If value is undefined, take the middle value
-                    if (value is None) and ((min_value is not None) and (max_value is not None)):
-                        value = (min_value + max_value) / 2
-
-                    values[nutriment_name].append(value)
-                    min_values[nutriment_name].append(min_value)
-                    max_values[nutriment_name].append(min(max_value, 100)
-                                                      if nutriment_name != 'energy-kcal'
-                                                      else max_value)
-
-            for nutriment_name in values.keys():
-                if values[nutriment_name]:
-                    nutriments[nutriment_name] = {'value': mean(values[nutriment_name]),
-                                                  'min': min(min_values[nutriment_name]),
-                                                  'max': max(max_values[nutriment_name])}
-
-        if len(nutriments) > 0:
-            # Add the nutriments dict to the ingredient
-            ingredient['nutriments'] = nutriments
-
-            # Adding the ingredient to the main result
-            ingredients_data[off_id] = ingredient
-
-    with open(INGREDIENTS_DATA_FILEPATH, 'w', encoding='utf8') as file:
-        json.dump(ingredients_data, file, indent=2, ensure_ascii=False)
+    ciqual_ids = links.source_id.unique()
+    return linked_nutritional_data(links, ciqual_nutriments(ciqual_data, ciqual_ids), 'ciqual',
+                                   {x: ciqual_data[x]['alim_nom_eng'] for x in ciqual_ids})
+
+
+def nutri_from_ciqual(ingredients_data, ingredients_ids=None):
+    """
+    Adds the nutritional data of the linked CIQUAL products to the OFF ingredients.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        ingredients_ids (set): Ids of the only OFF ingredients to characterize, all of them if None.
+
+    Returns:
+        dict: Updated ingredients data.
+    """
+    return apply_nutritional_data(ingredients_data, ciqual_linked_data(ingredients_ids))
+
+
+def main():
+    ingredients_data = load_ingredients_data(missing_ok=True)
+    nutri_from_ciqual(ingredients_data)
+    save_ingredients_data(ingredients_data)
 
 
 if __name__ == '__main__':
@@ -3,46 +3,107 @@ Preprocessing of the Fichier Canadien des Éléments Nutritifs (FCEN) data befor
 """
 
 import os
-import pandas as pd
 import json
 
-from ingredients_characterization.vars import FCEN_DATA_DIR, FCEN_NUTRIMENTS_TO_OFF, FCEN_DATA_FILEPATH
+import numpy as np
+import pandas as pd
+
+from ingredients_characterization.vars import FCEN_DATA_DIR, FCEN_NUTRIMENTS_TO_OFF, FCEN_DATA_FILEPATH, \
+    FCEN_NUTRIENT_AMOUNTS_CHUNK_SIZE
+
+TOP_LEVEL_NUTRIMENTS = ['proteins', 'carbohydrates', 'fat', 'fiber', 'water']
+
+
+def read_nutrient_amounts(filepath, chunksize=FCEN_NUTRIENT_AMOUNTS_CHUNK_SIZE):
+    """
+    Reads the amounts of the nutrients used to characterize OFF ingredients.
+
+    The file is read by chunks that are filtered before being gathered, so that the memory used stays bounded by the
+    size of a chunk and of the kept amounts.
+
+    Args:
+        filepath (str): Path of the FCEN nutrient amounts file.
+        chunksize (int): Number of rows read at once.
+
+    Returns:
+        pd.DataFrame: Food id, nutrient id, value and standard error of the kept amounts, in the file order.
+    """
+    columns = ['FoodID', 'NutrientID', 'NutrientValue', 'StandardError']
+    chunks = pd.read_csv(filepath, encoding='ISO-8859-1', usecols=columns, chunksize=chunksize)
+
+    return pd.concat([chunk[chunk.NutrientID.isin(FCEN_NUTRIMENTS_TO_OFF.keys())] for chunk in chunks],
+                     ignore_index=True)
 
-# Reading data from FCEN
-food_names = pd.read_csv(os.path.join(FCEN_DATA_DIR, 'FOOD NAME.csv'), encoding='ISO-8859-1')
-nutrient_amounts = pd.read_csv(os.path.join(FCEN_DATA_DIR, 'NUTRIENT AMOUNT.csv'), encoding='ISO-8859-1')
 
-top_level_nutriments = ['proteins', 'carbohydrates', 'fat', 'fiber', 'water']
+def foods_nutriments(nutrient_amounts):
+    """
+    Computes the nutriments of each food from the nutrient amounts.
 
-# Looping on FCEN ingredients
-result = dict()
-for i, food in food_names.iterrows():
+    The nutriments of each food are in the order of the amounts. The nutriments are rectified so that the top level
+    nutriments sum up to 100 at most, and an "other" nutriment category is added to ensure mass balance.
 
-    # Looping on nutriments
-    nutriments = dict()
-    foo_nutrient_amounts = nutrient_amounts[(nutrient_amounts.FoodID == food.FoodID) &
-                                            (nutrient_amounts.NutrientID.isin(FCEN_NUTRIMENTS_TO_OFF.keys()))]
-    for j, nutri_amount in foo_nutrient_amounts.iterrows():
-        nutriments[FCEN_NUTRIMENTS_TO_OFF[nutri_amount.NutrientID]] = {"value": nutri_amount.NutrientValue,
-                                                                       "stdev": nutri_amount.StandardError}
+    Args:
+        nutrient_amounts (pd.DataFrame): Nutrient amounts, as returned by :func:`read_nutrient_amounts`.
 
-    nutriments_sum = sum([v['value'] for k, v in nutriments.items() if k in top_level_nutriments])
-    nutriments['other'] = {'value': 0, 'stdev': 0}
+    Returns:
+        dict: Nutriments of each food id.
+    """
+    amounts = nutrient_amounts.assign(nutriment=nutrient_amounts.NutrientID.map(FCEN_NUTRIMENTS_TO_OFF))
+
+    # A nutriment given several times keeps the position of its first amount and the values of its last one
+    amounts['position'] = np.arange(len(amounts))
+    amounts['position'] = amounts.groupby(['FoodID', 'nutriment'], sort=False).position.transform('min')
+    amounts = amounts.drop_duplicates(['FoodID', 'nutriment'], keep='last') \
+        .sort_values(['FoodID', 'position'], kind='stable') \
+        .reset_index(drop=True)
+
+    food_ids, foods, counts = np.unique(amounts.FoodID.to_numpy(), return_inverse=True, return_counts=True)
+    starts = np.cumsum(counts) - counts
+
+    # Summing the top level nutriments of each food sequentially, in the order of its nutriments
+    is_top_level = amounts.nutriment.isin(TOP_LEVEL_NUTRIMENTS).to_numpy()
+    values = amounts.NutrientValue.to_numpy(dtype=float)
+    nutriments_sums = np.zeros(len(food_ids))
+    np.add.at(nutriments_sums, foods[is_top_level], values[is_top_level])
+    all_top_level = np.bincount(foods[is_top_level], minlength=len(food_ids)) == len(TOP_LEVEL_NUTRIMENTS)
 
     # If the total sum is superior to 100, rectify the values
-    if nutriments_sum > 100:
-        for nutri in nutriments.values():
-            if nutri['value']:
-                nutri['value'] = nutri['value'] * 100 / nutriments_sum
+    rectified = np.repeat(nutriments_sums > 100, counts) & (values != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(rectified, values * 100 / np.repeat(nutriments_sums, counts), values)
 
     # If the total sum is inferior to 100, add a "other" nutriment category that will ensure mass balance
-    elif (nutriments_sum < 100) and (all([x in nutriments for x in top_level_nutriments])):
-        nutriments['other']['value'] = 100 - nutriments_sum
+    other_values = np.where((nutriments_sums < 100) & all_top_level, 100 - nutriments_sums, np.nan)
+
+    result = dict()
+    names = amounts.nutriment.tolist()
+    values = values.tolist()
+    stdevs = amounts.StandardError.tolist()
+    for food_id, start, count, other_value in zip(food_ids.tolist(), starts, counts, other_values.tolist()):
+        nutriments = {names[i]: {'value': values[i], 'stdev': stdevs[i]} for i in range(start, start + count)}
+        nutriments['other'] = {'value': 0 if np.isnan(other_value) else other_value, 'stdev': 0}
+        result[food_id] = nutriments
+
+    return result
+
+
+def main():
+    # Reading data from FCEN
+    food_names = pd.read_csv(os.path.join(FCEN_DATA_DIR, 'FOOD NAME.csv'), encoding='ISO-8859-1')
+    nutrient_amounts = read_nutrient_amounts(os.path.join(FCEN_DATA_DIR, 'NUTRIENT AMOUNT.csv'))
+
+    nutriments = foods_nutriments(nutrient_amounts)
 
     # Adding the data to the result
-    food['nutriments'] = nutriments
-    result[food.FoodID] = food.to_dict()
+    result = dict()
+    for food in food_names.to_dict('records'):
+        food['nutriments'] = nutriments.get(food['FoodID'], {'other': {'value': 0, 'stdev': 0}})
+        result[food['FoodID']] = food
+
+    # Saving the result
+    with open(FCEN_DATA_FILEPATH, 'w', encoding='utf8') as file:
+        json.dump(result, file, indent=2, ensure_ascii=False)
+
 
-# Saving the result
-with open(FCEN_DATA_FILEPATH, 'w', encoding='utf8') as file:
-    json.dump(result, file, indent=2, ensure_ascii=False)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+""" Linking of the nutritional data of external databases products to OFF ingredients """
+
+from statistics import mean
+
+import numpy as np
+import pandas as pd
+
+# Nutriment fields aggregated over the products linked to an ingredient
+NUTRIMENT_FIELDS = ('value', 'min', 'max')
+
+
+def _as_float(values):
+    """ Float array of Python numbers, None being NaN. """
+    return np.array([np.nan if x is None else x for x in values], dtype=float)
+
+
+def _first_extremum_positions(values, starts, counts, extremum):
+    """
+    Position of the first extreme value of each group, like the builtin min or max keep the first of the extreme
+    values. The values of each group must be contiguous.
+
+    Args:
+        values (np.ndarray): Float values.
+        starts (np.ndarray): Position of the first value of each group.
+        counts (np.ndarray): Number of values of each group.
+        extremum (np.ufunc): np.fmin or np.fmax.
+    """
+    extrema = extremum.reduceat(values, starts)
+    positions = np.where(values == np.repeat(extrema, counts), np.arange(len(values)), len(values))
+
+    return np.minimum.reduceat(positions, starts)
+
+
+def _mean(values, starts, counts):
+    """
+    Mean of the values of each group, identical to statistics.mean (including the int type of the mean of ints).
+
+    The values of each group must be contiguous. The mean of one or two floats is computed on arrays as a float sum is
+    correctly rounded for up to two values, like statistics.mean. The groups with more values fall back to
+    statistics.mean.
+    """
+    floats = _as_float(values)
+    is_int = np.array([type(x) is int for x in values], dtype=bool)
+
+    sums = np.add.reduceat(floats, starts)
+    all_ints = np.logical_and.reduceat(is_int, starts)
+    result = (sums / counts).tolist()
+
+    for i in np.flatnonzero(counts == 1):
+        result[i] = values[starts[i]]
+    for i in np.flatnonzero((counts == 2) & all_ints & (sums % 2 == 0)):
+        result[i] = int(sums[i]) // 2
+    for i in np.flatnonzero(counts > 2):
+        result[i] = mean(values[starts[i]:starts[i] + counts[i]])
+
+    return result
+
+
+def link_nutriments(links, source_nutriments):
+    """
+    Joins the nutriments of the products of an external database to the OFF ingredients they are linked to.
+
+    The value of a nutriment of an ingredient is the mean of the values of its linked products, its minimum and maximum
+    values are the extrema of the ones of its linked products. The results are identical to the aggregation of the
+    values in Python lists.
+
+    Args:
+        links (pd.DataFrame): Linking table with the OFF ingredients ids ('off_id') and the ids of the external
+            products ('source_id') as columns.
+        source_nutriments (pd.DataFrame): Table with one row per nutriment of each external product, with its product
+            id ('source_id'), its name ('nutriment') and its 'value', 'min' and 'max' as Python numbers. The fields can
+            differ for ingredients linked to a single product, in which case they are given by the 'single_value',
+            'single_min' and 'single_max' columns.
+
+    Returns:
+        pd.DataFrame: Table with one row per nutriment of each OFF ingredient, with the ingredient id ('off_id'), the
+            nutriment name ('nutriment') and its 'value', 'min' and 'max'. The ingredients are in their first
+            appearance order in the linking table, and their nutriments in their first appearance order in the linked
+            products.
+    """
+    links = links.reset_index(drop=True)
+    links['link_position'] = links.index
+    links['links_number'] = links.groupby('off_id', sort=False).off_id.transform('size')
+
+    source_nutriments = source_nutriments.reset_index(drop=True)
+    source_nutriments['nutriment_position'] = source_nutriments.index
+    linked = links.merge(source_nutriments, on='source_id', how='inner') \
+        .sort_values(['link_position', 'nutriment_position'], kind='stable') \
+        .reset_index(drop=True)
+
+    # Ingredients linked to a single product may use different fields
+    single = linked.links_number.to_numpy() == 1
+    for field in NUTRIMENT_FIELDS:
+        if f"single_{field}" in linked:
+            linked[field] = linked[f"single_{field}"].where(single, linked[field])
+
+    # Gathering the rows of each nutriment of each ingredient, in the order of the linked products
+    groups = linked.groupby(['off_id', 'nutriment'], sort=False).ngroup().to_numpy()
+    order = np.argsort(groups, kind='stable')
+    linked = linked.iloc[order].reset_index(drop=True)
+    groups = groups[order]
+
+    starts = np.flatnonzero(np.diff(groups, prepend=-1))
+    counts = np.diff(np.append(starts, len(groups)))
+    result = linked.loc[starts, ['off_id', 'nutriment']].reset_index(drop=True)
+
+    minimums = _first_extremum_positions(_as_float(linked['min']), starts, counts, np.fmin)
+    maximums = _first_extremum_positions(_as_float(linked['max']), starts, counts, np.fmax)
+    result['value'] = pd.Series(_mean(linked['value'].to_numpy(dtype=object), starts, counts), dtype=object)
+    result['min'] = linked['min'].to_numpy(dtype=object)[minimums]
+    result['max'] = linked['max'].to_numpy(dtype=object)[maximums]
+
+    return result
+
+
+def linked_nutritional_data(links, source_nutriments, database, entries):
+    """
+    Nutritional data of the OFF ingredients from the linked products of an external database.
+
+    Args:
+        links (pd.DataFrame): Linking table with the OFF ingredients ids ('off_id') and the ids of the external
+            products ('source_id') as columns.
+        source_nutriments (pd.DataFrame): Nutriments of the external products (see :func:`link_nutriments`).
+        database (str): Name of the external database.
+        entries (dict): Name of each external product.
+
+    Returns:
+        dict: Nutritional data sources ('nutritional_data_sources') and nutriments ('nutriments', only if there is at
+            least one) of each linked OFF ingredient, in their first appearance order in the linking table.
+    """
+    links = links.dropna(subset=['off_id'])
+
+    ingredients_nutriments = dict()
+    for nutriment in link_nutriments(links, source_nutriments).itertuples():
+        ingredients_nutriments.setdefault(nutriment.off_id, dict())[nutriment.nutriment] = {'value': nutriment.value,
+                                                                                            'min': nutriment.min,
+                                                                                            'max': nutriment.max}
+
+    linked_data = dict()
+    for off_id, source_ids in links.groupby('off_id', sort=False).source_id:
+        linked_data[off_id] = {'nutritional_data_sources': [{'database': database, 'entry': entries[x]}
+                                                            for x in source_ids]}
+        if off_id in ingredients_nutriments:
+            linked_data[off_id]['nutriments'] = ingredients_nutriments[off_id]
+
+    return linked_data
+
+
+def apply_nutritional_data(ingredients_data, linked_data):
+    """
+    Adds the nutritional data of the linked products of an external database to the OFF ingredients.
+
+    The nutritional data sources of all the linked ingredients are replaced by their linked products, but only the
+    ingredients with at least one nutriment are added to the ingredients data.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        linked_data (dict): Nutritional data of the linked ingredients, as returned by
+            :func:`linked_nutritional_data`.
+
+    Returns:
+        dict: Updated ingredients data.
+    """
+    for off_id, data in linked_data.items():
+        if off_id in ingredients_data:
+            ingredient = ingredients_data[off_id]
+        else:
+            ingredient = {'id': off_id}
+
+        ingredient['nutritional_data_sources'] = data['nutritional_data_sources']
+
+        if 'nutriments' in data:
+            # Add the nutriments dict to the ingredient
+            ingredient['nutriments'] = data['nutriments']
+
+            # Adding the ingredient to the main result
+            ingredients_data[off_id] = ingredient
+
+    return ingredients_data
+
+
+def add_nutritional_data(ingredients_data, links, source_nutriments, database, entries):
+    """
+    Adds the nutritional data of the linked products of an external database to the OFF ingredients
+    (see :func:`linked_nutritional_data` and :func:`apply_nutritional_data`).
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        links (pd.DataFrame): Linking table with the OFF ingredients ids ('off_id') and the ids of the external
+            products ('source_id') as columns.
+        source_nutriments (pd.DataFrame): Nutriments of the external products (see :func:`link_nutriments`).
+        database (str): Name of the external database.
+        entries (dict): Name of each external product.
+
+    Returns:
+        dict: Updated ingredients data.
+    """
+    return apply_nutritional_data(ingredients_data, linked_nutritional_data(links, source_nutriments, database,
+                                                                            entries))
@@ -1,19 +1,26 @@
 """ Nutritional characterization of OFF ingredients by manually collected data """
 
-import json
-
 import pandas as pd
 
-from data import INGREDIENTS_DATA_FILEPATH
+from ingredients_characterization import load_ingredients_data, save_ingredients_data
 from ingredients_characterization.vars import MANUAL_SOURCES_NUTRITION_DATA_FILEPATH
 from impacts_estimation.vars import NUTRIMENTS_CATEGORIES, TOP_LEVEL_NUTRIMENTS_CATEGORIES
 
 
-def main():
-    with open(INGREDIENTS_DATA_FILEPATH, 'r', encoding='utf8') as file:
-        ingredients_data = json.load(file)
+def nutrition_from_manual_sources(ingredients_data, ingredients_ids=None):
+    """
+    Adds the manually collected nutritional data to the OFF ingredients.
+
+    Args:
+        ingredients_data (dict): Ingredients data, updated in place.
+        ingredients_ids (set): Ids of the only OFF ingredients to characterize, all of them if None.
 
+    Returns:
+        dict: Updated ingredients data.
+    """
     manual_data = pd.read_csv(MANUAL_SOURCES_NUTRITION_DATA_FILEPATH)
+    if ingredients_ids is not None:
+        manual_data = manual_data[manual_data.OFF_ID.isin(ingredients_ids)]
 
     # Adding data with nutritional values
     for nutrition_data in manual_data.itertuples():
@@ -72,8 +79,13 @@ def main():
 
         ingredients_data[ingredient_name] = ingredient
 
-    with open(INGREDIENTS_DATA_FILEPATH, 'w', encoding='utf8') as file:
-        json.dump(ingredients_data, file, indent=2, ensure_ascii=False)
+    return ingredients_data
+
+
+def main():
+    ingredients_data = load_ingredients_data()
+    nutrition_from_manual_sources(ingredients_data)
+    save_ingredients_data(ingredients_data)
 
 
 if __name__ == '__main__':
@@ -1,52 +1,231 @@
 """
 Script to get the distribution of defined percentage of most important ingredients according to their categories.
-Needs a working MongoDB server containing the Open Food Facts database.
+Reads the Open Food Facts JSONL export (https://world.openfoodfacts.org/data), compressed with gzip or not.
+
+Usage:
+    python ingredients_characterization/percentages_distribution/ingredients_percentage_distribution.py \
+        openfoodfacts-products.jsonl.gz --workers 8
 """
 
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+from collections import deque
+
+import numpy as np
 import pandas as pd
-import pymongo
-import tqdm
 
 from data import INGREDIENTS_DISTRIBUTION_FILEPATH
+from data.bundle import write_bundle, _reference_distribution_arrays
 
 # Minimum number of defined percentage per ingredient
 MIN_VALUE_NB = 30
 
-df = pd.DataFrame(columns=['id', 'percent', 'categories_tags'])
+# Number of lines of a compressed export sent at once to a worker process
+GZIP_LINES_BLOCK_SIZE = 10000
+
 
-client = pymongo.MongoClient()
-db = client['off']
-products = db['products']
-query = {"ingredients": {"$elemMatch": {"percent": {"$exists": True}}}}
+def product_percentages(product):
+    """
+    Defined percentages of the ingredients of a product.
 
-cursor = products.find(query,
-                       {'ingredients.percent': 1,
-                        'ingredients.id': 1,
-                        'categories_tags': 1},
-                       no_cursor_timeout=True).batch_size(1000)
+    Args:
+        product (dict): OFF product.
 
-# Looping on all products and all ingredients, adding the ingredient and its percentage to the dataframe if it is
-#  defined
-for product in tqdm.tqdm(cursor):
-    for ingredient in product['ingredients']:
-        if 'percent' not in ingredient:
+    Returns:
+        list: Id and percentage of the ingredients with a valid defined percentage.
+    """
+    percentages = []
+    for ingredient in product.get('ingredients') or []:
+        if ('percent' not in ingredient) or ('id' not in ingredient):
             continue
+
+        try:
+            percent = float(ingredient['percent'])
+        except (TypeError, ValueError):
+            continue
+
         # Removing erroneous data
-        if not (0 < float(ingredient["percent"]) <= 100):
+        if not (0 < percent <= 100):
             continue
 
-        df = df.append({"id": ingredient['id'],
-                        "percent": float(ingredient["percent"]),
-                        "categories_tags": product.get('categories_tags')},
-                       ignore_index=True)
+        percentages.append((ingredient['id'], percent))
+
+    return percentages
+
+
+def scan_lines(lines):
+    """
+    Collects the defined percentages of the ingredients of the products of some lines of the export.
+
+    Args:
+        lines (iterable): Lines of the export, as bytes.
+
+    Returns:
+        tuple: Columns of the defined percentages: ingredients ids, percentages and categories tags of the products.
+    """
+    ids = []
+    percents = []
+    categories_tags = []
+    for line in lines:
+        # Most products have no defined percentage, they are skipped without being parsed
+        if b'"percent"' not in line:
+            continue
+
+        product = json.loads(line)
+        percentages = product_percentages(product)
+        if percentages:
+            ids += [x[0] for x in percentages]
+            percents += [x[1] for x in percentages]
+            categories_tags += [product.get('categories_tags')] * len(percentages)
+
+    return ids, np.array(percents, dtype=float), categories_tags
+
+
+def _scan_byte_range(task):
+    """ Scans the lines of an uncompressed export starting between two byte positions. """
+    filepath, start, end = task
+    with open(filepath, 'rb') as file:
+        # Skipping the line started before the range, which belongs to the previous one
+        if start > 0:
+            file.seek(start - 1)
+            start += len(file.readline()) - 1
+
+        def lines():
+            position = start
+            for line in file:
+                if position >= end:
+                    break
+                position += len(line)
+                yield line
+
+        return scan_lines(lines())
+
+
+def byte_ranges(filepath, shards):
+    """
+    Splits a file into contiguous byte ranges of similar sizes.
+
+    Args:
+        filepath (str): Path of the file.
+        shards (int): Number of ranges.
+
+    Returns:
+        list: Start and end positions of the ranges.
+    """
+    bounds = np.linspace(0, os.path.getsize(filepath), shards + 1).astype(np.int64).tolist()
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _lines_blocks(filepath, block_size=GZIP_LINES_BLOCK_SIZE):
+    """ Blocks of lines of a compressed export, which cannot be read from arbitrary positions. """
+    with gzip.open(filepath, 'rb') as file:
+        block = []
+        for line in file:
+            block.append(line)
+            if len(block) == block_size:
+                yield block
+                block = []
+        if block:
+            yield block
+
+
+def read_percentages(filepath, workers=1):
+    """
+    Collects the defined percentages of the ingredients of all the products of the export.
+
+    The work is shared among processes by byte ranges of the export, or by blocks of lines if it is compressed.
+
+    Args:
+        filepath (str): Path of the JSONL export, compressed if its extension is .gz.
+        workers (int): Number of worker processes.
+
+    Returns:
+        pd.DataFrame: Ingredient id, percentage and categories tags of the product of each defined percentage, in the
+            order of the export.
+    """
+    if filepath.endswith('.gz'):
+        tasks = _lines_blocks(filepath)
+        function = scan_lines
+    else:
+        tasks = [(filepath, start, end) for start, end in byte_ranges(filepath, workers)]
+        function = _scan_byte_range
+
+    if workers > 1:
+        columns = []
+        with multiprocessing.Pool(workers) as pool:
+            # Bounding the number of pending tasks, as the blocks of lines are read faster than they are processed
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(function, (task,)))
+                if len(pending) >= 2 * workers:
+                    columns.append(pending.popleft().get())
+            columns += [x.get() for x in pending]
+    else:
+        columns = [function(x) for x in tasks]
+
+    categories_tags = pd.Series([x for _, _, tags in columns for x in tags], dtype=object)
+
+    return pd.DataFrame({'id': [x for ids, _, _ in columns for x in ids],
+                         'percent': np.concatenate([np.empty(0)] + [percents for _, percents, _ in columns]),
+                         'categories_tags': categories_tags})
+
+
+def percentages_distribution(percentages):
+    """
+    Keeps the ingredients with enough defined percentages and sorts them by decreasing number of percentages.
+
+    Args:
+        percentages (pd.DataFrame): Defined percentages, as returned by :func:`read_percentages`.
+
+    Returns:
+        pd.DataFrame: Distribution of the defined percentages.
+    """
+    # Removing elements with less than the minimum number of values
+    counts = percentages.id.value_counts()
+    distribution = percentages[percentages.id.isin(counts[counts >= MIN_VALUE_NB].index)].copy()
+
+    # Sorting the dataframe by id
+    distribution.id = pd.Categorical(distribution.id, counts.index)
+    distribution.sort_values('id', inplace=True)
+
+    return distribution
+
+
+def write_binary_distribution(filepath, csv_filepath):
+    """
+    Writes the distribution in the binary bundle format, readable with
+    :func:`data.bundle.reference_distribution_dataframe`.
+
+    Args:
+        filepath (str): Path of the binary file.
+        csv_filepath (str): Path of the distribution CSV file.
+    """
+    distribution = pd.read_csv(csv_filepath, na_filter=None, encoding='utf-8')
+    arrays, strings, columns = _reference_distribution_arrays(distribution)
+    write_bundle(filepath, arrays, strings, metadata={'reference_distribution_columns': columns},
+                 sources=[csv_filepath])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute the distribution of the ingredients defined percentages.')
+    parser.add_argument('export', help='path of the OFF JSONL export (.jsonl or .jsonl.gz)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--output', default=INGREDIENTS_DISTRIBUTION_FILEPATH, help='path of the CSV file')
+    parser.add_argument('--binary', metavar='FILEPATH', help='also write the distribution in binary form')
+    args = parser.parse_args()
+
+    distribution = percentages_distribution(read_percentages(args.export, args.workers))
+
+    # Saving the dataframe
+    distribution.to_csv(args.output)
 
-# Removing elements with less than the minimum number of values
-counts = df.id.value_counts()
-df = df[df.id.isin(counts[counts >= MIN_VALUE_NB].index)]
+    if args.binary is not None:
+        write_binary_distribution(args.binary, args.output)
 
-# Sorting the dataframe by id
-df.id = pd.Categorical(df.id, counts.index)
-df.sort_values('id', inplace=True)
 
-# Saving the dataframe
-df.to_csv(INGREDIENTS_DISTRIBUTION_FILEPATH)
+if __name__ == '__main__':
+    main()
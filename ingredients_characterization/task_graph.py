@@ -0,0 +1,230 @@
+"""
+Small task graph runner used to run the independent stages of the characterization concurrently.
+
+Each task is a function without arguments returning a picklable output. The tasks run in worker processes as soon as
+the tasks they depend on are done, the tasks exchanging data through files. The output of each task is cached along
+with a key computed from the content of its source files and of its code, so that a task whose inputs did not change
+is not run again.
+
+The code of a task is the source file of the module of its function and of the modules of this repository it imports,
+directly or not. The cache is therefore not invalidated by a change of the installed libraries nor of the data read by
+the task without being declared in its sources: the version of the task must then be bumped, or the cache ignored.
+"""
+
+import ast
+import functools
+import hashlib
+import importlib.util
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from ingredients_characterization.incremental import file_hash
+
+# Root directory of the repository, whose modules are hashed along with the tasks
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def _module_filepath(module_name):
+    """ Path of the source file of a module of the repository, None if it is not a module of the repository. """
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if (spec is None) or (spec.origin is None) or not spec.origin.endswith('.py'):
+        return None
+
+    filepath = os.path.realpath(spec.origin)
+    if not filepath.startswith(REPOSITORY_DIR + os.sep) or ('site-packages' in filepath):
+        return None
+
+    return filepath
+
+
+def _imported_modules(filepath, module_name):
+    """ Names of the modules imported by a source file, including the modules the imported names may be. """
+    with open(filepath, 'rb') as file:
+        tree = ast.parse(file.read(), filepath)
+
+    package = module_name if os.path.basename(filepath) == '__init__.py' else module_name.rpartition('.')[0]
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [x.name for x in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                parent = package.rsplit('.', node.level - 1)[0] if node.level > 1 else package
+                base = f"{parent}.{base}" if base else parent
+            names.append(base)
+            names += [f"{base}.{x.name}" for x in node.names if x.name != '*']
+
+    return names
+
+
+def code_hash(function):
+    """
+    Content hash of the code run by a function: the source file of its module and of the modules of the repository
+    this module imports, directly or not.
+
+    Args:
+        function (callable): Module level function, possibly wrapped by :func:`functools.partial`.
+
+    Returns:
+        str: Hash of the code.
+    """
+    while isinstance(function, functools.partial):
+        function = function.func
+
+    module_name = function.__module__
+    if module_name == '__main__':
+        module_name = getattr(sys.modules['__main__'].__spec__, 'name', None) or module_name
+
+    filepaths = dict()
+    to_visit = [(module_name, getattr(sys.modules.get(function.__module__), '__file__', None))]
+    while to_visit:
+        name, filepath = to_visit.pop()
+        filepath = os.path.realpath(filepath) if filepath else _module_filepath(name)
+        if (filepath is None) or (filepath in filepaths.values()) or not filepath.startswith(REPOSITORY_DIR + os.sep):
+            continue
+        filepaths[name] = filepath
+        to_visit += [(x, None) for x in _imported_modules(filepath, name)]
+
+    key = hashlib.sha256()
+    for filepath in sorted(filepaths.values()):
+        key.update(os.path.relpath(filepath, REPOSITORY_DIR).encode('utf8'))
+        key.update(file_hash(filepath).encode('utf8'))
+
+    return key.hexdigest()
+
+
+class Task:
+    """
+    Attributes:
+        name (str): Name of the task.
+        function (callable): Module level function without arguments run by the task.
+        sources (list): Paths of the files read by the task.
+        products (list): Paths of the files written by the task.
+        dependencies (list): Names of the tasks that must be done before this one.
+        optional (bool): Whether the task is skipped if one of its source files is missing.
+        version (str): Version of the task, to bump to invalidate its cached output when something it depends on
+            changed without changing its sources nor its code (see the module docstring).
+    """
+
+    def __init__(self, name, function, sources=(), products=(), dependencies=(), optional=False, version=None):
+        self.name = name
+        self.function = function
+        self.sources = list(sources)
+        self.products = list(products)
+        self.dependencies = list(dependencies)
+        self.optional = optional
+        self.version = version
+
+    def key(self):
+        """ Cache key of the task, None if one of its source files is missing. """
+        key = hashlib.sha256(self.name.encode('utf8'))
+        key.update(str(self.version).encode('utf8'))
+        key.update(code_hash(self.function).encode('utf8'))
+        for source in self.sources:
+            source_hash = file_hash(source)
+            if source_hash is None:
+                return None
+            key.update(source_hash.encode('utf8'))
+
+        return key.hexdigest()
+
+
+def _run(function):
+    """ Runs a task function and measures its duration. """
+    start_time = time.time()
+    output = function()
+
+    return output, time.time() - start_time
+
+
+def _cache_filepath(cache_dir, task):
+    return os.path.join(cache_dir, f"{task.name}.pickle")
+
+
+def _cached_output(cache_dir, task, key):
+    """ Cached output of a task, as a 1-tuple, or None if there is no valid cache for this key. """
+    if (cache_dir is None) or (key is None) or not all(os.path.isfile(x) for x in task.products):
+        return None
+
+    try:
+        with open(_cache_filepath(cache_dir, task), 'rb') as file:
+            cache = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+    return (cache['output'],) if cache['key'] == key else None
+
+
+def _cache_output(cache_dir, task, key, output):
+    if (cache_dir is None) or (key is None):
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(_cache_filepath(cache_dir, task), 'wb') as file:
+        pickle.dump({'key': key, 'output': output}, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def run_task_graph(tasks, workers=None, cache_dir=None):
+    """
+    Runs a graph of tasks, the independent ones concurrently.
+
+    The tasks must be given in an order compatible with their dependencies.
+
+    Args:
+        tasks (list): Tasks to run.
+        workers (int): Maximum number of worker processes. Defaults to the number of tasks.
+        cache_dir (str): Directory of the cached outputs of the tasks. The outputs are not cached if None.
+
+    Returns:
+        tuple: Output of each task (None for the skipped ones) and report of each task, with its status ('run',
+            'cached' or 'skipped') and its wall time in seconds.
+    """
+    outputs = dict()
+    report = dict()
+    remaining = list(tasks)
+    running = dict()
+
+    with ProcessPoolExecutor(workers or max(len(tasks), 1)) as executor:
+        while remaining or running:
+            # Starting the tasks whose dependencies are done
+            for task in list(remaining):
+                if any(x not in report for x in task.dependencies):
+                    continue
+                remaining.remove(task)
+
+                # The key is computed once the dependencies are done, as they may write the source files
+                key = task.key()
+                if (key is None) and task.optional:
+                    outputs[task.name] = None
+                    report[task.name] = {'status': 'skipped', 'duration': 0}
+                    continue
+
+                cached = _cached_output(cache_dir, task, key)
+                if cached is not None:
+                    outputs[task.name] = cached[0]
+                    report[task.name] = {'status': 'cached', 'duration': 0}
+                    continue
+
+                running[executor.submit(_run, task.function)] = (task, key)
+
+            if not running:
+                if remaining:
+                    raise ValueError(f"Unknown dependencies of the tasks {[x.name for x in remaining]}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task, key = running.pop(future)
+                output, duration = future.result()
+                _cache_output(cache_dir, task, key, output)
+                outputs[task.name] = output
+                report[task.name] = {'status': 'run', 'duration': duration}
+
+    return outputs, report
@@ -6,6 +6,8 @@ import os
 EXTERNAL_DATA_DIR = os.path.join(os.path.dirname(__file__), 'external_data')
 FCEN_DATA_DIR = os.path.join(EXTERNAL_DATA_DIR, 'fcen')
 FCEN_DATA_FILEPATH = os.path.join(FCEN_DATA_DIR, 'fcen_data.json')
+# Number of rows of the FCEN nutrient amounts file read at once
+FCEN_NUTRIENT_AMOUNTS_CHUNK_SIZE = 500000
 CIQUAL_DATA_DIR = os.path.join(EXTERNAL_DATA_DIR, 'ciqual')
 CIQUAL_DATA_FILEPATH = os.path.join(CIQUAL_DATA_DIR, 'ciqual_data.json')
 AGRIBALYSE_DATA_DIR = os.path.join(EXTERNAL_DATA_DIR, 'agribalyse')
@@ -20,6 +22,11 @@ CIQUAL_OFF_LINKING_TABLE_FILEPATH = os.path.join(LINKING_TABLES_DIR, 'ciqual_off
 AGRIBALYSE_OFF_LINKING_TABLE_FILEPATH = os.path.join(LINKING_TABLES_DIR, 'agribalyse_off_links.csv')
 OFF_DUPLICATES_FILEPATH = os.path.join(LINKING_TABLES_DIR, 'off-duplicates.csv')
 
+# Content hashes of the inputs the ingredients data was computed from, used by the incremental characterization
+CHARACTERIZATION_MANIFEST_FILEPATH = os.path.join(os.path.dirname(__file__), 'characterization_manifest.json')
+# Cached outputs of the characterization stages
+CHARACTERIZATION_CACHE_DIR = os.path.join(os.path.dirname(__file__), '.cache')
+
 # Conversion from FCEN nutritional data identifiers to off
 FCEN_NUTRIMENTS_TO_OFF = {255: 'water',
                           208: 'energy-kcal',
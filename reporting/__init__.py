@@ -1 +1,2 @@
-from reporting.reporting import ProductImpactReport
+from reporting.reporting import ProductImpactReport, compact_impact_result
+from reporting.batch import generate_reports
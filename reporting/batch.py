@@ -0,0 +1,122 @@
+"""
+Generation of the impact reports of batches of Open Food Facts products.
+
+Usage:
+    python -m reporting.batch barcodes.txt reports/ --workers 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+from reporting.reporting import ProductImpactReport, report_environment, report_stylesheet
+
+
+def _init_worker():
+    """ Loads the resources shared by all the reports of a worker process. """
+    report_environment.load()
+    report_stylesheet.load()
+
+
+def report_filepath(out_dir, product):
+    """ Path of the report of a product, named after its barcode. """
+    return os.path.join(out_dir, f"{product.get('_id') or product.get('code')}.html")
+
+
+def _generate_report(args):
+    """
+    Estimates the impacts of a product and writes its report, returning the path of the report or the exception
+    raised, and the generation time.
+    """
+    index, product_or_barcode, impact_result, out_dir, kwargs = args
+    start_time = time.time()
+    try:
+        if isinstance(product_or_barcode, dict):
+            report = ProductImpactReport(product=product_or_barcode, impact_result=impact_result, **kwargs)
+        else:
+            report = ProductImpactReport(barcode=product_or_barcode, impact_result=impact_result, **kwargs)
+
+        result = report_filepath(out_dir, report.product)
+        report.to_html(result)
+    except Exception as e:
+        result = e
+
+    return index, result, time.time() - start_time
+
+
+def generate_reports(products_or_barcodes, out_dir, workers=1, impact_results=None, **kwargs):
+    """
+    Generates the HTML impact reports of several products.
+
+    The impacts estimation and the rendering of the figures of each report run in a pool of worker processes, each of
+    them loading the template and the stylesheets of the reports once.
+
+    Args:
+        products_or_barcodes (iterable): Open Food Facts products or barcodes of the products, which are then got with
+            :func:`utils.get_product_from_barcode`.
+        out_dir (str): Directory the reports are written to, named after the barcodes of the products.
+        workers (int): Number of processes used to generate the reports.
+        impact_results (list): Precomputed impact estimation results of the products, or their compact forms (see
+            :func:`~reporting.reporting.compact_impact_result`), one per product. The impacts of the products whose
+            result is None are estimated.
+        **kwargs: Other parameters passed to :class:`~reporting.reporting.ProductImpactReport`.
+
+    Returns:
+        dict: Dictionary containing the results (one per product, in the same order as the products, either the path
+        of the report or the exception raised during its generation), the number of reports generated, the number of
+        errors, the total duration in seconds and the throughput in reports per minute.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    products_or_barcodes = list(products_or_barcodes)
+    impact_results = impact_results or [None] * len(products_or_barcodes)
+    if len(impact_results) != len(products_or_barcodes):
+        raise ValueError("There must be as many impact results as products.")
+
+    tasks = [(index, x, impact_result, out_dir, kwargs)
+             for index, (x, impact_result) in enumerate(zip(products_or_barcodes, impact_results))]
+    results = [None] * len(tasks)
+
+    start_time = time.time()
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            reports = list(pool.imap_unordered(_generate_report, tasks, chunksize=1))
+    else:
+        reports = [_generate_report(x) for x in tasks]
+    duration = time.time() - start_time
+
+    for index, result, _ in reports:
+        results[index] = result
+
+    number_of_errors = sum(isinstance(x, Exception) for x in results)
+    number_of_reports = len(results) - number_of_errors
+
+    return {'results': results,
+            'number_of_reports': number_of_reports,
+            'number_of_errors': number_of_errors,
+            'duration': duration,
+            'reports_per_minute': 60 * number_of_reports / duration if duration > 0 else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the impact reports of Open Food Facts products.')
+    parser.add_argument('barcodes', help='text file containing one barcode per line')
+    parser.add_argument('out_dir', help='directory the reports are written to')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--product-mass', type=float, default=1000, help='mass of product considered in grams')
+    args = parser.parse_args()
+
+    with open(args.barcodes, 'r', encoding='utf8') as file:
+        barcodes = [x.strip() for x in file if x.strip()]
+
+    batch_result = generate_reports(barcodes, args.out_dir, workers=args.workers, product_mass=args.product_mass)
+
+    for barcode, result in zip(barcodes, batch_result['results']):
+        if isinstance(result, Exception):
+            print(f"{barcode}: {type(result).__name__}: {result}")
+    print(f"{batch_result['number_of_reports']} reports generated, {batch_result['number_of_errors']} errors, "
+          f"in {batch_result['duration']:.1f}s ({batch_result['reports_per_minute'] or 0:.1f} reports per minute)")
+
+
+if __name__ == '__main__':
+    main()
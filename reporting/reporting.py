@@ -1,28 +1,55 @@
 import os
-import json
 import io
 
 from jinja2 import Environment, FileSystemLoader
-import matplotlib.pyplot as plt
-import pylab
-import seaborn as sns
 
 from impacts_estimation.impacts_estimation import estimate_impacts
 from impacts_estimation.vars import AGRIBALYSE_IMPACT_CATEGORIES_FR
 from impacts_estimation.utils import flat_ingredients_list_DFS, agribalyse_impact_name_i18n
 from utils import get_product_from_barcode, ensure_extension, smart_round_format
-from ingredients_characterization.vars import AGRIBALYSE_DATA_FILEPATH
-from data import ingredients_data, off_categories, off_taxonomy
+from ingredients_characterization.impact.agribalyse_store import load_agribalyse_store
+from data import LazyData, ingredients_data, off_categories, off_taxonomy
+from reporting import svg_charts
+from settings import REPORT_FIGURES_BACKEND
 
-with open(AGRIBALYSE_DATA_FILEPATH, 'r', encoding='utf8') as file:
-    agribalyse_data = {x['ciqual_AGB']: x for x in json.load(file)}
+STATIC_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'static')
+
+
+def _load_environment():
+    environment = Environment(loader=FileSystemLoader(STATIC_DIR))
+    environment.filters['smart_round_format'] = smart_round_format
+
+    return environment
+
+
+def _load_stylesheet():
+    stylesheet = ''
+    for filename in ['pure-min.css', 'style.css']:
+        with open(os.path.join(STATIC_DIR, filename), encoding='utf8') as file:
+            stylesheet += file.read()
+
+    return stylesheet
+
+
+agribalyse_store = LazyData(load_agribalyse_store)
+
+# Items of the impact estimation result used by the reports, the other ones (distributions, recipes...) are optional
+REPORT_RESULT_ITEMS = ['impacts_quantiles', 'impacts_units', 'ingredients_impacts_share', 'ingredients_mass_share',
+                       'average_total_used_mass', 'warnings', 'reliability', 'data_sources']
+
+# Quantiles of the impacts displayed by the reports
+REPORT_QUANTILES = ['0.05', '0.25', '0.5', '0.75', '0.95']
+
+# Jinja environment and stylesheet of the reports, loaded once per process
+report_environment = LazyData(_load_environment)
+report_stylesheet = LazyData(_load_stylesheet)
 
 
 class ProductImpactReport:
     """ Class used to generate reports for Open Food Facts products impacts. """
 
     def __init__(self, barcode=None, product=None, impact_categories=None, main_impact_category=None,
-                 product_mass=1000, language='french'):
+                 product_mass=1000, language='french', impact_result=None, figures_backend=None):
         """
         Args:
             barcode (str): Barcode of the Open Food Facts product (use only if product is None).
@@ -33,12 +60,18 @@ class ProductImpactReport:
             main_impact_category (str): Main impact category to display. First element of impact_categories by default
             product_mass (float): Mass of product considered in grams
             language (str): Language of the report
+            impact_result (dict): Result of :func:`~impacts_estimation.impacts_estimation.estimate_impacts` for this
+                product, its impact categories and its mass, or its compact form given by
+                :func:`compact_impact_result`. The impacts are estimated if None.
+            figures_backend (str): Library used to draw the figures, 'svg' (see :mod:`reporting.svg_charts`) or
+                'matplotlib'. Defaults to REPORT_FIGURES_BACKEND.
         """
         self.impact_categories = impact_categories or AGRIBALYSE_IMPACT_CATEGORIES_FR
         self.main_impact_category = main_impact_category or self.impact_categories[0]
         self.product_mass = product_mass
         self.language = language.lower()
         self.language_short = language[:2]
+        self.figures_backend = figures_backend or REPORT_FIGURES_BACKEND
 
         assert self.main_impact_category in self.impact_categories
         assert all(agribalyse_impact_name_i18n(x) in AGRIBALYSE_IMPACT_CATEGORIES_FR for x in self.impact_categories)
@@ -71,40 +104,42 @@ class ProductImpactReport:
         self.has_agribalyse_proxy = self.agribalyse_proxy_code is not None
 
         if self.has_agribalyse_proxy:
-            self.agribalyse_proxy_data = agribalyse_data[self.agribalyse_proxy_code]
+            self.agribalyse_proxy_row = agribalyse_store.row_by_ciqual_code(self.agribalyse_proxy_code)
+            self.agribalyse_proxy_data = agribalyse_store.entry(self.agribalyse_proxy_row)
 
             # Getting impact of non agricultural phases
             self.impact_base = {impact_category:
-                                    sum([value for step, value in
-                                         self.agribalyse_proxy_data
-                                         ['impact_environnemental'][agribalyse_impact_name_i18n(impact_category)]
-                                         ['etapes'].items()
-                                         if step != 'Agriculture']) * product_mass / 1000
+                                    agribalyse_store.non_agricultural_impact(
+                                        self.agribalyse_proxy_row,
+                                        agribalyse_impact_name_i18n(impact_category)) * product_mass / 1000
                                 for impact_category in self.impact_categories}
 
             # Getting total reference impacts
             self.agribalyse_proxy_impacts = \
-                {impact_category: self.agribalyse_proxy_data['impact_environnemental'][
-                                      agribalyse_impact_name_i18n(impact_category)]['synthese']
+                {impact_category: agribalyse_store.total_impact(self.agribalyse_proxy_row,
+                                                                agribalyse_impact_name_i18n(impact_category))
                                   * product_mass / 1000
                  for impact_category in self.impact_categories}
 
         else:
+            self.agribalyse_proxy_row = None
             self.agribalyse_proxy_data = None
             self.impact_base = {impact_category: 0
                                 for impact_category in self.impact_categories}
             self.agribalyse_proxy_impacts = None
 
-        self._compute_impact()
+        if impact_result is None:
+            self._compute_impact()
+        else:
+            self._check_impact_result(impact_result)
+            self.impact_result = impact_result
 
         self.ingredients = list(self.impact_result['ingredients_impacts_share'][self.main_impact_category])
         self.ingredients_without_impact = [x for x in self.ingredients
                                            if (x not in ingredients_data)
                                            or ('impacts' not in ingredients_data[x])]
 
-        self.env = Environment(loader=FileSystemLoader(
-            os.path.join(os.path.dirname(os.path.realpath(__file__)), 'static')))
-        self.env.filters['smart_round_format'] = smart_round_format
+        self.env = report_environment.load()
         self.template = self.env.get_template('product_impact_report_template.html')
 
     def _compute_impact(self):
@@ -114,22 +149,91 @@ class ProductImpactReport:
                                               distributions_as_result=True,
                                               safe_mode=True)
 
+    def _check_impact_result(self, impact_result):
+        """ Checks that a precomputed impact estimation result contains everything needed by the report. """
+        missing_items = [x for x in REPORT_RESULT_ITEMS if x not in impact_result]
+        if missing_items:
+            raise ValueError(f"The impact result misses the items {missing_items}.")
+
+        if ('product_quantity' in impact_result) and (impact_result['product_quantity'] != self.product_mass):
+            raise ValueError(f"The impact result has been computed for {impact_result['product_quantity']}g of "
+                             f"product instead of {self.product_mass}g.")
+
+        missing_categories = [x for x in self.impact_categories if x not in impact_result['impacts_units']]
+        if missing_categories:
+            raise ValueError(f"The impact result misses the impact categories {missing_categories}.")
+
+        if any(x not in impact_result['impacts_quantiles'].get(self.main_impact_category, dict())
+               for x in REPORT_QUANTILES):
+            raise ValueError(f"The impact result misses the quantiles {REPORT_QUANTILES} of the main impact category "
+                             f"{self.main_impact_category}.")
+
+        if self.main_impact_category not in impact_result['ingredients_impacts_share']:
+            raise ValueError(f"The impact result misses the ingredients impacts shares of the main impact category "
+                             f"{self.main_impact_category}.")
+
+        impacts_share_ingredients = set(impact_result['ingredients_impacts_share'][self.main_impact_category])
+        if set(impact_result['ingredients_mass_share']) != impacts_share_ingredients:
+            raise ValueError("The ingredients of the mass shares and of the impacts shares of the impact result "
+                             "differ.")
+
+    def main_impact_quantiles(self):
+        """ Quantiles of the main impact of the product, as displayed by the box plot of the main impact. """
+        impact_base = self.impact_base[self.main_impact_category]
+        quantiles = self.impact_result['impacts_quantiles'][self.main_impact_category]
+
+        return {'whislo': impact_base + quantiles['0.05'],
+                'q1': impact_base + quantiles['0.25'],
+                'med': impact_base + quantiles['0.5'],
+                'q3': impact_base + quantiles['0.75'],
+                'whishi': impact_base + quantiles['0.95']}
+
+    def impact_per_step_shares(self):
+        """
+            Impacts shares related to each production step, from the first step to the last one.
+            Only possible if the product is linked to an Agribalyse reference
+        """
+        if not self.has_agribalyse_proxy:
+            raise Exception("The product has no agribalyse proxy."
+                            "No information about productions steps are available.")
+
+        agricultural_impact_value = self.impact_result['impacts_quantiles'][self.main_impact_category]['0.5']
+        steps = agribalyse_store.step_impacts(self.agribalyse_proxy_row,
+                                              agribalyse_impact_name_i18n(self.main_impact_category))
+        total = agricultural_impact_value + \
+                sum([v * self.product_mass / 1000 for k, v in steps.items() if k != 'Agriculture'])
+
+        result = []
+        for step, value in steps.items():
+            if step == 'Agriculture':
+                value = agricultural_impact_value
+            else:
+                value = value * self.product_mass / 1000
+            result.append((step, value / total, None))
+
+        return result
+
+    def impact_per_ingredient_shares(self):
+        """ Impacts shares related to each ingredient, in the order of the ingredients list. """
+        impact_shares = self.impact_result['ingredients_impacts_share'][self.main_impact_category]
+
+        return [(ingredient,
+                 impact_shares[ingredient],
+                 'darkred' if ingredient in self.ingredients_without_impact else None)
+                for ingredient in self.recipe_ingredients_in_list_order()]
+
+    def mass_per_ingredient_shares(self):
+        """ Mass shares related to each ingredient, in the order of the ingredients list. """
+        return [(ingredient, self.impact_result['ingredients_mass_share'][ingredient], None)
+                for ingredient in self.recipe_ingredients_in_list_order()]
+
     def main_impact_plot(self):
         """ Boxplot of the main impact """
+        import matplotlib.pyplot as plt
 
         fig, ax = plt.subplots(figsize=(6, 1.5))
 
-        impact_base = self.impact_base[self.main_impact_category]
-        boxes = [
-            {
-                'label': '',
-                'whislo': impact_base + self.impact_result['impacts_quantiles'][self.main_impact_category]['0.05'],
-                'q1': impact_base + self.impact_result['impacts_quantiles'][self.main_impact_category]['0.25'],
-                'med': impact_base + self.impact_result['impacts_quantiles'][self.main_impact_category]['0.5'],
-                'q3': impact_base + self.impact_result['impacts_quantiles'][self.main_impact_category]['0.75'],
-                'whishi': impact_base + self.impact_result['impacts_quantiles'][self.main_impact_category]['0.95'],
-            }
-        ]
+        boxes = [{'label': '', **self.main_impact_quantiles()}]
         ax.bxp(boxes,
                vert=False,
                showfliers=False,
@@ -150,40 +254,27 @@ class ProductImpactReport:
 
         return fig
 
-    def impact_per_step_plot(self):
-        """
-            Stacked bar showing the impacts shares related to each production step.
-            Only possible if the product is linked to an Agribalyse reference
-        """
-        if not self.has_agribalyse_proxy:
-            raise Exception("The product has no agribalyse proxy."
-                            "No information about productions steps are available.")
+    @staticmethod
+    def _shares_plot(shares):
+        """ Stacked bar showing shares, the first one at the top. """
+        import matplotlib.pyplot as plt
 
         # Creating the figure for the graphic
-        fig = pylab.figure()
+        fig = plt.figure()
         ax = fig.add_subplot(111)
 
         rank = 0.5
-        agricultural_impact_value = self.impact_result['impacts_quantiles'][self.main_impact_category]['0.5']
-        steps = self.agribalyse_proxy_data \
-            ['impact_environnemental'][agribalyse_impact_name_i18n(self.main_impact_category)]['etapes']
-        total = agricultural_impact_value + \
-                sum([v * self.product_mass / 1000 for k, v in steps.items() if k != 'Agriculture'])
-        for step, value in reversed(list(steps.items())):
-            if step == 'Agriculture':
-                value = agricultural_impact_value
-            else:
-                value = value * self.product_mass / 1000
-
+        for name, value, text_color in reversed(shares):
             ax.barh(y=rank,
-                    width=value / total,
+                    width=value,
                     height=0.3,
                     left=0,
-                    label=step,
+                    label=name,
                     color='#008040')
             ax.text(x=0.01,
                     y=rank + 0.25,
-                    s=f"{step}: {value / total:.1%}")
+                    s=f"{name}: {value:.1%}",
+                    color=text_color)
             rank += 1
 
         xticks = [0, 0.25, 0.50, 0.75, 1]
@@ -196,82 +287,24 @@ class ProductImpactReport:
 
         return fig
 
+    def impact_per_step_plot(self):
+        """
+            Stacked bar showing the impacts shares related to each production step.
+            Only possible if the product is linked to an Agribalyse reference
+        """
+        return self._shares_plot(self.impact_per_step_shares())
+
     def impact_per_ingredient_plot(self):
         """
             Stacked bar showing the impacts shares related to each ingredient.
         """
-
-        # Creating the figure for the graphic
-        fig = pylab.figure()
-        ax = fig.add_subplot(111)
-
-        rank = 0.5
-        impact_shares = {k: v for k, v
-                         in self.impact_result['ingredients_impacts_share'][self.main_impact_category].items()}
-
-        for ingredient in reversed(self.recipe_ingredients_in_list_order()):
-            value = impact_shares[ingredient]
-            ax.barh(y=rank,
-                    width=value,
-                    height=0.3,
-                    left=0,
-                    label=ingredient,
-                    color='#008040')
-
-            if ingredient in self.ingredients_without_impact:
-                text_color = 'darkred'
-            else:
-                text_color = 'black'
-
-            ax.text(x=0.01,
-                    y=rank + 0.25,
-                    s=f"{ingredient}: {value:.1%}",
-                    color=text_color)
-            rank += 1
-
-        xticks = [0, 0.25, 0.50, 0.75, 1]
-        ax.set_xticks(xticks)
-        ax.set_xticklabels([f"{int(x * 100)}%" for x in xticks])
-        ax.set_yticks([])
-        ax.set_ylim(0, rank)
-        ax.set_xlim(0, 1)
-        fig.tight_layout()
-
-        return fig
+        return self._shares_plot(self.impact_per_ingredient_shares())
 
     def mass_per_ingredient_plot(self):
         """
             Stacked bar showing the mass shares related to each ingredient.
         """
-
-        # Creating the figure for the graphic
-        fig = pylab.figure()
-        ax = fig.add_subplot(111)
-
-        rank = 0.5
-        for ingredient in reversed(self.recipe_ingredients_in_list_order()):
-            value = self.impact_result['ingredients_mass_share'][ingredient]
-            ax.barh(y=rank,
-                    width=value,
-                    height=0.3,
-                    left=0,
-                    label=ingredient,
-                    color='#008040')
-
-            ax.text(x=0.01,
-                    y=rank + 0.25,
-                    s=f"{ingredient}: {value:.1%}")
-            rank += 1
-
-        xticks = [0, 0.25, 0.50, 0.75, 1]
-        ax.set_xticks(xticks)
-        ax.set_xticklabels([f"{int(x * 100)}%" for x in xticks])
-        ax.set_yticks([])
-        ax.set_ylim(0, rank)
-        ax.set_xlim(0, 1)
-        fig.tight_layout()
-
-        return fig
+        return self._shares_plot(self.mass_per_ingredient_shares())
 
     def impacts_data(self):
 
@@ -380,14 +413,31 @@ class ProductImpactReport:
         return result
 
     def _generate_figure(self, plotting_function, figure_name):
+        import matplotlib.pyplot as plt
+
         fig = plotting_function()
 
         string_io = io.BytesIO()
         fig.savefig(string_io, format='svg')
         self.images[figure_name] = string_io.getvalue().decode("utf-8").replace('\n', '')
 
+        # Closing the figure, otherwise pyplot keeps it and the memory grows with each report
+        plt.close(fig)
+
     def _generate_figures(self):
-        """ Generating the figures png files """
+        """ Generating the figures svg strings """
+
+        if self.figures_backend == 'svg':
+            reference = self.agribalyse_proxy_impacts[self.main_impact_category] if self.has_agribalyse_proxy \
+                else None
+            self.images['main_impact_plot'] = svg_charts.box_plot(self.main_impact_quantiles(), reference)
+            if self.has_agribalyse_proxy:
+                self.images['impact_per_step_plot'] = svg_charts.shares_bars(self.impact_per_step_shares())
+            self.images['impact_per_ingredient_plot'] = svg_charts.shares_bars(self.impact_per_ingredient_shares())
+            self.images['mass_per_ingredient_plot'] = svg_charts.shares_bars(self.mass_per_ingredient_shares())
+            return
+
+        import seaborn as sns
 
         sns.set()
 
@@ -410,13 +460,6 @@ class ProductImpactReport:
 
     def _generate_html(self):
         """ Generate the html version of the report """
-        with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'static', 'pure-min.css'),
-                  encoding='utf8') as file:
-            stylesheet = file.read()
-        with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'static', 'style.css'),
-                  encoding='utf8') as file:
-            stylesheet += file.read()
-
         template_vars = {"product_name": self.product.get('product_name', ''),
                          "barcode": self.product['_id'],
                          "main_impact_category": self.main_impact_category,
@@ -433,7 +476,7 @@ class ProductImpactReport:
                          "result_warnings": self.impact_result['warnings'],
                          "reliability": str(self.impact_result['reliability']),
                          "off_ingredients": self.off_ingredients(),
-                         "stylesheet": stylesheet}
+                         "stylesheet": report_stylesheet.load()}
 
         self._html_output = self.template.render(template_vars)
 
@@ -447,3 +490,22 @@ class ProductImpactReport:
         self._generate_html()
         with open(filename, 'w', encoding='utf8') as file:
             file.write(self._html_output)
+
+
+def compact_impact_result(impact_result):
+    """
+    Compact form of an impact estimation result, containing only the quantiles, shares and other items needed to
+    render a report. It can be stored as JSON and given to :class:`ProductImpactReport` to render the report again
+    without estimating the impacts.
+
+    Args:
+        impact_result (dict): Result of :func:`~impacts_estimation.impacts_estimation.estimate_impacts`.
+
+    Returns:
+        dict: Compact form of the result.
+    """
+    result = {x: impact_result[x] for x in REPORT_RESULT_ITEMS}
+    if 'product_quantity' in impact_result:
+        result['product_quantity'] = impact_result['product_quantity']
+
+    return result
@@ -0,0 +1,172 @@
+"""
+Lightweight SVG rendering of the charts of the impact reports.
+
+The charts are written directly as SVG strings from the values to display, without any plotting library, which makes
+their rendering much faster than with matplotlib. Their style follows the default seaborn style used by the matplotlib
+rendering of the reports.
+"""
+
+import math
+from xml.sax.saxutils import escape
+
+# Colors of the charts
+BACKGROUND_COLOR = '#EAEAF2'
+GRID_COLOR = '#FFFFFF'
+BAR_COLOR = '#008040'
+BOX_COLOR = '#555555'
+WHISKER_COLOR = '#777777'
+MEDIAN_COLOR = '#E8712A'
+REFERENCE_COLOR = 'darkgreen'
+TEXT_COLOR = '#262626'
+
+# Font of the charts texts
+FONT = 'font-family="DejaVu Sans, Arial, sans-serif"'
+
+# Dimensions of the charts in pixels
+CHART_WIDTH = 640
+BOX_PLOT_HEIGHT = 150
+BAR_ROW_HEIGHT = 48
+MARGIN = 20
+AXIS_HEIGHT = 30
+
+# Ticks of the shares axis
+SHARES_TICKS = [0, 0.25, 0.5, 0.75, 1]
+
+
+def _n(number):
+    """ Compact representation of a coordinate. """
+    return f"{number:.1f}".rstrip('0').rstrip('.')
+
+
+def _svg(width, height, elements):
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{_n(width)}pt" height="{_n(height)}pt" '
+            f'viewBox="0 0 {_n(width)} {_n(height)}">{"".join(elements)}</svg>')
+
+
+def _text(x, y, text, color=TEXT_COLOR, anchor='start', size=12):
+    return (f'<text x="{_n(x)}" y="{_n(y)}" fill="{color}" font-size="{size}" text-anchor="{anchor}" {FONT}>'
+            f'{escape(text)}</text>')
+
+
+def _line(x1, y1, x2, y2, color, width=2, dash=None):
+    dash = f' stroke-dasharray="{dash}"' if dash else ''
+    return (f'<line x1="{_n(x1)}" y1="{_n(y1)}" x2="{_n(x2)}" y2="{_n(y2)}" stroke="{color}" '
+            f'stroke-width="{width}"{dash}/>')
+
+
+def _rect(x, y, width, height, fill, stroke=None, stroke_width=2):
+    stroke = f' stroke="{stroke}" stroke-width="{stroke_width}"' if stroke else ''
+    return f'<rect x="{_n(x)}" y="{_n(y)}" width="{_n(width)}" height="{_n(height)}" fill="{fill}"{stroke}/>'
+
+
+def axis_ticks(upper, max_ticks=6):
+    """
+    Round ticks of an axis starting at 0.
+
+    Args:
+        upper (float): Maximum value to display.
+        max_ticks (int): Maximum number of ticks.
+
+    Returns:
+        list: Ticks, the last one being greater than or equal to the maximum value.
+
+    Examples:
+        >>> axis_ticks(4.6)
+        [0, 1.0, 2.0, 3.0, 4.0, 5.0]
+        >>> axis_ticks(0.18)
+        [0, 0.05, 0.1, 0.15, 0.2]
+    """
+    if upper <= 0:
+        return [0, 1]
+
+    magnitude = 10 ** math.floor(math.log10(upper / (max_ticks - 1)))
+    for factor in [1, 2, 2.5, 5, 10]:
+        step = factor * magnitude
+        if math.ceil(upper / step - 1e-9) <= max_ticks - 1:
+            break
+
+    ticks_number = math.ceil(upper / step - 1e-9)
+
+    return [round(i * step, 12) if i else 0 for i in range(ticks_number + 1)]
+
+
+def _tick_label(tick):
+    return f"{tick:g}"
+
+
+def box_plot(quantiles, reference=None):
+    """
+    Horizontal box plot of a distribution, with an optional reference value.
+
+    Args:
+        quantiles (dict): Values of the whiskers ('whislo' and 'whishi'), of the quartiles ('q1' and 'q3') and of the
+            median ('med').
+        reference (float): Reference value, displayed as a dashed vertical line.
+
+    Returns:
+        str: SVG chart.
+    """
+    ticks = axis_ticks(max(quantiles['whishi'], reference or 0))
+    plot_left, plot_right = MARGIN, CHART_WIDTH - MARGIN
+    plot_top, plot_bottom = MARGIN / 2, BOX_PLOT_HEIGHT - AXIS_HEIGHT
+
+    def x(value):
+        return plot_left + (plot_right - plot_left) * value / ticks[-1]
+
+    center = (plot_top + plot_bottom) / 2
+    box_height = (plot_bottom - plot_top) / 2
+    elements = [_rect(plot_left, plot_top, plot_right - plot_left, plot_bottom - plot_top, BACKGROUND_COLOR)]
+    for tick in ticks:
+        elements.append(_line(x(tick), plot_top, x(tick), plot_bottom, GRID_COLOR, width=1))
+        elements.append(_text(x(tick), BOX_PLOT_HEIGHT - AXIS_HEIGHT / 3, _tick_label(tick), anchor='middle'))
+
+    # Whiskers and caps
+    elements.append(_line(x(quantiles['whislo']), center, x(quantiles['q1']), center, WHISKER_COLOR))
+    elements.append(_line(x(quantiles['q3']), center, x(quantiles['whishi']), center, WHISKER_COLOR))
+    for value in (quantiles['whislo'], quantiles['whishi']):
+        elements.append(_line(x(value), center - box_height / 4, x(value), center + box_height / 4, WHISKER_COLOR))
+
+    # Box and median
+    elements.append(_rect(x(quantiles['q1']), center - box_height / 2, x(quantiles['q3']) - x(quantiles['q1']),
+                          box_height, 'none', stroke=BOX_COLOR))
+    elements.append(_line(x(quantiles['med']), center - box_height / 2, x(quantiles['med']), center + box_height / 2,
+                          MEDIAN_COLOR))
+
+    if reference is not None:
+        elements.append(_line(x(reference), plot_top, x(reference), plot_bottom, REFERENCE_COLOR, width=1.5,
+                              dash='5.5,2.4'))
+
+    return _svg(CHART_WIDTH, BOX_PLOT_HEIGHT, elements)
+
+
+def shares_bars(shares):
+    """
+    Horizontal bars of shares, each labelled with its name and its percentage.
+
+    Args:
+        shares (list): Name, share (between 0 and 1) and label color (None for the default color) of each bar, from
+            top to bottom.
+
+    Returns:
+        str: SVG chart.
+    """
+    height = MARGIN / 2 + BAR_ROW_HEIGHT * len(shares) + AXIS_HEIGHT
+    plot_left, plot_right = MARGIN, CHART_WIDTH - MARGIN
+    plot_top, plot_bottom = MARGIN / 2, height - AXIS_HEIGHT
+
+    def x(value):
+        return plot_left + (plot_right - plot_left) * value
+
+    elements = [_rect(plot_left, plot_top, plot_right - plot_left, plot_bottom - plot_top, BACKGROUND_COLOR)]
+    for tick in SHARES_TICKS:
+        elements.append(_line(x(tick), plot_top, x(tick), plot_bottom, GRID_COLOR, width=1))
+        elements.append(_text(x(tick), height - AXIS_HEIGHT / 3, f"{int(tick * 100)}%", anchor='middle'))
+
+    for rank, (name, share, color) in enumerate(shares):
+        row_top = plot_top + rank * BAR_ROW_HEIGHT
+        elements.append(_text(x(0.01), row_top + BAR_ROW_HEIGHT * 0.3, f"{name}: {share:.1%}",
+                              color=color or TEXT_COLOR))
+        elements.append(_rect(plot_left, row_top + BAR_ROW_HEIGHT * 0.45, max(x(share) - plot_left, 0),
+                              BAR_ROW_HEIGHT * 0.3, BAR_COLOR))
+
+    return _svg(CHART_WIDTH, height, elements)
@@ -1,5 +1,7 @@
 """ Settings used by the impact estimation program. """
 
+import os
+
 # Proportion from which the ingredients don't have to be ordered by decreasing proportion in the ingredient list
 DECREASING_PROPORTION_ORDER_LIMIT = 0.02  # From EU regulations
 
@@ -34,3 +36,47 @@ TOTAL_MASS_DISTRIBUTION_STEP = 1
 # Only used to ensure compatibility with old OFF database format for calculation on old database dumps.
 # OFF_INGREDIENTS_FORMAT = 'Flat with rank'
 OFF_INGREDIENTS_FORMAT = 'Ingredient tree'
+
+# Address and port on which the impact estimation server listens
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8000
+
+# Number of worker processes of the impact estimation server
+SERVER_WORKERS = 4
+
+# Maximum number of estimations waiting for a worker before the impact estimation server rejects new requests
+SERVER_MAX_QUEUE_SIZE = 32
+
+# Default deadline of the impact estimation server requests in seconds
+SERVER_REQUEST_TIMEOUT = 120
+
+# Path of an uncompressed Open Food Facts JSONL dump the products are read from instead of the Open Food Facts API
+#  (see data.off_dump). None to always use the API.
+OFF_DUMP_FILEPATH = None
+
+# Whether the products missing from the local dump are fetched from the Open Food Facts API
+OFF_API_FALLBACK = False
+
+# URL of the Open Food Facts API products endpoint
+OFF_API_PRODUCT_URL = 'https://world.openfoodfacts.org/api/v2/product/{barcode}.json'
+
+# Timeout of the Open Food Facts API requests in seconds
+OFF_API_TIMEOUT = 10
+
+# Number of retries of the Open Food Facts API requests failed because of a network or server error
+OFF_API_RETRIES = 3
+
+# Delay before retrying a failed Open Food Facts API request in seconds, doubled at each retry
+OFF_API_BACKOFF = 0.5
+
+# Maximum number of concurrent Open Food Facts API requests
+OFF_API_MAX_CONCURRENCY = 8
+
+# Directory of the cached Open Food Facts API responses
+OFF_API_CACHE_DIR = os.path.join(os.path.dirname(__file__), '.off_api_cache')
+
+# Time to live of the cached Open Food Facts API responses in seconds
+OFF_API_CACHE_TTL = 24 * 3600
+
+# Library used to draw the figures of the reports: 'svg' (lightweight built-in renderer) or 'matplotlib'
+REPORT_FIGURES_BACKEND = 'svg'
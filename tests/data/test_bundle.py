@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import data
+from data import OFF_TAXONOMY_FILEPATH, INGREDIENTS_DATA_FILEPATH, _load_json, _load_ingredients_distribution
+from data.bundle import Bundle, compile_bundle, load_bundle, write_bundle, reference_distribution_dataframe, \
+    NUTRIMENTS_VALUES, UNCERTAINTY_PARAMETERS
+
+
+def test_bundle_content(tmp_path):
+    filepath = str(tmp_path / 'data.bundle')
+    compile_bundle(filepath)
+    bundle = load_bundle(filepath)
+
+    off_taxonomy = _load_json(OFF_TAXONOMY_FILEPATH)
+    ingredients_data = _load_json(INGREDIENTS_DATA_FILEPATH, missing_ok=True)
+
+    assert dict(bundle.mapping('taxonomy')) == off_taxonomy
+    assert dict(bundle.mapping('ingredients')) == ingredients_data
+    pd.testing.assert_frame_equal(reference_distribution_dataframe(bundle), _load_ingredients_distribution())
+
+    taxonomy_ids = list(bundle.strings('taxonomy.ids'))
+    assert [taxonomy_ids[i] for i in np.flatnonzero(bundle.array('taxonomy.allergens'))] == \
+           [x for x in off_taxonomy if 'allergens' in off_taxonomy[x]]
+
+
+def test_bundle_tables(tmp_path):
+    filepath = str(tmp_path / 'data.bundle')
+    compile_bundle(filepath)
+    bundle = Bundle(filepath)
+
+    ingredients_data = _load_json(INGREDIENTS_DATA_FILEPATH, missing_ok=True)
+    ingredients_ids = bundle.strings('ingredients.ids')
+    nutriments_names = bundle.strings('nutriments.names')
+    impacts_names = bundle.strings('impacts.names')
+    distributions_names = bundle.strings('uncertainty.distributions_names')
+    nutriments = bundle.array('ingredients.nutriments')
+    impacts = bundle.array('ingredients.impacts')
+    offsets = bundle.array('uncertainty.offsets')
+
+    for ingredient_id, ingredient in ingredients_data.items():
+        i = ingredients_ids.index[ingredient_id]
+        for nutriment, nutriment_data in ingredient.get('nutriments', dict()).items():
+            j = nutriments_names.index[nutriment]
+            for k, value in enumerate(NUTRIMENTS_VALUES):
+                assert nutriments[i, j, k] == nutriment_data[value]
+
+        for impact_name, impact in ingredient.get('impacts', dict()).items():
+            j = impacts_names.index[impact_name]
+            assert impacts[i, j] == impact['amount']
+            rows = range(offsets[i * len(impacts_names) + j], offsets[i * len(impacts_names) + j + 1])
+            assert len(rows) == len(impact.get('uncertainty_distributions', []))
+            for row, distribution in zip(rows, impact.get('uncertainty_distributions', [])):
+                assert distributions_names[bundle.array('uncertainty.distributions')[row]] \
+                       == distribution['distribution']
+                assert bundle.array('uncertainty.parameters')[row, UNCERTAINTY_PARAMETERS.index('minimum')] \
+                       == distribution['minimum']
+
+
+def test_stale_bundle(tmp_path):
+    source = str(tmp_path / 'source.json')
+    filepath = str(tmp_path / 'data.bundle')
+    with open(source, 'w') as file:
+        file.write('{}')
+
+    write_bundle(filepath, {'values': np.arange(10)}, {'names': ['a', 'b']}, sources=[source])
+    bundle = load_bundle(filepath)
+    assert list(bundle.array('values')) == list(range(10))
+    assert list(bundle.strings('names')) == ['a', 'b']
+
+    # Modification time changed but same content
+    os.utime(source, ns=(0, 0))
+    assert load_bundle(filepath) is not None
+
+    with open(source, 'w') as file:
+        file.write('{"a": 1}')
+    assert load_bundle(filepath) is None
+
+
+def test_bundle_missing_source(tmp_path):
+    source = str(tmp_path / 'source.json')
+    filepath = str(tmp_path / 'data.bundle')
+
+    # The source is created after the compilation
+    write_bundle(filepath, {'values': np.arange(10)}, {}, sources=[source])
+    assert load_bundle(filepath) is not None
+    with open(source, 'w') as file:
+        file.write('{}')
+    assert load_bundle(filepath) is None
+
+    # The source is deleted after the compilation
+    write_bundle(filepath, {'values': np.arange(10)}, {}, sources=[source])
+    assert load_bundle(filepath) is not None
+    os.remove(source)
+    assert load_bundle(filepath) is None
+
+
+def test_compiled_bundle_missing_ingredients_data(tmp_path, monkeypatch):
+    ingredients_data_filepath = str(tmp_path / 'ingredients_data.json')
+    monkeypatch.setattr(data, 'INGREDIENTS_DATA_FILEPATH', ingredients_data_filepath)
+    filepath = str(tmp_path / 'data.bundle')
+
+    compile_bundle(filepath)
+    assert len(load_bundle(filepath).mapping('ingredients')) == 0
+
+    with open(ingredients_data_filepath, 'w') as file:
+        file.write('{"en:a": {"id": "en:a"}}')
+    assert load_bundle(filepath) is None
+
+    compile_bundle(filepath)
+    assert len(load_bundle(filepath).mapping('ingredients')) == 1
+    os.remove(ingredients_data_filepath)
+    assert load_bundle(filepath) is None
+
+
+def test_invalid_bundle(tmp_path):
+    filepath = str(tmp_path / 'data.bundle')
+    with open(filepath, 'wb') as file:
+        file.write(b'not a bundle')
+
+    assert load_bundle(filepath) is None
+    assert load_bundle(str(tmp_path / 'missing.bundle')) is None
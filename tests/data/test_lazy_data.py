@@ -0,0 +1,42 @@
+import copy
+import pickle
+
+import pytest
+
+from data import LazyData
+
+
+def _load_numbers():
+    return {'one': 1, 'nested': {'two': 2}}
+
+
+def test_lazy_data_copy():
+    numbers = LazyData(_load_numbers)
+    numbers_copy = copy.copy(numbers)
+
+    assert numbers.loaded
+    assert numbers_copy == _load_numbers()
+    assert numbers_copy['nested'] is numbers['nested']
+
+
+def test_lazy_data_deepcopy():
+    numbers = LazyData(lambda: _load_numbers())
+    numbers_copy = copy.deepcopy(numbers)
+
+    assert numbers_copy == _load_numbers()
+    assert numbers_copy['nested'] is not numbers['nested']
+
+
+def test_lazy_data_pickle():
+    numbers = LazyData(lambda: _load_numbers())
+
+    assert pickle.loads(pickle.dumps(numbers)) == _load_numbers()
+
+
+def test_lazy_data_private_attributes():
+    numbers = LazyData(_load_numbers)
+
+    with pytest.raises(AttributeError):
+        numbers._missing
+    assert not numbers.loaded
+    assert numbers.keys() == _load_numbers().keys()
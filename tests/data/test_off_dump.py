@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+import utils
+from data.off_dump import build_dump_index, load_dump_index, open_dump_index, line_barcode
+from utils import get_product_from_barcode
+
+PRODUCTS = [{'code': '3017620422003', 'product_name': 'Spread'},
+            {'code': '0000000000017', 'product_name': 'Pasta', 'packagings': [{'code': 'not a barcode'}]},
+            {'code': 12345, 'product_name': 'Numeric barcode'},
+            {'product_name': 'No barcode'},
+            {'code': '3017620422003', 'product_name': 'Duplicate'},
+            {'code': '20', 'product_name': 'Escaped "name"'}]
+
+
+def _write_dump(filepath, products):
+    with open(filepath, 'w', encoding='utf-8') as file:
+        for product in products:
+            file.write(json.dumps(product, ensure_ascii=False) + '\n')
+        file.write('\n')
+
+
+def test_line_barcode():
+    assert line_barcode(b'{"code": "123", "name": "x"}\n') == '123'
+    assert line_barcode(b'{"name": "x", "code":"456"}') == '456'
+    assert line_barcode(b'{"code": 789}') == '789'
+    assert line_barcode(b'{"name": "x"}') is None
+    assert line_barcode(b'{"name": "{x", "packagings": [{"code": "not a barcode"}]}') is None
+    assert line_barcode(b'{"nutrition": {"code": "not a barcode"}, "name": "x\\"}"}') is None
+    assert line_barcode(b'{"name": "x\\"}[", "code": "123"}') == '123'
+    assert line_barcode(b'\n') is None
+
+
+def test_dump_index(tmp_path):
+    dump_filepath = str(tmp_path / 'products.jsonl')
+    _write_dump(dump_filepath, PRODUCTS)
+    build_dump_index(dump_filepath)
+    index = load_dump_index(dump_filepath)
+
+    assert len(index) == 4
+    assert index.get('3017620422003') == PRODUCTS[0]
+    assert index.get('0000000000017') == PRODUCTS[1]
+    assert index.get(12345) == PRODUCTS[2]
+    assert index.get('20') == PRODUCTS[5]
+    assert '17' not in index
+    assert index.get('2') is None
+    assert index.get('30176204220031234567890') is None
+
+
+def test_dump_index_staleness(tmp_path):
+    dump_filepath = str(tmp_path / 'products.jsonl')
+    _write_dump(dump_filepath, PRODUCTS)
+    assert load_dump_index(dump_filepath) is None
+    open_dump_index(dump_filepath)
+    assert load_dump_index(dump_filepath) is not None
+
+    _write_dump(dump_filepath, PRODUCTS[1:])
+    assert load_dump_index(dump_filepath) is None
+    assert open_dump_index(dump_filepath).get('3017620422003') == PRODUCTS[4]
+
+
+def test_get_product_from_dump(tmp_path):
+    dump_filepath = str(tmp_path / 'products.jsonl')
+    _write_dump(dump_filepath, PRODUCTS)
+
+    assert get_product_from_barcode('0000000000017', dump_filepath=dump_filepath) == PRODUCTS[1]
+    with pytest.raises(ValueError):
+        get_product_from_barcode('404', dump_filepath=dump_filepath, api_fallback=False)
+
+
+def test_get_product_from_replaced_dump(tmp_path):
+    dump_filepath = str(tmp_path / 'products.jsonl')
+    _write_dump(dump_filepath, PRODUCTS)
+    assert get_product_from_barcode('20', dump_filepath=dump_filepath) == PRODUCTS[5]
+
+    # The cached index of the previous dump is not used anymore
+    products = [{'code': '1', 'product_name': 'New product'}, {'code': '20', 'product_name': 'New name'}]
+    _write_dump(dump_filepath, products)
+    os.utime(dump_filepath, ns=(0, 0))
+    assert get_product_from_barcode('20', dump_filepath=dump_filepath) == products[1]
+
+
+def test_dump_index_cannot_be_opened(tmp_path, monkeypatch):
+    dump_filepath = str(tmp_path / 'products.jsonl')
+    _write_dump(dump_filepath, PRODUCTS)
+    monkeypatch.setattr(utils, 'open_dump_index', lambda *args: None)
+
+    with pytest.raises(ValueError, match='cannot be opened'):
+        get_product_from_barcode('20', dump_filepath=dump_filepath, api_fallback=False)
@@ -0,0 +1,47 @@
+import numpy as np
+
+from data import _load_json, _load_ingredients_distribution, INGREDIENTS_DATA_FILEPATH
+from data.bundle import Bundle, compile_bundle
+from data.tables import IngredientsTables
+
+
+def test_tables_from_bundle(tmp_path):
+    filepath = str(tmp_path / 'data.bundle')
+    compile_bundle(filepath)
+
+    ingredients_data = _load_json(INGREDIENTS_DATA_FILEPATH, missing_ok=True)
+    ref_ing_dist = _load_ingredients_distribution()
+    tables = IngredientsTables.from_bundle(Bundle(filepath))
+    in_memory_tables = IngredientsTables.from_data(ingredients_data, ref_ing_dist)
+
+    for ingredient_id, ingredient in ingredients_data.items():
+        for nutriment, nutriment_data in ingredient.get('nutriments', dict()).items():
+            assert tables.ingredient_nutriments(ingredient_id, nutriment) == nutriment_data
+            assert in_memory_tables.ingredient_nutriments(ingredient_id, nutriment) == nutriment_data
+
+        for impact_name, impact in ingredient.get('impacts', dict()).items():
+            amount, distributions = tables.ingredient_impact(ingredient_id, impact_name)
+            assert amount == impact['amount']
+            assert [tables.uncertainty_distribution(x) for x in distributions] \
+                   == impact.get('uncertainty_distributions', [])
+
+    assert tables.ingredient_nutriments('en:unknown-ingredient', 'proteins') is None
+    assert tables.ingredient_impact('en:unknown-ingredient', 'Changement climatique') is None
+
+    for ingredient_id in ref_ing_dist.id.unique():
+        expected = ref_ing_dist[ref_ing_dist.id == ingredient_id]
+        rows = tables.reference_rows(ingredient_id)
+        assert np.array_equal(tables.reference_percent[rows], expected.percent.values)
+        assert [tables.reference_categories[x] for x in rows] == expected.categories_tags.tolist()
+        assert np.array_equal(in_memory_tables.reference_rows(ingredient_id), rows)
+
+    assert len(tables.reference_rows('en:unknown-ingredient')) == 0
+
+
+def test_tables_are_read_only(tmp_path):
+    filepath = str(tmp_path / 'data.bundle')
+    compile_bundle(filepath)
+    tables = IngredientsTables.from_bundle(Bundle(filepath))
+
+    assert not tables.nutriments.flags.writeable
+    assert not tables.impacts.flags.writeable
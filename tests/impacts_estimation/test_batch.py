@@ -0,0 +1,102 @@
+import copy
+
+from impacts_estimation.batch import canonical_product, estimate_impacts_batch
+from impacts_estimation.exceptions import NoKnownIngredientsError
+from tests.test_data import pound_cake
+
+
+class TestCanonicalProduct:
+    def setup_method(self):
+        self.product = copy.deepcopy(pound_cake)
+
+    def test_irrelevant_attributes_ignored(self):
+        """ Ensures that attributes not used by the estimator do not change the canonical form. """
+
+        clone = copy.deepcopy(self.product)
+        clone['_id'] = '3000000000000'
+        clone['product_name'] = 'Store brand pound cake'
+        clone['ingredients'][0]['text'] = 'Eggs'
+
+        assert canonical_product(self.product) == canonical_product(clone)
+
+    def test_unknown_ingredients_ignored(self):
+        """ Ensures that ignored unknown ingredients are taken into account in the canonical form. """
+
+        clone = copy.deepcopy(self.product)
+        clone['ingredients'].append({'id': 'unknown_ingredient'})
+
+        assert canonical_product(self.product) != canonical_product(clone)
+
+    def test_different_nutriments(self):
+        """ Ensures that products with different nutritional information have different canonical forms. """
+
+        clone = copy.deepcopy(self.product)
+        clone['nutriments']['fat_100g'] = 25
+
+        assert canonical_product(self.product) != canonical_product(clone)
+
+
+class TestEstimateImpactsBatch:
+    def setup_method(self):
+        self.product = copy.deepcopy(pound_cake)
+
+    def test_deduplication(self):
+        """ Ensures that equivalent products are computed once and get the same result. """
+
+        clone = copy.deepcopy(self.product)
+        clone['product_name'] = 'Store brand pound cake'
+        other = copy.deepcopy(self.product)
+        other['nutriments']['fat_100g'] = 25
+
+        batch_result = estimate_impacts_batch([self.product, clone, other],
+                                              impact_names='Climate change',
+                                              seeds=777,
+                                              forced_run_nb=5)
+
+        assert batch_result['number_of_products'] == 3
+        assert batch_result['number_of_estimations'] == 2
+        assert batch_result['dedup_ratio'] == 1.5
+        results = batch_result['results']
+        assert results[0]['impacts_geom_means'] == results[1]['impacts_geom_means']
+        assert results[0] is not results[1]
+
+    def test_different_seeds(self):
+        """ Ensures that equivalent products are not grouped if their seeds differ, unless seeds are ignored. """
+
+        products = [self.product, copy.deepcopy(self.product)]
+
+        batch_result = estimate_impacts_batch(products, impact_names='Climate change', seeds=[1, 2],
+                                              forced_run_nb=5)
+        assert batch_result['number_of_estimations'] == 2
+
+        batch_result = estimate_impacts_batch(products, impact_names='Climate change', seeds=[1, 2],
+                                              ignore_seeds=True, forced_run_nb=5)
+        assert batch_result['number_of_estimations'] == 1
+
+    def test_preprocessing_error(self):
+        """ Ensures that a product failing the preprocessing gets the exception as result. """
+
+        product = {'_id': '',
+                   'ingredients': [{'id': 'unknown_ingredient_1'}],
+                   'nutriments': {'carbohydrates_100g': 30}}
+
+        batch_result = estimate_impacts_batch([product, self.product], impact_names='Climate change', seeds=1,
+                                              forced_run_nb=5)
+
+        assert isinstance(batch_result['results'][0], NoKnownIngredientsError)
+        assert batch_result['number_of_estimations'] == 1
+
+    def test_cost_report(self):
+        """ Ensures that the predicted and actual cost of each estimation are reported. """
+
+        other = copy.deepcopy(self.product)
+        other['nutriments']['fat_100g'] = 25
+
+        batch_result = estimate_impacts_batch([self.product, other], impact_names='Climate change', seeds=1,
+                                              forced_run_nb=5)
+
+        assert len(batch_result['cost_report']) == 2
+        for record in batch_result['cost_report']:
+            assert record['predicted_cost'] > 0
+            assert record['actual_cost'] > 0
+            assert record['features']['nb_ing'] == 4
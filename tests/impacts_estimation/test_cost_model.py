@@ -0,0 +1,50 @@
+import copy
+
+import pytest
+
+from impacts_estimation.cost_model import CostModel, cost_features, COST_MODEL_FEATURES
+from impacts_estimation.impacts_estimation import build_estimation_plan
+from tests.test_data import pound_cake
+
+
+class TestCostModel:
+    def setup_method(self):
+        self.product = copy.deepcopy(pound_cake)
+
+    def test_features(self):
+        """ Ensures that the features of a product are computed from its estimation plan. """
+
+        self.product['ingredients'][0]['percent'] = 30
+        self.product['ingredients'].append({'id': 'en:chocolate', 'ingredients': [{'id': 'en:sugar'},
+                                                                                  {'id': 'en:milk'}]})
+
+        features = cost_features(build_estimation_plan(self.product))
+
+        assert features['nb_ing'] == 6
+        assert features['depth'] == 2
+        assert features['nb_nutriments'] == 5
+        assert features['nb_defined_percentages'] == 1
+        assert 0 <= features['reference_distribution_coverage'] <= 1
+
+    def test_fit(self):
+        """ Ensures that the fitted model recovers the coefficients of log-linear calculation times. """
+
+        coefficients = {'intercept': -1, 'nb_ing': 0.3, 'depth': 0.5, 'nb_nutriments': 0.05,
+                        'nb_defined_percentages': -0.1, 'reference_distribution_coverage': 1}
+        true_model = CostModel(coefficients)
+        records = []
+        for i in range(20):
+            features = {'nb_ing': i % 7 + 1, 'depth': i % 3 + 1, 'nb_nutriments': i % 8,
+                        'nb_defined_percentages': i % 4, 'reference_distribution_coverage': (i % 5) / 4}
+            records.append({'features': features, 'actual_cost': true_model.predict(features)})
+
+        fitted_model = CostModel.fit(records)
+
+        for feature in ['intercept'] + COST_MODEL_FEATURES:
+            assert fitted_model.coefficients[feature] == pytest.approx(coefficients[feature])
+
+    def test_fit_not_enough_data(self):
+        """ Ensures that an error is raised if there are not enough timings to fit the model. """
+
+        with pytest.raises(ValueError):
+            CostModel.fit([{'features': {x: 1 for x in COST_MODEL_FEATURES}, 'actual_cost': 1}])
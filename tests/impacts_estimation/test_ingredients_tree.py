@@ -0,0 +1,53 @@
+""" Testing the compiled ingredients tree """
+
+from copy import deepcopy
+
+from impacts_estimation.ingredients_tree import IngredientsTree
+from impacts_estimation.utils import flat_ingredients_list_BFS, flat_ingredients_list_DFS, \
+    find_ingredients_graph_leaves
+from tests.test_data import pound_cake
+
+product = {'ingredients': [{'id': 'A', 'percent': 40},
+                           {'id': 'B', 'ingredients': [{'id': 'D'},
+                                                       {'id': 'E', 'ingredients': [{'id': 'F', 'percent': '10'}]}]},
+                           {'id': 'C', 'ingredients': [{'id': 'G'}]}]}
+
+
+def test_tree_arrays():
+    tree = IngredientsTree(product)
+
+    assert tree.ids == ['A', 'B', 'C', 'D', 'E', 'G', 'F']
+    assert tree.nb_top_level == 3
+    assert tree.parent.tolist() == [-1, -1, -1, 1, 1, 2, 4]
+    assert tree.depth.tolist() == [0, 0, 0, 1, 1, 1, 2]
+    assert tree.rank.tolist() == [1, 2, 3, 1, 2, 1, 1]
+    assert tree.is_leaf.tolist() == [True, False, False, True, False, True, True]
+    assert [tree.ids[i] for i in tree.children(1)] == ['D', 'E']
+    assert list(tree.children(0)) == []
+    assert tree.percent[0] == 40
+    assert tree.percent[6] == 10
+
+
+def test_tree_orders():
+    tree = IngredientsTree(product)
+
+    assert [tree.ids[i] for i in tree.siblings_groups_order()] == ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+    assert [tree.ids[i] for i in tree.dfs_order()] == ['A', 'B', 'D', 'E', 'F', 'C', 'G']
+    assert [x['id'] for x in tree.leaves()] == ['A', 'D', 'F', 'G']
+
+    # The leaves are the ingredients of the product, not copies
+    assert tree.leaves()[0] is product['ingredients'][0]
+
+
+def test_traversal_functions():
+    cake = deepcopy(pound_cake)
+    tree = IngredientsTree(cake)
+
+    assert [x['id'] for x in flat_ingredients_list_BFS(cake)] == \
+           [tree.ids[i] for i in tree.siblings_groups_order()]
+    assert [x['id'] for x in flat_ingredients_list_DFS(cake)] == [tree.ids[i] for i in tree.dfs_order()]
+    assert all('ingredients' not in x for x in flat_ingredients_list_BFS(cake))
+    assert [x['id'] for x in find_ingredients_graph_leaves(cake)] == [x['id'] for x in tree.leaves()]
+
+    # The product is left unchanged
+    assert cake == pound_cake
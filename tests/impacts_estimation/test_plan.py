@@ -0,0 +1,134 @@
+import copy
+import pickle
+
+import numpy as np
+import pytest
+
+from data import ref_ing_dist
+from data.tables import IngredientsTables
+from impacts_estimation import plan as plan_module
+from impacts_estimation.impacts_estimation import ImpactEstimator, RandomRecipeCreator, build_estimation_plan, \
+    estimate_impacts
+from impacts_estimation.registry import IngredientRegistry
+from impacts_estimation.utils import confidence_score, nutriments_from_recipe
+from impacts_estimation.vars import DEFINED_PERCENTAGES_NOT_USED_WARNING, COMPOSITION_COLUMNS, MAX_ASH_CONTENT
+from tests.test_data import pound_cake
+
+
+class TestEstimationPlan:
+    def setup_method(self):
+        self.product = copy.deepcopy(pound_cake)
+
+    def test_same_result_as_product(self):
+        """ Ensures that estimating the impacts from a plan gives the same result as from the product. """
+
+        plan = build_estimation_plan(self.product)
+
+        from_product = estimate_impacts(self.product, 'Climate change', seed=777, forced_run_nb=5)
+        from_plan = estimate_impacts(plan, 'Climate change', seed=777, forced_run_nb=5)
+
+        assert from_product['impacts_geom_means'] == from_plan['impacts_geom_means']
+        assert from_product['warnings'] == from_plan['warnings']
+
+    def test_plan_not_modified(self):
+        """ Ensures that an estimation does not modify the plan it uses. """
+
+        plan = build_estimation_plan(self.product)
+        warnings = list(plan.warnings)
+        product = copy.deepcopy(plan.product)
+
+        estimate_impacts(plan, 'Climate change', forced_run_nb=5)
+
+        assert plan.warnings == warnings
+        assert plan.product == product
+
+    def test_picklable(self):
+        """ Ensures that a plan can be pickled to be sent to other processes. """
+
+        plan = build_estimation_plan(self.product)
+        unpickled_plan = pickle.loads(pickle.dumps(plan))
+
+        assert unpickled_plan.product == plan.product
+        assert unpickled_plan.leaf_ingredients_names == plan.leaf_ingredients_names
+        assert (unpickled_plan.leaf_nutriments_max == plan.leaf_nutriments_max).all()
+
+    def test_added_water(self):
+        """ Ensures that water is added to the leaf ingredients if it is not a top level ingredient. """
+
+        plan = build_estimation_plan(self.product)
+
+        assert plan.added_water_name == 'en:water'
+        assert plan.leaf_ingredients_names[-1] == 'en:water'
+        assert plan.leaf_nutriments_min.shape[0] == len(plan.leaf_ingredients_names)
+
+    def test_recipe_creator_tables(self):
+        """ Ensures that the recipe creator gets the same tables from the plan as from the product. """
+
+        plan = build_estimation_plan(self.product)
+        from_plan = RandomRecipeCreator(plan.product, plan=plan)
+        from_product = RandomRecipeCreator(copy.deepcopy(plan.product))
+
+        assert from_plan.leaf_ingredients_names == from_product.leaf_ingredients_names
+        assert (from_plan.nutriments_min == from_product.nutriments_min).all()
+        assert (from_plan.nutriments_max == from_product.nutriments_max).all()
+
+    def test_without_defined_percentages(self):
+        """ Ensures that disabling the defined percentages of a plan is equivalent to a new preprocessing. """
+
+        self.product['ingredients'][1]['percent'] = 20
+        self.product['ingredients'][2]['percent'] = 25
+
+        plan = build_estimation_plan(self.product, use_defined_prct=True)
+        assert DEFINED_PERCENTAGES_NOT_USED_WARNING in plan.warnings
+
+        expected = ImpactEstimator(self.product, use_defined_prct=False)
+        impact_estimator = ImpactEstimator(plan, use_defined_prct=False)
+
+        assert impact_estimator.use_defined_prct is False
+        assert impact_estimator.warnings == expected.warnings
+
+    def test_recipes_evaluator(self):
+        """ Ensures that the recipes evaluator gives the results of the scalar functions for a batch of recipes. """
+
+        plan = build_estimation_plan(self.product)
+        evaluator = plan.evaluator
+        random_state = np.random.RandomState(0)
+        recipes = [dict(zip(evaluator.ingredients_ids, random_state.dirichlet(np.ones(len(evaluator.ingredients_ids)))
+                            * random_state.uniform(60, 140)))
+                   for _ in range(20)]
+
+        evaluation = evaluator.evaluate(np.array([evaluator.masses(x) for x in recipes]),
+                                        min_possible_mass=50, max_possible_mass=160)
+
+        for i, recipe in enumerate(recipes):
+            total_mass = sum(recipe.values())
+            assert evaluation['total_mass'][i] == pytest.approx(total_mass)
+            assert evaluation['comparable'][i]
+            assert evaluation['confidence_score'][i] == pytest.approx(
+                confidence_score(nutriments_from_recipe(recipe), plan.product['nutriments'], total_mass,
+                                 min_possible_mass=50, max_possible_mass=160))
+
+            for characterization, ids in plan.uncharacterized_ingredients_ids.items():
+                assert evaluation['uncharacterized_mass'][characterization][i] == \
+                       pytest.approx(sum(recipe[x] for x in ids) / total_mass)
+
+
+def test_leaf_ingredients_nutriments_missing_bounds(monkeypatch):
+    """ Ensures that the missing bounds of a nutriment content fall back to its value or to the default bounds. """
+    ingredients_data = {'en:a': {'id': 'en:a', 'nutriments': {'proteins': {'value': 12},
+                                                              'fat': {'value': 5, 'min': 4},
+                                                              'ash': {'min': 1}}}}
+    registry = IngredientRegistry(IngredientsTables.from_data(ingredients_data, ref_ing_dist.load()))
+    monkeypatch.setattr(plan_module, 'registry', registry)
+
+    nutriments_min, nutriments_max = plan_module.leaf_ingredients_nutriments(['en:a', 'en:unknown'])
+
+    assert not np.isnan(nutriments_min).any() and not np.isnan(nutriments_max).any()
+    assert (nutriments_min[0, COMPOSITION_COLUMNS['proteins']], nutriments_max[0, COMPOSITION_COLUMNS['proteins']]) \
+           == (12, 12)
+    assert (nutriments_min[0, COMPOSITION_COLUMNS['fat']], nutriments_max[0, COMPOSITION_COLUMNS['fat']]) == (4, 5)
+    assert (nutriments_min[0, COMPOSITION_COLUMNS['ash']], nutriments_max[0, COMPOSITION_COLUMNS['ash']]) \
+           == (1, MAX_ASH_CONTENT)
+    assert (nutriments_min[0, COMPOSITION_COLUMNS['water']], nutriments_max[0, COMPOSITION_COLUMNS['water']]) \
+           == (0, 100)
+    assert (nutriments_min[1] == 0).all()
@@ -0,0 +1,48 @@
+""" Testing the ingredient registry """
+
+import numpy as np
+
+from data import ingredients_data, ingredients_tables
+from impacts_estimation.registry import registry, UNKNOWN_INGREDIENT
+from impacts_estimation.vars import INGREDIENTS_COMPOSITION_ITEMS, AGRIBALYSE_IMPACT_CATEGORIES_FR
+
+
+def test_registry_matrices():
+    for ingredient_id, ingredient in ingredients_data.items():
+        row = registry.index[ingredient_id]
+
+        for column, nutri_item in enumerate(INGREDIENTS_COMPOSITION_ITEMS):
+            nutriment = ingredient.get('nutriments', dict()).get(nutri_item)
+            assert registry.nutriments_mask[row, column] == (nutriment is not None)
+            if nutriment is not None:
+                assert registry.nutriments_value[row, column] == nutriment['value']
+                assert registry.nutriments_min[row, column] == nutriment['min']
+                assert registry.nutriments_max[row, column] == nutriment['max']
+
+        for column, impact_name in enumerate(AGRIBALYSE_IMPACT_CATEGORIES_FR):
+            impact = ingredient.get('impacts', dict()).get(impact_name)
+            assert registry.impacts_mask[row, column] == (impact is not None)
+            if impact is not None:
+                assert registry.impacts[row, column] == impact['amount']
+                assert [registry.uncertainty_distribution(x)
+                        for x in registry.uncertainty_distributions(row, column)] \
+                       == impact.get('uncertainty_distributions', [])
+
+        assert registry.is_characterized(ingredient_id, 'nutrition') == bool(ingredient.get('nutriments'))
+        assert registry.is_characterized(ingredient_id, 'impact') == bool(ingredient.get('impacts'))
+
+
+def test_intern():
+    ingredients_ids = list(ingredients_data)[:2] + ['en:unknown-ingredient']
+    rows = registry.intern(ingredients_ids)
+
+    assert rows.dtype == np.int64
+    assert list(rows[:2]) == [registry.index[x] for x in ingredients_ids[:2]]
+    assert rows[2] == UNKNOWN_INGREDIENT
+    assert not registry.is_characterized('en:unknown-ingredient', 'impact')
+
+
+def test_registry_views():
+    """ Ensures that the registry matrices are views of the data tables, without copies. """
+    assert np.shares_memory(registry.nutriments_value, ingredients_tables.nutriments)
+    assert np.shares_memory(registry.impacts, ingredients_tables.impacts)
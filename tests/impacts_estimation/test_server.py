@@ -0,0 +1,132 @@
+import asyncio
+import copy
+
+from impacts_estimation.server import EstimationServer, request
+from tests.test_data import pound_cake
+
+
+def run_with_server(coroutine_function, **server_kwargs):
+    """ Runs a coroutine function taking the server as argument while a local server is running. """
+
+    async def run():
+        server = EstimationServer(host='127.0.0.1', port=0, **server_kwargs)
+        await server.start()
+        try:
+            return await coroutine_function(server)
+        finally:
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+def estimation_request(server, seed=1, timeout=None):
+    body = {'product': copy.deepcopy(pound_cake),
+            'impact_names': 'Climate change',
+            'forced_run_nb': 5,
+            'seed': seed}
+    if timeout is not None:
+        body['timeout'] = timeout
+
+    return request('POST', '/estimate', body=body, host=server.host, port=server.port)
+
+
+class TestEstimationServer:
+    def test_healthz(self):
+        """ Ensures that the health endpoint answers. """
+
+        async def test(server):
+            return await request('GET', '/healthz', host=server.host, port=server.port)
+
+        status, content = run_with_server(test, workers=1)
+
+        assert status == 200
+        assert content['status'] == 'ok'
+
+    def test_estimate(self):
+        """ Ensures that an estimation result is returned. """
+
+        async def test(server):
+            return await estimation_request(server)
+
+        status, content = run_with_server(test, workers=1)
+
+        assert status == 200
+        assert isinstance(content['impacts_geom_means']['Climate change'], float)
+
+    def test_coalescing(self):
+        """ Ensures that identical simultaneous requests are computed once. """
+
+        async def test(server):
+            responses = await asyncio.gather(*[estimation_request(server) for _ in range(3)])
+            return responses, server.stats
+
+        responses, stats = run_with_server(test, workers=2)
+
+        assert all(status == 200 for status, _ in responses)
+        assert responses[0][1]['impacts_geom_means'] == responses[1][1]['impacts_geom_means']
+        assert stats['computations'] + stats['coalesced'] == 3
+        assert stats['coalesced'] >= 1
+
+    def test_backpressure(self):
+        """ Ensures that requests are rejected with a 429 status when the queue is full. """
+
+        async def test(server):
+            return await asyncio.gather(*[estimation_request(server, seed=seed) for seed in range(3)])
+
+        responses = run_with_server(test, workers=1, max_queue_size=0)
+
+        assert 429 in [status for status, _ in responses]
+        assert 200 in [status for status, _ in responses]
+
+    def test_deadline(self):
+        """ Ensures that a 504 status is returned when the deadline is reached. """
+
+        async def test(server):
+            return await estimation_request(server, timeout=0.001)
+
+        status, _ = run_with_server(test, workers=1)
+
+        assert status == 504
+
+    def test_invalid_parameters(self):
+        """ Ensures that a 400 status is returned for invalid timeouts and unknown parameters. """
+
+        async def test(server):
+            responses = []
+            for extra in [{'timeout': 0}, {'timeout': -1}, {'timeout': 'abc'}, {'unknown_parameter': 1}]:
+                body = {'product': copy.deepcopy(pound_cake), 'impact_names': 'Climate change', **extra}
+                responses.append(await request('POST', '/estimate', body=body, host=server.host, port=server.port))
+            return responses
+
+        responses = run_with_server(test, workers=1)
+
+        assert [status for status, _ in responses] == [400] * 4
+        assert 'unknown_parameter' in responses[-1][1]['error']
+
+    def test_missing_nutriments(self):
+        """ Ensures that a 422 status is returned if the product has no nutriments. """
+
+        async def test(server):
+            product = copy.deepcopy(pound_cake)
+            del product['nutriments']
+            return await request('POST', '/estimate', body={'product': product, 'impact_names': 'Climate change'},
+                                 host=server.host, port=server.port)
+
+        status, content = run_with_server(test, workers=1)
+
+        assert status == 422
+        assert 'MissingProductFieldError' in content['error']
+
+    def test_unknown_ingredients(self):
+        """ Ensures that a 422 status is returned if the impacts of the product cannot be estimated. """
+
+        async def test(server):
+            return await request('POST', '/estimate',
+                                 body={'product': {'ingredients': [{'id': 'unknown_ingredient'}]},
+                                       'impact_names': 'Climate change'},
+                                 host=server.host, port=server.port)
+
+        status, content = run_with_server(test, workers=1)
+
+        assert status == 422
+        assert 'NoKnownIngredientsError' in content['error']
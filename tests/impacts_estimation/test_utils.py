@@ -1,9 +1,11 @@
 """ Testing functions and classes in impacts_estimation.utils """
 
+import numpy as np
+
 from impacts_estimation.utils import nutriments_from_recipe, confidence_score, clear_ingredient_graph, \
     minimum_percentage_sum, maximum_percentage_sum, define_subingredients_percentage_type, flat_ingredients_list_BFS, \
     flat_ingredients_list_DFS, find_ingredients_graph_leaves, UnknownIngredientsRemover, remove_percentage_from_product, \
-    weighted_geometric_mean
+    weighted_geometric_mean, nutriments_from_scaled_recipe, confidence_scores
 
 
 def test_nutri_from_recipe():
@@ -101,6 +103,30 @@ def test_confidence_score_total_mass_component():
     assert conf_score_lower_mass < conf_score_exact_mass
 
 
+def test_vectorized_confidence_scores():
+    """ Assert that the vectorized functions give exactly the scores of the scalar ones for each total mass """
+
+    recipe = {'en:flour': 0.55, 'en:egg': 0.25, 'en:milk': 0.2}
+    reference_nutri = {'proteins_100g': 8,
+                       'carbohydrates_100g': 45,
+                       'fat_100g': 15,
+                       'fiber_100g': 2,
+                       'salt_100g': 0.5,
+                       'sugars_100g': 20,
+                       'saturated-fat_100g': 7}
+    total_masses = np.arange(0.6, 1.6, 0.01) * 100
+
+    recipes_nutriments = nutriments_from_scaled_recipe(recipe, total_masses)
+    scores = confidence_scores(recipes_nutriments, reference_nutri, total_masses,
+                               min_possible_mass=50, max_possible_mass=160)
+
+    for i, total_mass in enumerate(total_masses):
+        nutriments = nutriments_from_recipe({name: prop * total_mass for name, prop in recipe.items()})
+        assert {name: values[i] for name, values in recipes_nutriments.items()} == nutriments
+        assert scores[i] == confidence_score(nutriments, reference_nutri, total_mass,
+                                             min_possible_mass=50, max_possible_mass=160)
+
+
 def test_clear_ingredient_graph():
     """ Assert that subingredients are removed only if none of them has a percentage or is characterized """
 
@@ -0,0 +1,74 @@
+""" Testing the indexed store of the Agribalyse dataset """
+
+import json
+import os
+
+import pytest
+
+from ingredients_characterization.impact.agribalyse_store import load_agribalyse_store, store_filepath
+
+RECORDS = [{'ciqual_AGB': '13000',
+            'LCI_name': 'Apple, raw',
+            'nom_francais': 'Pomme, crue',
+            'impact_environnemental': {
+                'Changement climatique': {'synthese': 0.4,
+                                          'unite': 'kg CO2 eq/kg de produit',
+                                          'etapes': {'Agriculture': 0.1, 'Transformation': 0.2, 'Transport': 0.1}},
+                'Score unique EF': {'synthese': 0.05,
+                                    'unite': 'mPt/kg de produit',
+                                    'etapes': {'Agriculture': 0.03, 'Transformation': 0.02}}}},
+           {'ciqual_AGB': '20000',
+            'LCI_name': 'Carrot, raw',
+            'nom_francais': 'Carotte, crue',
+            'impact_environnemental': {
+                'Changement climatique': {'synthese': 0.3,
+                                          'unite': 'kg CO2 eq/kg de produit',
+                                          'etapes': {'Agriculture': 0.3}}}}]
+
+
+def _write_dataset(filepath, records):
+    with open(filepath, 'w', encoding='utf8') as file:
+        json.dump(records, file)
+
+
+def test_agribalyse_store(tmp_path):
+    filepath = str(tmp_path / 'Agribalyse.json')
+    _write_dataset(filepath, RECORDS)
+    store = load_agribalyse_store(filepath)
+
+    assert len(store) == 2
+    apple = store.row_by_lci_name('Apple, raw')
+    carrot = store.row_by_ciqual_code('20000')
+    assert store.row_by_ciqual_code(13000) == apple
+    assert store.entry(carrot) == {'ciqual_AGB': '20000', 'LCI_name': 'Carrot, raw', 'nom_francais': 'Carotte, crue'}
+
+    assert store.record_categories(apple) == ['Changement climatique', 'Score unique EF']
+    assert store.record_categories(carrot) == ['Changement climatique']
+    assert store.unit(apple, 'Score unique EF') == 'mPt/kg de produit'
+    assert store.step_impacts(apple, 'Changement climatique') == {'Agriculture': 0.1,
+                                                                  'Transformation': 0.2,
+                                                                  'Transport': 0.1}
+    assert store.step_impacts(carrot, 'Changement climatique') == {'Agriculture': 0.3}
+    assert store.total_impact(apple, 'Changement climatique') == 0.4
+    assert store.non_agricultural_impact(apple, 'Changement climatique') == 0.2 + 0.1
+    assert store.non_agricultural_impact(carrot, 'Changement climatique') == 0
+
+    with pytest.raises(KeyError):
+        store.row_by_lci_name('Unknown')
+
+
+def test_agribalyse_store_cache(tmp_path):
+    filepath = str(tmp_path / 'Agribalyse.json')
+    _write_dataset(filepath, RECORDS)
+    load_agribalyse_store(filepath)
+    assert os.path.isfile(store_filepath(filepath))
+
+    # The compiled store is reused as long as the dataset does not change
+    modification_time = os.stat(store_filepath(filepath)).st_mtime_ns
+    load_agribalyse_store(filepath)
+    assert os.stat(store_filepath(filepath)).st_mtime_ns == modification_time
+
+    _write_dataset(filepath, RECORDS[1:])
+    store = load_agribalyse_store(filepath)
+    assert len(store) == 1
+    assert 'Apple, raw' not in store.lci_names
@@ -0,0 +1,55 @@
+""" Testing the preprocessing of the CIQUAL data """
+
+from ingredients_characterization.nutrition.ciqual.ciqual_preprocessing import read_products, add_compositions
+
+ALIM = """<?xml version="1.0" encoding="windows-1252" ?>
+<TABLE>
+   <ALIM>
+      <alim_code> 1000 </alim_code>
+      <alim_nom_fr> Crème brûlée </alim_nom_fr>
+      <alim_grp_code/>
+   </ALIM>
+</TABLE>
+"""
+
+COMPO = """<?xml version="1.0" encoding="windows-1252" ?>
+<TABLE>
+   <COMPO>
+      <alim_code> 1000 </alim_code>
+      <const_code> 25000 </const_code>
+      <teneur> 7,5 </teneur>
+      <min> traces </min>
+      <max> </max>
+      <code_confiance> A </code_confiance>
+   </COMPO>
+   <COMPO>
+      <alim_code> 1000 </alim_code>
+      <const_code> 10000 </const_code>
+      <teneur> 12 </teneur>
+      <min/>
+      <max/>
+      <code_confiance/>
+   </COMPO>
+   <COMPO>
+      <alim_code> 1000 </alim_code>
+      <const_code> 40000 </const_code>
+      <teneur> &lt; 0,5 </teneur>
+      <min/>
+      <max> - </max>
+      <code_confiance/>
+   </COMPO>
+</TABLE>
+"""
+
+
+def test_read_ciqual(tmp_path):
+    (tmp_path / 'alim.xml').write_bytes(ALIM.encode('windows-1252'))
+    (tmp_path / 'compo.xml').write_bytes(COMPO.encode('windows-1252'))
+
+    products = read_products(str(tmp_path / 'alim.xml'))
+    assert products == {'1000': {'alim_code': '1000', 'alim_nom_fr': 'Crème brûlée', 'alim_grp_code': None}}
+
+    # The constituent 10000 is not used by OFF
+    add_compositions(products, str(tmp_path / 'compo.xml'))
+    assert products['1000']['nutriments'] == {'proteins': {'value': 7.5, 'min': 0.0, 'confidence_code': 'A'},
+                                              'fat': {'value': 0.5, 'max': None}}
@@ -0,0 +1,33 @@
+""" Testing the preprocessing of the FCEN data """
+
+import math
+
+import pandas as pd
+
+from ingredients_characterization.nutrition.fcen.fcen_preprocessing import foods_nutriments
+
+
+def test_foods_nutriments():
+    # Food 1 has all the top level nutriments summing up to 80, food 2 has nutriments summing up to 160
+    nutrient_amounts = pd.DataFrame([(2, 203, 60.0, 1.0),
+                                     (1, 255, 40.0, math.nan),
+                                     (1, 203, 10.0, 0.5),
+                                     (2, 204, 100.0, 2.0),
+                                     (2, 269, 0.0, 0.0),
+                                     (1, 205, 20.0, 1.0),
+                                     (1, 204, 5.0, 1.0),
+                                     (1, 291, 5.0, 1.0),
+                                     (2, 208, 900.0, 10.0)],
+                                    columns=['FoodID', 'NutrientID', 'NutrientValue', 'StandardError'])
+
+    nutriments = foods_nutriments(nutrient_amounts)
+
+    assert list(nutriments[1]) == ['water', 'proteins', 'carbohydrates', 'fat', 'fiber', 'other']
+    assert nutriments[1]['other'] == {'value': 20.0, 'stdev': 0}
+    assert math.isnan(nutriments[1]['water']['stdev'])
+
+    assert list(nutriments[2]) == ['proteins', 'fat', 'sugars', 'energy-kcal', 'other']
+    assert nutriments[2]['proteins'] == {'value': 60.0 * 100 / 160, 'stdev': 1.0}
+    assert nutriments[2]['sugars']['value'] == 0
+    assert nutriments[2]['energy-kcal']['value'] == 900.0 * 100 / 160
+    assert nutriments[2]['other'] == {'value': 0, 'stdev': 0}
@@ -0,0 +1,74 @@
+""" Testing the incremental characterization of the ingredients """
+
+import pandas as pd
+
+import data
+from ingredients_characterization import incremental
+from ingredients_characterization.incremental import duplicates_groups, rows_groups_hashes, load_manifest, \
+    save_manifest
+from ingredients_characterization.characterize_ingredients import patch_ingredients_data
+
+
+def test_duplicates_groups():
+    duplicates = pd.DataFrame([('en:a', 'en:b', None),
+                               ('en:c', 'en:d', 1),
+                               ('en:b', 'en:e', None),
+                               ('en:d', 'en:e', 2),
+                               ('en:f', 'en:g', None)],
+                              columns=['ingredient', 'reference', 'proxy_type'])
+
+    groups = duplicates_groups(duplicates)
+
+    assert len({groups[x] for x in ['en:a', 'en:b', 'en:c', 'en:d', 'en:e']}) == 1
+    assert groups['en:f'] == groups['en:g'] != groups['en:a']
+
+
+def test_rows_groups_hashes():
+    links = pd.DataFrame([('1', 'en:a'), ('2', 'en:b'), ('3', 'en:a')], columns=['source_id', 'off_id'])
+    entries = {'1': {'value': 1}, '2': {'value': 2}, '3': {'value': 3}}
+
+    hashes = rows_groups_hashes(links, links.off_id, entries)
+
+    # Changing a linked entry only changes the hash of the ingredients linked to it
+    entries['3'] = {'value': 4}
+    new_hashes = rows_groups_hashes(links, links.off_id, entries)
+    assert new_hashes['en:a'] != hashes['en:a']
+    assert new_hashes['en:b'] == hashes['en:b']
+
+    # The order of the rows of an ingredient matters
+    reordered = links.iloc[[2, 1, 0]]
+    assert rows_groups_hashes(reordered, reordered.off_id, entries)['en:a'] != new_hashes['en:a']
+
+
+def test_patch_ingredients_data():
+    ingredients_data = {'en:a': {'id': 'en:a', 'LCI': 'A'},
+                        'en:b': {'id': 'en:b', 'LCI': 'B'},
+                        'en:c': {'id': 'en:c', 'LCI': 'C'}}
+    characterized_data = {'en:d': {'id': 'en:d'},
+                          'en:b': {'id': 'en:b', 'LCI': 'B'},
+                          'en:a': {'id': 'en:a', 'LCI': 'A2'}}
+
+    changed_ids = patch_ingredients_data(ingredients_data, characterized_data, {'en:a', 'en:b', 'en:c', 'en:d'})
+
+    assert changed_ids == ['en:a', 'en:c', 'en:d']
+    assert list(ingredients_data) == ['en:a', 'en:b', 'en:d']
+    assert ingredients_data['en:a']['LCI'] == 'A2'
+
+
+def test_manifest_matches_ingredients_data(tmp_path, monkeypatch):
+    data_filepath = tmp_path / 'ingredients_data.json'
+    monkeypatch.setattr(data, 'INGREDIENTS_DATA_FILEPATH', str(data_filepath))
+    monkeypatch.setattr(incremental, 'CHARACTERIZATION_MANIFEST_FILEPATH', str(tmp_path / 'manifest.json'))
+    manifest = {'files': {'ciqual_data': 'abc'}, 'ingredients': {'en:a': {'ciqual': 'def'}}}
+
+    data_filepath.write_text('{"en:a": {"id": "en:a"}}', encoding='utf8')
+    save_manifest(manifest)
+    assert load_manifest()['ingredients'] == manifest['ingredients']
+
+    # The ingredients data was rebuilt elsewhere
+    data_filepath.write_text('{"en:a": {"id": "en:a", "LCI": "A"}}', encoding='utf8')
+    assert load_manifest() is None
+
+    # The ingredients data was deleted to force a full characterization
+    data_filepath.unlink()
+    assert load_manifest() is None
@@ -0,0 +1,38 @@
+""" Testing the computation of the distribution of the ingredients defined percentages """
+
+import gzip
+import json
+
+from ingredients_characterization.percentages_distribution.ingredients_percentage_distribution import \
+    product_percentages, read_percentages
+
+
+def test_product_percentages():
+    product = {'ingredients': [{'id': 'en:flour', 'percent': 50},
+                               {'id': 'en:sugar', 'percent': '20.5'},
+                               {'id': 'en:salt'},
+                               {'id': 'en:butter', 'percent': 0},
+                               {'id': 'en:egg', 'percent': 150}]}
+
+    assert product_percentages(product) == [('en:flour', 50.0), ('en:sugar', 20.5)]
+
+
+def test_read_percentages(tmp_path):
+    products = [{'code': str(i),
+                 'categories_tags': ['en:cakes'] if i % 2 else None,
+                 'ingredients': [{'id': f"en:ingredient-{i % 7}", 'percent': i % 100 + 1}, {'id': 'en:water'}]}
+                for i in range(500)]
+    lines = ''.join(json.dumps(x) + '\n' for x in products)
+    (tmp_path / 'products.jsonl').write_text(lines)
+    with gzip.open(tmp_path / 'products.jsonl.gz', 'wt') as file:
+        file.write(lines)
+
+    percentages = read_percentages(str(tmp_path / 'products.jsonl'))
+    assert percentages.id.tolist() == [f"en:ingredient-{i % 7}" for i in range(500)]
+    assert percentages.percent.tolist() == [i % 100 + 1 for i in range(500)]
+    assert percentages.categories_tags[1] == ['en:cakes']
+    assert percentages.categories_tags[2] is None
+
+    # The results do not depend on the sharding of the export
+    assert read_percentages(str(tmp_path / 'products.jsonl'), workers=3).equals(percentages)
+    assert read_percentages(str(tmp_path / 'products.jsonl.gz'), workers=2).equals(percentages)
@@ -0,0 +1,47 @@
+""" Testing the linking of external nutritional data to OFF ingredients """
+
+from statistics import mean
+
+import pandas as pd
+
+from ingredients_characterization.nutrition.linking import link_nutriments, add_nutritional_data
+
+
+def test_link_nutriments():
+    links = pd.DataFrame({'off_id': ['en:a', 'en:b', 'en:a', 'en:a', 'en:c', 'en:c'],
+                          'source_id': ['1', '2', '2', '3', '1', '3']})
+    source_nutriments = pd.DataFrame([('1', 'fat', 0.1, 0.1, 0.2),
+                                      ('1', 'other', 0, 0, 0),
+                                      ('2', 'fat', 0.2, 0.0, 0.3),
+                                      ('2', 'other', 2, 0.0, 5),
+                                      ('3', 'other', 1, 0, 5.0),
+                                      ('3', 'salt', 0.7, 0.5, 1)],
+                                     columns=['source_id', 'nutriment', 'value', 'min', 'max'], dtype=object)
+
+    linked = link_nutriments(links, source_nutriments)
+    result = {(x.off_id, x.nutriment): (x.value, x.min, x.max) for x in linked.itertuples()}
+
+    assert list(result) == [('en:a', 'fat'), ('en:a', 'other'), ('en:b', 'fat'), ('en:b', 'other'), ('en:a', 'salt'),
+                            ('en:c', 'fat'), ('en:c', 'other'), ('en:c', 'salt')]
+
+    # Same values and types as the aggregation in Python lists
+    assert result[('en:a', 'fat')] == (mean([0.1, 0.2]), 0.0, 0.3)
+    assert [type(x) for x in result[('en:a', 'other')]] == [int, int, int]
+    assert [type(x) for x in result[('en:c', 'other')]] == [float, int, float]
+    assert result[('en:a', 'other')] == (1, 0, 5)
+    assert result[('en:c', 'other')] == (0.5, 0, 5.0)
+
+
+def test_add_nutritional_data():
+    links = pd.DataFrame({'off_id': ['en:a', 'en:b'], 'source_id': ['1', '2']})
+    source_nutriments = pd.DataFrame([('1', 'fat', 0.1, 0.1, 0.2, 0.15)],
+                                     columns=['source_id', 'nutriment', 'value', 'min', 'max', 'single_value'],
+                                     dtype=object)
+    ingredients_data = {'en:b': {'id': 'en:b', 'nutritional_data_sources': [{'database': 'ciqual', 'entry': 'B'}]}}
+
+    add_nutritional_data(ingredients_data, links, source_nutriments, 'fcen', {'1': 'A', '2': 'B'})
+
+    assert ingredients_data['en:a'] == {'id': 'en:a',
+                                        'nutritional_data_sources': [{'database': 'fcen', 'entry': 'A'}],
+                                        'nutriments': {'fat': {'value': 0.15, 'min': 0.1, 'max': 0.2}}}
+    assert ingredients_data['en:b']['nutritional_data_sources'] == [{'database': 'fcen', 'entry': 'B'}]
@@ -0,0 +1,33 @@
+""" Testing the processing of the OFF duplicates """
+
+import pytest
+
+from ingredients_characterization.duplicates.off_duplicates_processing import roll_up_proxies
+
+
+def test_roll_up_proxies():
+    ingredients_data = {'en:a': {'id': 'en:a', 'nutritional_proxy': 'en:b'},
+                        'en:b': {'id': 'en:b', 'nutritional_proxy': 'en:c'},
+                        'en:c': {'id': 'en:c'},
+                        'en:d': {'id': 'en:d', 'nutritional_proxy': 'en:e'},
+                        'en:e': {'id': 'en:e', 'nutritional_proxy': 'en:e'},
+                        'en:f': {'id': 'en:f', 'nutritional_proxy': 'en:f', 'nutriments': {}}}
+
+    roll_up_proxies(ingredients_data, 'nutritional_proxy')
+
+    assert ingredients_data['en:a']['nutritional_proxy'] == 'en:c'
+    assert ingredients_data['en:b']['nutritional_proxy'] == 'en:c'
+    assert ingredients_data['en:d']['nutritional_proxy'] == 'en:e'
+
+    # A self reference is removed if another ingredient has it as root
+    assert 'nutritional_proxy' not in ingredients_data['en:e']
+    assert list(ingredients_data['en:f']) == ['id', 'nutriments', 'nutritional_proxy']
+
+
+def test_roll_up_proxies_cycle():
+    ingredients_data = {'en:a': {'id': 'en:a', 'environmental_impact_proxy': 'en:b'},
+                        'en:b': {'id': 'en:b', 'environmental_impact_proxy': 'en:c'},
+                        'en:c': {'id': 'en:c', 'environmental_impact_proxy': 'en:a'}}
+
+    with pytest.raises(ValueError):
+        roll_up_proxies(ingredients_data, 'environmental_impact_proxy')
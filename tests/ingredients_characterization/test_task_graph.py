@@ -0,0 +1,67 @@
+""" Testing the task graph runner of the characterization """
+
+import importlib
+import os
+from functools import partial
+
+from ingredients_characterization import task_graph
+from ingredients_characterization.task_graph import Task, run_task_graph
+
+
+def _write(filepath, text):
+    with open(filepath, 'w') as file:
+        file.write(text)
+
+
+def _read(filepath):
+    with open(filepath, 'r') as file:
+        return file.read().upper()
+
+
+def test_run_task_graph(tmp_path):
+    source = str(tmp_path / 'source.txt')
+    product = str(tmp_path / 'product.txt')
+    cache_dir = str(tmp_path / 'cache')
+    _write(source, 'data')
+
+    tasks = [Task('missing', partial(_read, str(tmp_path / 'missing.txt')), sources=[str(tmp_path / 'missing.txt')],
+                  optional=True),
+             Task('write', partial(_write, product, 'product'), sources=[source], products=[product]),
+             Task('read', partial(_read, product), sources=[product], dependencies=['write']),
+             Task('read_source', partial(_read, source), sources=[source])]
+
+    outputs, report = run_task_graph(tasks, workers=2, cache_dir=cache_dir)
+    assert outputs == {'missing': None, 'write': None, 'read': 'PRODUCT', 'read_source': 'DATA'}
+    assert report['missing']['status'] == 'skipped'
+    assert all(report[x]['status'] == 'run' for x in ['write', 'read', 'read_source'])
+
+    # Unchanged tasks are skipped on rerun
+    _write(source, 'new data')
+    outputs, report = run_task_graph(tasks, workers=2, cache_dir=cache_dir)
+    assert outputs['read_source'] == 'NEW DATA'
+    assert report['write']['status'] == 'run'
+    assert report['read']['status'] == 'cached'
+    assert report['read_source']['status'] == 'run'
+
+
+def test_task_code_invalidates_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_graph, 'REPOSITORY_DIR', os.path.realpath(tmp_path))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    _write(tmp_path / 'task_helpers.py', 'VALUE = 1\n')
+    _write(tmp_path / 'task_module.py', 'from task_helpers import VALUE\n\n\ndef task():\n    return VALUE\n')
+    task_module = importlib.import_module('task_module')
+    cache_dir = str(tmp_path / 'cache')
+
+    def statuses(version=None):
+        _, report = run_task_graph([Task('task', task_module.task, version=version)], cache_dir=cache_dir)
+        return report['task']['status']
+
+    assert statuses() == 'run'
+    assert statuses() == 'cached'
+
+    # Editing a module imported by the module of the task
+    _write(tmp_path / 'task_helpers.py', 'VALUE = 2\n')
+    assert statuses() == 'run'
+    assert statuses() == 'cached'
+
+    assert statuses(version='2') == 'run'
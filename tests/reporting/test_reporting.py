@@ -0,0 +1,65 @@
+import copy
+import json
+
+import pytest
+
+from reporting import ProductImpactReport, compact_impact_result
+from tests.test_data import pound_cake
+
+IMPACT_CATEGORY = 'Changement climatique'
+
+IMPACT_RESULT = {'impacts_quantiles': {IMPACT_CATEGORY: {'0.05': 3.5, '0.25': 3.8, '0.5': 4, '0.75': 4.2, '0.95': 4.6}},
+                 'impacts_units': {IMPACT_CATEGORY: 'kg CO2 eq'},
+                 'ingredients_impacts_share': {IMPACT_CATEGORY: {'en:egg': 0.4, 'en:flour': 0.1, 'en:butter': 0.4,
+                                                                 'en:sugar': 0.1}},
+                 'ingredients_mass_share': {'en:egg': 0.3, 'en:flour': 0.3, 'en:butter': 0.2, 'en:sugar': 0.2},
+                 'average_total_used_mass': 1150,
+                 'warnings': [],
+                 'reliability': 2,
+                 'data_sources': {},
+                 'product_quantity': 1000,
+                 'impact_distributions': {IMPACT_CATEGORY: [3.9, 4, 4.1]}}
+
+
+def _product():
+    product = copy.deepcopy(pound_cake)
+    product['_id'] = '123'
+    product['categories_tags'] = ['en:cakes']
+
+    return product
+
+
+def test_report_from_impact_result(tmp_path):
+    # The compact form of the result is stored as JSON
+    impact_result = json.loads(json.dumps(compact_impact_result(IMPACT_RESULT)))
+    assert 'impact_distributions' not in impact_result
+
+    report = ProductImpactReport(product=_product(), impact_categories=[IMPACT_CATEGORY], impact_result=impact_result)
+    report.to_html(str(tmp_path / 'report.html'))
+
+    with open(tmp_path / 'report.html', 'r', encoding='utf8') as file:
+        html = file.read()
+    assert '<dd>4 kg CO2 eq' in html
+    assert '1150g' in html
+
+
+@pytest.mark.parametrize('figures_backend', ['svg', 'matplotlib'])
+def test_report_figures_backends(tmp_path, figures_backend):
+    report = ProductImpactReport(product=_product(), impact_categories=[IMPACT_CATEGORY], impact_result=IMPACT_RESULT,
+                                 figures_backend=figures_backend)
+    report.to_html(str(tmp_path / 'report.html'))
+
+    assert set(report.images) == {'main_impact_plot', 'impact_per_ingredient_plot', 'mass_per_ingredient_plot'}
+    assert all(x.startswith('<svg') or x.startswith('<?xml') for x in report.images.values())
+
+
+@pytest.mark.parametrize('impact_result', [{**IMPACT_RESULT, 'impacts_quantiles': {IMPACT_CATEGORY: {'0.5': 4}}},
+                                           {**IMPACT_RESULT, 'impacts_units': {}},
+                                           {**IMPACT_RESULT, 'ingredients_impacts_share': {}},
+                                           {**IMPACT_RESULT, 'product_quantity': 100},
+                                           {**IMPACT_RESULT, 'ingredients_mass_share': {'en:egg': 0.5,
+                                                                                        'en:flour': 0.5}},
+                                           {k: v for k, v in IMPACT_RESULT.items() if k != 'reliability'}])
+def test_invalid_impact_result(impact_result):
+    with pytest.raises(ValueError):
+        ProductImpactReport(product=_product(), impact_categories=[IMPACT_CATEGORY], impact_result=impact_result)
@@ -0,0 +1,28 @@
+import copy
+
+from reporting import generate_reports
+from tests.test_data import pound_cake
+
+
+def test_generate_reports(tmp_path):
+    products = []
+    for barcode in ['1', '2']:
+        product = copy.deepcopy(pound_cake)
+        product['_id'] = barcode
+        product['categories_tags'] = ['en:cakes']
+        products.append(product)
+    products.append({'_id': '3', 'ingredients': [{'id': 'en:unknown-ingredient'}]})
+
+    batch_result = generate_reports(products, str(tmp_path), workers=2, impact_categories=['Changement climatique'])
+
+    assert batch_result['results'][:2] == [str(tmp_path / '1.html'), str(tmp_path / '2.html')]
+    assert isinstance(batch_result['results'][2], Exception)
+    assert batch_result['number_of_reports'] == 2
+    assert batch_result['number_of_errors'] == 1
+    assert batch_result['reports_per_minute'] > 0
+
+    for filepath in batch_result['results'][:2]:
+        with open(filepath, 'r', encoding='utf8') as file:
+            html = file.read()
+        assert '<svg' in html
+        assert 'pure' in html
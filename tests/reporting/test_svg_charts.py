@@ -0,0 +1,31 @@
+import xml.etree.ElementTree as ET
+
+from reporting.svg_charts import axis_ticks, box_plot, shares_bars
+
+SVG_NAMESPACE = '{http://www.w3.org/2000/svg}'
+
+
+def test_axis_ticks():
+    assert axis_ticks(4.6) == [0, 1, 2, 3, 4, 5]
+    assert axis_ticks(0.18) == [0, 0.05, 0.1, 0.15, 0.2]
+    assert axis_ticks(1000) == [0, 200, 400, 600, 800, 1000]
+    assert axis_ticks(0) == [0, 1]
+
+
+def test_box_plot():
+    svg = ET.fromstring(box_plot({'whislo': 3.5, 'q1': 3.8, 'med': 4, 'q3': 4.2, 'whishi': 4.6}, reference=5.2))
+
+    assert svg.tag == f"{SVG_NAMESPACE}svg"
+    assert [x.text for x in svg.iter(f"{SVG_NAMESPACE}text")] == ['0', '2', '4', '6']
+    assert len([x for x in svg.iter(f"{SVG_NAMESPACE}line") if x.get('stroke-dasharray')]) == 1
+
+
+def test_shares_bars():
+    shares = [('en:egg', 0.4, None), ('en:flour & <salt>', 0.6, 'darkred')]
+    svg = ET.fromstring(shares_bars(shares))
+
+    texts = [x for x in svg.iter(f"{SVG_NAMESPACE}text")]
+    assert [x.text for x in texts][-2:] == ['en:egg: 40.0%', 'en:flour & <salt>: 60.0%']
+    assert texts[-1].get('fill') == 'darkred'
+    # The first share is displayed at the top
+    assert float(texts[-2].get('y')) < float(texts[-1].get('y'))
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils import ProductClient
+
+PRODUCTS = {str(i): {'code': str(i), 'product_name': f"Product {i}"} for i in range(50)}
+
+
+class StubOffApi:
+    """ Local HTTP server answering like the Open Food Facts API products endpoint. """
+
+    def __init__(self, delay=0, failures=0, failure_status=503, failing_barcodes=()):
+        """
+        Args:
+            delay (float): Duration of each request in seconds.
+            failures (int): Number of requests of each barcode failing before the product is returned.
+            failure_status (int): HTTP status of the failed requests.
+            failing_barcodes (iterable): Barcodes whose requests always fail.
+        """
+        self.delay = delay
+        self.failures = failures
+        self.failure_status = failure_status
+        self.failing_barcodes = set(failing_barcodes)
+        self.requests = []
+        self.concurrency = 0
+        self.max_concurrency = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                barcode = self.path.rsplit('/', 1)[-1][:-len('.json')]
+                with stub._lock:
+                    stub.requests.append(barcode)
+                    attempt = stub.requests.count(barcode)
+                    stub.concurrency += 1
+                    stub.max_concurrency = max(stub.max_concurrency, stub.concurrency)
+                time.sleep(stub.delay)
+                with stub._lock:
+                    stub.concurrency -= 1
+
+                if (attempt <= stub.failures) or (barcode in stub.failing_barcodes):
+                    status, body = stub.failure_status, {}
+                elif barcode in PRODUCTS:
+                    status, body = 200, {'status': 1, 'product': PRODUCTS[barcode]}
+                else:
+                    status, body = 404, {'status': 0}
+
+                content = json.dumps(body).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up waiting for the response
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/v2/product/{{barcode}}.json"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_fetch_products(tmp_path):
+    with StubOffApi(delay=0.05) as stub, ProductClient(url=stub.url, max_concurrency=4,
+                                                       cache_dir=str(tmp_path)) as client:
+        barcodes = list(PRODUCTS) + ['unknown']
+        results = dict(client.fetch_products(iter(barcodes)))
+
+        assert results == {**PRODUCTS, 'unknown': None}
+        assert 1 < stub.max_concurrency <= 4
+        assert len(stub.requests) == len(barcodes)
+
+        # The responses are cached, including the missing products
+        assert dict(client.fetch_products(barcodes)) == results
+        assert len(stub.requests) == len(barcodes)
+
+
+def test_fetch_products_partial_failure():
+    with StubOffApi(failing_barcodes=['3']) as stub, ProductClient(url=stub.url, retries=1, backoff=0.01,
+                                                                   use_cache=False) as client:
+        results = dict(client.fetch_products(PRODUCTS))
+
+        # The failed product does not stop the others
+        assert isinstance(results.pop('3'), requests.HTTPError)
+        assert results == {k: v for k, v in PRODUCTS.items() if k != '3'}
+        assert stub.requests.count('3') == 2
+
+        with pytest.raises(requests.HTTPError):
+            dict(client.fetch_products(['1', '3'], on_error='raise'))
+
+
+def test_product_client_cache_ttl(tmp_path):
+    with StubOffApi() as stub:
+        with ProductClient(url=stub.url, cache_dir=str(tmp_path), cache_ttl=3600) as client:
+            assert client.get_product('1') == PRODUCTS['1']
+            assert client.get_product('1') == PRODUCTS['1']
+        assert stub.requests == ['1']
+
+        with ProductClient(url=stub.url, cache_dir=str(tmp_path), cache_ttl=0) as client:
+            assert client.get_product('1') == PRODUCTS['1']
+        assert stub.requests == ['1', '1']
+
+        with ProductClient(url=stub.url, use_cache=False) as client:
+            assert client.get_product('1') == PRODUCTS['1']
+        assert stub.requests == ['1', '1', '1']
+
+
+def test_product_client_retries():
+    with StubOffApi(failures=2) as stub, ProductClient(url=stub.url, retries=2, backoff=0.01,
+                                                       use_cache=False) as client:
+        assert client.get_product('1') == PRODUCTS['1']
+        assert stub.requests == ['1', '1', '1']
+
+        with pytest.raises(requests.HTTPError):
+            client.retries = 1
+            client.get_product('2')
+
+    # Client errors are not retried
+    with StubOffApi(failures=1, failure_status=400) as stub, ProductClient(url=stub.url, retries=2, backoff=0.01,
+                                                                           use_cache=False) as client:
+        with pytest.raises(requests.HTTPError):
+            client.get_product('1')
+        assert stub.requests == ['1']
+
+
+def test_product_client_timeout():
+    with StubOffApi(delay=0.5) as stub, ProductClient(url=stub.url, timeout=0.1, retries=1, backoff=0.01,
+                                                      use_cache=False) as client:
+        with pytest.raises(requests.Timeout):
+            client.get_product('1')
+        assert stub.requests == ['1', '1']
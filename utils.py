@@ -1,7 +1,21 @@
+import hashlib
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import lru_cache
 from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from data.off_dump import open_dump_index
+from settings import OFF_DUMP_FILEPATH, OFF_API_FALLBACK, OFF_API_PRODUCT_URL, OFF_API_TIMEOUT, OFF_API_RETRIES, \
+    OFF_API_BACKOFF, OFF_API_MAX_CONCURRENCY, OFF_API_CACHE_DIR, OFF_API_CACHE_TTL
+
+# HTTP statuses of the transient errors after which a request is retried
+RETRIED_HTTP_STATUSES = {429, 500, 502, 503, 504}
 
 
 def ensure_extension(filename, extension):
@@ -41,10 +55,255 @@ def smart_round_format(number, precision):
         return ('{:0.' + str(precision) + 'e}').format(number)
 
 
-def get_product_from_barcode(barcode):
-    response = requests.get(f"https://world.openfoodfacts.org/api/v2/product/{barcode}.json")
+class ProductClient:
+    """
+    Client of the Open Food Facts API products endpoint.
+
+    The client keeps a pool of HTTP connections, retries the failed requests with an exponential backoff and writes
+    the responses through an on-disk cache. It is thread-safe.
+    """
+
+    def __init__(self, url=None, timeout=None, retries=None, backoff=None, max_concurrency=None, cache_dir=None,
+                 cache_ttl=None, use_cache=True):
+        """
+        Args:
+            url (str): URL of a product, with a {barcode} placeholder. Defaults to OFF_API_PRODUCT_URL.
+            timeout (float): Timeout of the requests in seconds. Defaults to OFF_API_TIMEOUT.
+            retries (int): Number of retries of a failed request. Defaults to OFF_API_RETRIES.
+            backoff (float): Delay before the first retry in seconds, doubled at each retry. Defaults to
+                OFF_API_BACKOFF.
+            max_concurrency (int): Maximum number of concurrent requests. Defaults to OFF_API_MAX_CONCURRENCY.
+            cache_dir (str): Directory of the cached responses. Defaults to OFF_API_CACHE_DIR.
+            cache_ttl (float): Time to live of the cached responses in seconds. Defaults to OFF_API_CACHE_TTL.
+            use_cache (bool): Should the responses be cached?
+        """
+        self.url = url or OFF_API_PRODUCT_URL
+        self.timeout = OFF_API_TIMEOUT if timeout is None else timeout
+        self.retries = OFF_API_RETRIES if retries is None else retries
+        self.backoff = OFF_API_BACKOFF if backoff is None else backoff
+        self.max_concurrency = max_concurrency or OFF_API_MAX_CONCURRENCY
+        self.cache_dir = (cache_dir or OFF_API_CACHE_DIR) if use_cache else None
+        self.cache_ttl = OFF_API_CACHE_TTL if cache_ttl is None else cache_ttl
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _cache_filepath(self, barcode):
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(str(barcode).encode('utf-8')).hexdigest()}.json")
+
+    def _cached_response(self, barcode):
+        """ Cached response of a barcode, as a 1-tuple, or None if it is not cached or has expired. """
+        if self.cache_dir is None:
+            return None
+
+        try:
+            with open(self._cache_filepath(barcode), 'r', encoding='utf-8') as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - cached['time'] > self.cache_ttl:
+            return None
+
+        return (cached['product'],)
+
+    def _cache_response(self, barcode, product):
+        if self.cache_dir is None:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        filepath = self._cache_filepath(barcode)
+        temporary_filepath = f"{filepath}.{threading.get_ident()}.tmp"
+        with open(temporary_filepath, 'w', encoding='utf-8') as file:
+            json.dump({'barcode': str(barcode), 'time': time.time(), 'product': product}, file, ensure_ascii=False)
+        os.replace(temporary_filepath, filepath)
+
+    def _request(self, barcode):
+        """ Requests a product, retrying after the transient errors. Returns None if the product does not exist. """
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                with self._semaphore:
+                    response = self.session.get(self.url.format(barcode=barcode), timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                continue
+
+            if response.status_code == 404:
+                return None
+            if (response.status_code in RETRIED_HTTP_STATUSES) and (attempt < self.retries):
+                continue
+            response.raise_for_status()
+
+            return json.loads(response.content).get('product')
+
+    def get_product(self, barcode):
+        """
+        Gets a product, from the cache if it has been fetched recently.
+
+        Args:
+            barcode (str): Barcode of the product.
+
+        Returns:
+            dict: The product, None if it does not exist.
+        """
+        cached = self._cached_response(barcode)
+        if cached is not None:
+            return cached[0]
+
+        product = self._request(barcode)
+        self._cache_response(barcode, product)
+
+        return product
+
+    def fetch_products(self, barcodes, on_error='yield'):
+        """
+        Fetches many products concurrently.
+
+        Args:
+            barcodes (iterable): Barcodes of the products. They are consumed as the products are fetched.
+            on_error (str): What to do with the error of a product that cannot be fetched once its requests have been
+                retried: 'yield' it in place of the product, so that the other products are still fetched, or
+                'raise' it, which stops the fetching.
+
+        Yields:
+            tuple: Barcode and product (None if it does not exist, or the exception raised if it cannot be fetched
+                and on_error is 'yield'), in the order the products are fetched.
+        """
+        if on_error not in ('yield', 'raise'):
+            raise ValueError("The parameter on_error should be 'yield' or 'raise'.")
+
+        with ThreadPoolExecutor(self.max_concurrency) as executor:
+            pending = dict()
+            barcodes = iter(barcodes)
+            exhausted = False
+            while pending or not exhausted:
+                # Bounding the number of pending requests so that the barcodes can be a long stream
+                while (not exhausted) and (len(pending) < 2 * self.max_concurrency):
+                    try:
+                        barcode = next(barcodes)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(self.get_product, barcode)] = barcode
 
-    if response.status_code == 404:
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    barcode = pending.pop(future)
+                    try:
+                        product = future.result()
+                    except Exception as e:
+                        if on_error == 'raise':
+                            raise
+                        product = e
+                    yield barcode, product
+
+
+@lru_cache(maxsize=None)
+def _product_client():
+    return ProductClient()
+
+
+@lru_cache(maxsize=4)
+def _open_dump_index(dump_filepath, dump_size, dump_mtime_ns):
+    """ Index of a dump, cached for a given version of the dump identified by its size and modification time. """
+    index = open_dump_index(dump_filepath)
+    if index is None:
+        raise ValueError(f"The index of the dump {dump_filepath} cannot be opened, the dump may have been modified "
+                         f"while it was indexed.")
+
+    return index
+
+
+def _dump_index(dump_filepath):
+    """ Index of a dump, opened again if the dump has been replaced since it was last opened. """
+    stat = os.stat(dump_filepath)
+
+    return _open_dump_index(os.path.realpath(dump_filepath), stat.st_size, stat.st_mtime_ns)
+
+
+def get_product_from_barcode(barcode, dump_filepath=None, api_fallback=None):
+    """
+    Gets an Open Food Facts product from a local dump (see :mod:`data.off_dump`) or from the Open Food Facts API.
+
+    Args:
+        barcode (str): Barcode of the product.
+        dump_filepath (str): Path of the uncompressed OFF JSONL dump to read the product from. Defaults to
+            OFF_DUMP_FILEPATH. The product is fetched from the API if there is no dump.
+        api_fallback (bool): Should the products missing from the dump be fetched from the API? Defaults to
+            OFF_API_FALLBACK.
+
+    Returns:
+        dict: The product.
+    """
+    dump_filepath = dump_filepath or OFF_DUMP_FILEPATH
+    api_fallback = OFF_API_FALLBACK if api_fallback is None else api_fallback
+
+    product = None
+    if dump_filepath is not None:
+        product = _dump_index(dump_filepath).get(barcode)
+
+    if (product is None) and ((dump_filepath is None) or api_fallback):
+        product = _product_client().get_product(barcode)
+
+    if product is None:
         raise ValueError('The product corresponding to this barcode cannot be found.')
 
-    return json.loads(response.content)['product']
+    return product
+
+
+def fetch_products(barcodes, dump_filepath=None, api_fallback=None, on_error='yield'):
+    """
+    Gets many Open Food Facts products, reading them from the local dump and fetching the others concurrently from
+    the Open Food Facts API (see :func:`get_product_from_barcode`).
+
+    Args:
+        barcodes (iterable): Barcodes of the products.
+        dump_filepath (str): Path of the uncompressed OFF JSONL dump to read the products from. Defaults to
+            OFF_DUMP_FILEPATH.
+        api_fallback (bool): Should the products missing from the dump be fetched from the API? Defaults to
+            OFF_API_FALLBACK.
+        on_error (str): What to do with the error of a product that cannot be fetched from the API, see
+            :meth:`ProductClient.fetch_products`.
+
+    Yields:
+        tuple: Barcode and product (None if it cannot be found, or the exception raised if it cannot be fetched and
+            on_error is 'yield'), in the order the products are got.
+    """
+    dump_filepath = dump_filepath or OFF_DUMP_FILEPATH
+    api_fallback = OFF_API_FALLBACK if api_fallback is None else api_fallback
+
+    if dump_filepath is None:
+        yield from _product_client().fetch_products(barcodes, on_error)
+        return
+
+    # Reading the products from the dump first, as it is much faster than fetching them
+    missing_barcodes = []
+    for barcode in barcodes:
+        product = _dump_index(dump_filepath).get(barcode)
+        if product is not None:
+            yield barcode, product
+        elif api_fallback:
+            missing_barcodes.append(barcode)
+        else:
+            yield barcode, None
+
+    yield from _product_client().fetch_products(missing_barcodes, on_error)